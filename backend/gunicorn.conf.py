@@ -0,0 +1,49 @@
+"""
+Gunicorn settings, picked up automatically by `gunicorn paragon_jms.wsgi`
+when started from this directory.
+"""
+import os
+import shutil
+
+# Workers write Prometheus samples here so /metrics can merge them
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/paragon-metrics')
+
+# Import Django once in the master and fork workers from it, so a new or
+# restarted worker starts with everything already imported. Code changes
+# then need a full restart rather than a HUP.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+
+def _log_warm_up(log, what, elapsed_ms):
+    if elapsed_ms is not None:
+        log.info('%s warm-up took %.0f ms', what, elapsed_ms)
+
+
+def on_starting(server):
+    # Samples from a previous master are meaningless after a restart
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from paragon_jms.warmup import warm_up_app
+        _log_warm_up(server.log, 'Application', warm_up_app())
+
+        # Workers must not inherit the master's database connections
+        from django.db import connections
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    # Runs after the worker has loaded the app and before it accepts traffic
+    from paragon_jms.warmup import warm_up_app, warm_up_worker
+    if not worker.cfg.preload_app:
+        _log_warm_up(worker.log, 'Application', warm_up_app())
+    _log_warm_up(worker.log, 'Worker', warm_up_worker())
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
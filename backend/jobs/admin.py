@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Job, DocketCounter
+from .models import Job, JobArchive, JobEvent, DocketCounter
 
 
 @admin.register(Job)
@@ -9,11 +9,44 @@ class JobAdmin(admin.ModelAdmin):
         'payment_status', 'total_cost', 'created_at'
     )
     list_filter = ('status', 'payment_status', 'branch', 'job_type', 'created_at')
+    list_select_related = ('branch',)
     search_fields = ('customer', 'docket_number', 'description')
     readonly_fields = ('job_id', 'total_cost', 'created_at', 'updated_at')
     ordering = ('-created_at',)
 
 
+@admin.register(JobArchive)
+class JobArchiveAdmin(admin.ModelAdmin):
+    list_display = (
+        'job_id', 'customer', 'branch', 'job_type', 'payment_status',
+        'total_cost', 'created_at'
+    )
+    list_filter = ('payment_status', 'branch', 'job_type', 'created_at')
+    list_select_related = ('branch',)
+    search_fields = ('customer', 'docket_number', 'description')
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(JobEvent)
+class JobEventAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'kind', 'field', 'old_value', 'new_value', 'actor_id', 'created_at')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('=job_id',)
+    ordering = ('-created_at',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(DocketCounter)
 class DocketCounterAdmin(admin.ModelAdmin):
     list_display = ('job_type', 'current_number')
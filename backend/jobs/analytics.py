@@ -0,0 +1,104 @@
+"""
+The grouped figures behind ``job_analytics`` and the admin dashboard.
+
+``job_rollups(model)`` runs every aggregate on one job table (``Job`` or
+``JobArchive``) on every shard and merges the shards' rows.  Archived jobs
+only change when ``archive_jobs`` runs, so their rollups are computed once
+per archive version and kept in the cache for ``ARCHIVE_ROLLUP_SECONDS``;
+a request then only aggregates the live table and merges the two.
+
+Rows are returned unsorted, keyed by branch id rather than code; the view
+applies ordering and top-N limits to the combined figures.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth, TruncDate
+
+from monitoring.query_budget import unbudgeted
+from paragon_jms.db_router import read_from_primary
+from paragon_jms.sharding import gather_grouped, merge_grouped
+from .archive import archive_version
+from .models import JobArchive
+
+# name: (group keys, summed fields)
+ROLLUPS = {
+    'user_performance': (('order_taken_by',), ('jobs_created', 'jobs_printed', 'jobs_paid')),
+    'branch_performance': (('branch',), ('job_count', 'total_profit')),
+    'product_performance': (('product_type__name',), ('job_count', 'total_revenue')),
+    'payment_counts': (('payment_status',), ('job_count',)),
+    'daily_profits': (('created_date',), ('total_profit',)),
+    'monthly_branch_profits': (('month', 'branch'), ('total_profit',)),
+}
+
+PAID = Q(payment_status__in=['RECEIPTED', 'INVOICED'])
+
+
+def job_rollups(model, start_date=None, end_date=None):
+    """
+    Every rollup of ``model``'s jobs, over all shards.  ``daily_profits``
+    only covers jobs created between ``start_date`` and ``end_date``
+    inclusive (every job if they are None).
+    """
+    jobs = model.objects
+    daily = jobs.filter(PAID)
+    if start_date is not None:
+        daily = daily.filter(created_at__date__gte=start_date, created_at__date__lte=end_date)
+    querysets = {
+        'user_performance': jobs.values('order_taken_by').annotate(
+            jobs_created=Count('job_id'),
+            jobs_printed=Count('job_id', filter=Q(status='PRINTED')),
+            jobs_paid=Count('job_id', filter=PAID)
+        ).order_by('-jobs_created'),
+        'branch_performance': jobs.values('branch').annotate(
+            job_count=Count('job_id'),
+            total_profit=Sum('total_cost', filter=PAID)
+        ).order_by('-job_count'),
+        'product_performance': jobs.values('product_type__name').annotate(
+            job_count=Count('job_id'),
+            total_revenue=Sum('total_cost', filter=PAID)
+        ).order_by('-job_count'),
+        'payment_counts': jobs.values('payment_status').annotate(
+            job_count=Count('job_id')
+        ).order_by(),
+        'daily_profits': daily.annotate(
+            created_date=TruncDate('created_at')
+        ).values('created_date').annotate(
+            total_profit=Sum('total_cost')
+        ).order_by('created_date'),
+        'monthly_branch_profits': jobs.filter(PAID).annotate(
+            month=ExtractMonth('created_at')
+        ).values('month', 'branch').annotate(
+            total_profit=Sum('total_cost')
+        ).order_by(),
+    }
+    return {
+        name: gather_grouped(queryset, keys=ROLLUPS[name][0], sums=ROLLUPS[name][1])
+        for name, queryset in querysets.items()
+    }
+
+
+def archive_rollups():
+    """The rollups of every archived job, cached per archive version."""
+    key = f'jobs:archive_rollups:{archive_version()}'
+    rollups = cache.get(key)
+    if rollups is None:
+        with unbudgeted(), read_from_primary():
+            rollups = job_rollups(JobArchive)
+        cache.set(key, rollups, getattr(settings, 'ARCHIVE_ROLLUP_SECONDS', 300))
+    return rollups
+
+
+def merge_rollups(*rollups):
+    """Add up several ``job_rollups()`` results group by group."""
+    return {
+        name: merge_grouped([rollup[name] for rollup in rollups], keys, sums)
+        for name, (keys, sums) in ROLLUPS.items()
+    }
+
+
+def payment_count(rollups, payment_status):
+    return sum(
+        row['job_count'] for row in rollups['payment_counts']
+        if row['payment_status'] == payment_status
+    )
@@ -0,0 +1,83 @@
+"""
+Hot/cold tiers for job data.
+
+Jobs that are printed and paid (receipted or invoiced) are settled: they
+never show up in pending lists, clerk queues or edits again.  Once a job
+has been settled for a while, ``python manage.py archive_jobs`` moves it
+from ``jobs`` into ``jobs_archive``, which has the same columns, so the
+table and indexes that every list and dashboard query scans only hold the
+jobs still in play.
+
+Archived jobs keep their id, docket number and timestamps.  They are
+still found by id and docket (``find_job()``), listed with
+``?archived=true`` and counted by analytics, whose archive figures come
+from ``jobs.analytics.archive_rollups()``.  They are read-only.
+
+Each shard archives its own jobs into its own ``jobs_archive`` table.
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from paragon_jms.sharding import shard_get
+from settings import versions
+from .dockets import docket_number_of
+from .models import DocketCounter, Job, JobArchive
+
+ARCHIVE_VERSION_KEY = 'jobs:archive_version'
+JOB_RELATIONS = ('product_type', 'paper_type', 'paper_weight', 'paper_size')
+SETTLED = Q(status='PRINTED', payment_status__in=['RECEIPTED', 'INVOICED'])
+
+
+def archive_version():
+    return versions.current(ARCHIVE_VERSION_KEY)
+
+
+def invalidate():
+    """Bump the archive version so every process recomputes its archive rollups."""
+    versions.bump(ARCHIVE_VERSION_KEY)
+
+
+def archivable(alias, cutoff):
+    """Settled jobs on ``alias`` last changed before ``cutoff``."""
+    return Job.objects.using(alias).filter(SETTLED, updated_at__lt=cutoff)
+
+
+def archive_batch(alias, cutoff, batch_size=500):
+    """
+    Move up to ``batch_size`` archivable jobs on ``alias`` into the archive,
+    oldest ids first, in one transaction.  Returns how many were moved.
+    """
+    with transaction.atomic(using=alias):
+        jobs = list(archivable(alias, cutoff).select_for_update().order_by('job_id')[:batch_size])
+        if not jobs:
+            return 0
+        JobArchive.objects.using(alias).bulk_create([
+            JobArchive(**{field.attname: getattr(job, field.attname) for field in Job._meta.concrete_fields})
+            for job in jobs
+        ])
+        Job.objects.using(alias).filter(job_id__in=[job.job_id for job in jobs]).delete()
+
+        # Keep the LOCAL counter past every archived docket, so allocating
+        # a docket never has to look in the archive
+        highest = max(
+            (docket_number_of(job.docket_number) or 0 for job in jobs if job.job_type == 'LOCAL'),
+            default=0,
+        )
+        DocketCounter.objects.using(alias).filter(
+            job_type='LOCAL', current_number__lt=highest
+        ).update(current_number=highest, updated_at=timezone.now())
+    return len(jobs)
+
+
+def find_job(preferred=None, **lookup):
+    """
+    A job from ``jobs`` on any shard or, failing that, from the archive,
+    trying ``preferred`` first.  Raises ``Job.DoesNotExist`` if neither has it.
+    """
+    for model in (Job, JobArchive):
+        try:
+            return shard_get(model.objects.select_related(*JOB_RELATIONS), preferred=preferred, **lookup)
+        except model.DoesNotExist:
+            continue
+    raise Job.DoesNotExist('Job matching query does not exist, live or archived.')
@@ -0,0 +1,209 @@
+"""
+Process-level prefix index of customers, for autocomplete on the job form.
+
+Each process keeps every distinct customer name, normalized (case-folded,
+whitespace collapsed), in a sorted list, with the contact details of the
+customer's most recent job.  A prefix lookup is a ``bisect`` into the list
+and a walk along the matches, so it never touches the database.  Sales
+reps only see their own customers, as in the job list, so the index also
+keeps a list per sales rep, from their jobs only.
+
+The index is built from every live and archived job on every shard when a
+worker starts (``paragon_jms.warmup``), or on first use, then kept up to
+date incrementally:
+
+- Every ``CUSTOMER_INDEX_CHECK_SECONDS``, and at once in the process that
+  took a new job (``record(job)``), a lookup first checks each shard's
+  window of ids past the last one it has seen, less
+  ``CUSTOMER_INDEX_OVERLAP_IDS``, with one primary-key range aggregate
+  (count and highest id).  Only if the window holds jobs it has not read
+  does it read them.  Ids are taken before commit, so a job with a lower
+  id can commit after a higher one has been read; the overlap catches it,
+  and the ids already read in it are skipped.  Creating a job writes
+  nothing shared, so it never contends on a version row.
+- ``record(job, created=False)``, after an edit to a job's customer
+  details, updates this process's index directly.  Other processes pick
+  edits up when they next rebuild (on restart).
+
+Jobs written in bulk (``generate_load_data``) are caught up with the same way.
+"""
+import bisect
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from monitoring.query_budget import unbudgeted
+from paragon_jms.db_router import read_from_primary
+from paragon_jms.sharding import shard_aliases
+from .models import Job, JobArchive
+
+FIELDS = ('customer', 'contact_person', 'mobile_number', 'email_address', 'created_at')
+# Details edited on a job that change what the index holds
+CUSTOMER_FIELDS = ('customer', 'contact_person', 'mobile_number', 'email_address')
+
+
+def normalize(name):
+    return ' '.join(name.split()).casefold()
+
+
+class Customers:
+    """Normalized customer names in sorted order, and each one's latest details."""
+
+    def __init__(self):
+        self.details = {}
+        self.keys = []
+
+    def _add(self, customer, contact_person, mobile_number, email_address, created_at):
+        """Keep a job's details if they are its customer's latest; returns the key if it is new."""
+        key = normalize(customer)
+        if not key:
+            return None
+        current = self.details.get(key)
+        if current is not None and current['last_job_at'] > created_at:
+            current['job_count'] += 1
+            return None
+        self.details[key] = {
+            'customer': customer,
+            'contact_person': contact_person,
+            'mobile_number': mobile_number,
+            'email_address': email_address,
+            'last_job_at': created_at,
+            'job_count': current['job_count'] + 1 if current is not None else 1,
+        }
+        return key if current is None else None
+
+    def add(self, customer, contact_person, mobile_number, email_address, created_at):
+        key = self._add(customer, contact_person, mobile_number, email_address, created_at)
+        if key is not None:
+            bisect.insort(self.keys, key)
+
+    def update(self, job):
+        """Take an edited job's details if it is still its customer's latest job."""
+        key = normalize(job.customer)
+        current = self.details.get(key)
+        if current is None:
+            self.add(*(getattr(job, field) for field in FIELDS))
+        elif current['last_job_at'] <= job.created_at:
+            current.update({field: getattr(job, field) for field in CUSTOMER_FIELDS})
+
+    def search(self, prefix, limit=10):
+        """The details of up to ``limit`` customers whose name starts with ``prefix``, by name."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        keys = self.keys
+        results = []
+        for position in range(bisect.bisect_left(keys, prefix), len(keys)):
+            key = keys[position]
+            if not key.startswith(prefix) or len(results) == limit:
+                break
+            results.append(self.details[key])
+        return results
+
+
+class CustomerIndex:
+    """Every customer, and each sales rep's own (``Customers``), kept up to date from the jobs."""
+
+    def __init__(self):
+        self.customers = Customers()
+        self.by_sales_rep = {}
+        self.last_ids = {}
+        # Per shard, the ids read within the overlap below its last id
+        self.recent = {}
+        overlap = getattr(settings, 'CUSTOMER_INDEX_OVERLAP_IDS', 1000)
+        for alias in shard_aliases():
+            # Taken first, so a job created during the scan is caught up
+            # with (and skipped as already read) rather than missed
+            last = self.last_ids[alias] = Job.objects.using(alias).aggregate(last=Max('job_id'))['last'] or 0
+            recent = self.recent[alias] = set()
+            for model in (Job, JobArchive):
+                rows = model.objects.using(alias).values_list('job_id', 'sales_rep', *FIELDS).order_by()
+                for job_id, sales_rep, *details in rows.iterator(chunk_size=5000):
+                    for customers in self._lists(sales_rep):
+                        customers._add(*details)
+                    if model is Job and job_id > last - overlap:
+                        recent.add(job_id)
+        for customers in [self.customers, *self.by_sales_rep.values()]:
+            customers.keys = sorted(customers.details)
+
+    def _lists(self, sales_rep):
+        """The lists a job of ``sales_rep`` belongs in."""
+        if not sales_rep:
+            return [self.customers]
+        return [self.customers, self.by_sales_rep.setdefault(sales_rep, Customers())]
+
+    def add(self, sales_rep, *details):
+        for customers in self._lists(sales_rep):
+            customers.add(*details)
+
+    def update(self, job):
+        for customers in self._lists(job.sales_rep):
+            customers.update(job)
+
+    def catch_up(self):
+        """Add the jobs created on each shard since the last one seen there."""
+        overlap = getattr(settings, 'CUSTOMER_INDEX_OVERLAP_IDS', 1000)
+        for alias in shard_aliases():
+            last = self.last_ids.get(alias, 0)
+            recent = self.recent.setdefault(alias, set())
+            window = Job.objects.using(alias).filter(job_id__gt=max(last - overlap, 0))
+            # Unchanged if it still holds exactly the ids read in it
+            seen = window.aggregate(count=Count('job_id'), last=Max('job_id'))
+            if seen['count'] == len(recent) and (seen['last'] or 0) <= last:
+                continue
+            present = set()
+            rows = window.order_by('job_id').values_list('job_id', 'sales_rep', *FIELDS)
+            for job_id, sales_rep, *details in rows:
+                present.add(job_id)
+                if job_id not in recent:
+                    self.add(sales_rep, *details)
+                last = max(last, job_id)
+            self.last_ids[alias] = last
+            # Deleted jobs drop out, so the count above stays comparable
+            self.recent[alias] = {job_id for job_id in present if job_id > last - overlap}
+
+    def search(self, prefix, limit=10, sales_rep=None):
+        """Customers whose name starts with ``prefix``: everyone's, or only ``sales_rep``'s."""
+        customers = self.customers if sales_rep is None else self.by_sales_rep.get(sales_rep)
+        return customers.search(prefix, limit) if customers is not None else []
+
+
+_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+
+
+def get_index():
+    """Return this process's index, building it or catching up with new jobs."""
+    global _index, _checked_at
+
+    ttl = getattr(settings, 'CUSTOMER_INDEX_CHECK_SECONDS', 5)
+    now = time.monotonic()
+    index = _index
+    if index is not None and now - _checked_at < ttl:
+        return index
+
+    with _lock:
+        with unbudgeted(), read_from_primary():
+            if _index is None:
+                _index = CustomerIndex()
+            elif now - _checked_at >= ttl:
+                _index.catch_up()
+        _checked_at = now
+        return _index
+
+
+def record(job, created=True):
+    """
+    Note a new job, or a job whose customer details were edited, once it is
+    committed.  This process catches up with new jobs on its next lookup
+    (others within ``CUSTOMER_INDEX_CHECK_SECONDS``); an edit is applied to
+    this process's index directly.
+    """
+    global _checked_at
+    with _lock:
+        _checked_at = 0.0
+        if not created and _index is not None:
+            _index.update(job)
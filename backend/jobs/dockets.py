@@ -0,0 +1,151 @@
+"""
+LOCAL docket numbers and job ids.
+
+Each shard numbers its LOCAL dockets from its own ``DocketCounter`` row,
+locked while the job is inserted.  With sharding, every shard allocates
+in its own slot (see ``paragon_jms.sharding``) and job ids are assigned
+here, since shards share no sequence: the LOCAL row also keeps the
+shard's highest id, so allocating one reads no other shard.  Unsharded,
+numbers simply count up and ids come from the database.  Archived jobs
+keep their numbers: archiving moves a shard's LOCAL counter past every
+docket it archives, and ids never go back down.
+"""
+from django.db.models import Max, Subquery
+
+from paragon_jms.sharding import (
+    next_in_slot, on_shard, scatter, shard_aliases, sharding_enabled, slot, slot_owner,
+)
+from .models import DocketCounter, Job, JobArchive
+
+
+DOCKET_PREFIXES = {'LOCAL': 'LOC', 'FOREIGN': 'FOR'}
+# Candidates checked by the first query of free_docket_numbers()
+PROBE_WINDOW = 16
+# Largest IN list sent in one probe query
+PROBE_LIMIT = 500
+
+
+def format_docket(number, job_type='LOCAL'):
+    return f"{DOCKET_PREFIXES[job_type]}-{number:03d}"
+
+
+def docket_number_of(docket_number):
+    """The number of a LOC- docket, or None."""
+    if not docket_number.startswith('LOC-'):
+        return None
+    try:
+        return int(docket_number.split('-')[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def docket_slot_owner(docket_number):
+    """The shard that allocated a LOC- docket, or None if it can't be told."""
+    number = docket_number_of(docket_number)
+    return slot_owner(number) if number is not None else None
+
+
+def highest_docket_number(alias, model=Job):
+    """The highest LOC- number of the LOCAL jobs on one shard (in ``model``'s table)."""
+    existing_numbers = on_shard(model.objects, alias).filter(
+        job_type='LOCAL',
+        docket_number__startswith='LOC-'
+    ).values_list('docket_number', flat=True)
+
+    highest_number = 0
+    for docket_number in existing_numbers:
+        try:
+            highest_number = max(highest_number, int(docket_number.split('-')[1]))
+        except (IndexError, ValueError):
+            continue
+    return highest_number
+
+
+def get_counter(alias, job_type='LOCAL'):
+    """A shard's counter, created if it has none yet."""
+    try:
+        return on_shard(DocketCounter.objects, alias).get(job_type=job_type)
+    except DocketCounter.DoesNotExist:
+        return create_counter(alias, job_type)
+
+
+def create_counter(alias, job_type='LOCAL'):
+    """
+    Create a shard's counter.  A new shard's LOCAL counter starts above the
+    highest docket and job id on any shard, so it never reuses a number
+    from before sharding.
+    """
+    start = last_job_id = 0
+    if job_type == 'LOCAL' and sharding_enabled():
+        start = max(
+            scatter(highest_docket_number)
+            + scatter(lambda other: highest_docket_number(other, JobArchive))
+        )
+        last_job_id = max(scatter(highest_job_id))
+    return on_shard(DocketCounter.objects, alias).create(
+        job_type=job_type, current_number=start, last_job_id=last_job_id or None
+    )
+
+
+def next_docket_number(counter, alias):
+    """
+    The first free LOCAL docket number after ``counter`` in the shard's
+    slot, as (docket_number, number).
+    """
+    number = free_docket_numbers(counter, alias, 1)[0]
+    return format_docket(number), number
+
+
+def free_docket_numbers(counter, alias, count, anywhere=False):
+    """
+    The first ``count`` numbers after ``counter`` in the shard's slot that
+    no job on the shard has as its docket, in order.  With ``anywhere``,
+    no live or archived job on any shard has them either: FOREIGN dockets
+    are typed in by hand, so any shard may already hold a number in this
+    shard's slot.
+
+    Candidates are checked a window at a time with one query each (per
+    table), and the window doubles after every query, so a counter that
+    lags far behind the jobs table costs a few queries rather than one per
+    taken number.
+    """
+    stride, _ = slot(alias)
+    number = next_in_slot(counter.current_number, alias)
+    window = max(count, PROBE_WINDOW)
+    querysets = [on_shard(Job.objects, alias)]
+    if anywhere:
+        querysets = [on_shard(model.objects, other) for model in (Job, JobArchive) for other in shard_aliases()]
+    free = []
+    while len(free) < count:
+        candidates = [number + step * stride for step in range(min(window, PROBE_LIMIT))]
+        dockets = [format_docket(candidate, counter.job_type) for candidate in candidates]
+        taken = set()
+        for queryset in querysets:
+            taken.update(queryset.filter(docket_number__in=dockets).values_list('docket_number', flat=True))
+        free.extend(candidate for candidate, docket in zip(candidates, dockets) if docket not in taken)
+        number = candidates[-1] + stride
+        window *= 2
+    return free[:count]
+
+
+def next_job_id(counter, alias):
+    """
+    The first job id in ``alias``'s slot above the shard's last one, from
+    its locked LOCAL ``counter``.  The caller stores the id it uses in
+    ``counter.last_job_id`` and saves the counter.  A counter that has no
+    last id yet (it predates sharding) starts above every id on any shard.
+    """
+    if counter.last_job_id is None:
+        counter.last_job_id = max(scatter(highest_job_id))
+    return next_in_slot(counter.last_job_id, alias)
+
+
+def highest_job_id(alias):
+    """The highest live or archived job id on one shard."""
+    # One query: the archive's highest id rides along as a subquery
+    archived = JobArchive.objects.order_by('-job_id').values('job_id')[:1]
+    highest = on_shard(Job.objects, alias).aggregate(live=Max('job_id'), archived=Max(Subquery(archived)))
+    if highest['live'] is None:
+        # No live jobs, so no row to carry the subquery
+        return on_shard(JobArchive.objects, alias).aggregate(highest=Max('job_id'))['highest'] or 0
+    return max(highest['live'], highest['archived'] or 0)
@@ -0,0 +1,128 @@
+"""
+The job event log.
+
+Every change to a job appends ``JobEvent`` rows in the same transaction as
+the change: a CREATED event when it is taken, STATUS and PAYMENT events
+from the status and payment endpoints, an EDIT event per changed field
+of a job edit, and a DELETED event when it is deleted (its earlier events
+stay).  Events are never updated, so a job's timeline and the turnaround
+figures read indexed rows instead of being pieced together from
+``updated_at`` and the job's current state.
+
+Events are written to the job's database and move with it between shards
+(``move_job()``, which also records a ``JobMove`` there).  Archiving
+leaves them where they are.
+"""
+from django.db import transaction
+from django.db.models import Count, DurationField, F, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from paragon_jms.sharding import ShardedQuerySet, move_to_shard, on_shard, scatter
+from settings.cache import get_branch
+from .models import Job, JobEvent, JobMove
+
+# Fields with their own event kind; any other field is an EDIT
+KINDS = {
+    'status': 'STATUS',
+    'payment_status': 'PAYMENT',
+    'payment_ref': 'PAYMENT',
+}
+
+
+def _raw(job, name):
+    return getattr(job, Job._meta.get_field(name).attname)
+
+
+def _text(name, value):
+    """The text an event stores for a value: a branch as its code, anything else as is."""
+    if name == 'branch' and value is not None:
+        branch = get_branch(value)
+        if branch is not None:
+            value = branch.code
+    return '' if value is None else str(value)
+
+
+def snapshot(job, fields):
+    """``job``'s current values of ``fields``, for ``record_changes()`` once it is saved."""
+    return {name: _raw(job, name) for name in fields}
+
+
+def record_changes(job, before, actor=None):
+    """
+    Append an event for each field in ``before`` (a ``snapshot()``) whose
+    value has changed since, on the job's database.  Returns the events.
+    """
+    now = timezone.now()
+    events = [
+        JobEvent(
+            job_id=job.pk,
+            kind=KINDS.get(name, 'EDIT'),
+            field=name,
+            old_value=_text(name, old),
+            new_value=_text(name, _raw(job, name)),
+            actor_id=actor,
+            created_at=now,
+        )
+        for name, old in before.items()
+        if _raw(job, name) != old
+    ]
+    JobEvent.objects.using(job._state.db).bulk_create(events)
+    return events
+
+
+def record_created(job, actor=None):
+    return JobEvent.objects.using(job._state.db).create(
+        job_id=job.pk, kind='CREATED', actor_id=actor, created_at=job.created_at
+    )
+
+
+def record_deleted(job, actor=None):
+    return JobEvent.objects.using(job._state.db).create(job_id=job.pk, kind='DELETED', actor_id=actor)
+
+
+def timeline(job_id):
+    """A job's events, oldest first, from every shard."""
+    return list(ShardedQuerySet(JobEvent.objects.filter(job_id=job_id)))
+
+
+def move_job(job, alias):
+    """``move_to_shard()`` for a live or archived job, taking its events along."""
+    source = job._state.db
+    if source == alias:
+        return
+    with transaction.atomic(using=source, savepoint=False), transaction.atomic(using=alias, savepoint=False):
+        move_to_shard(job, alias)
+        events = list(JobEvent.objects.using(source).filter(job_id=job.pk))
+        for event in events:
+            # Event ids are per database
+            event.pk = None
+        JobEvent.objects.using(alias).bulk_create(events)
+        # Nothing refers to events, so skip the collector's extra select
+        JobEvent.objects.using(source).filter(job_id=job.pk)._raw_delete(source)
+        # The copies keep their timestamps; backups find them by the move
+        JobMove.objects.using(alias).create(job_id=job.pk, source=source)
+
+
+def turnaround(start, end):
+    """
+    How many jobs were marked printed between ``start`` and ``end``
+    (datetimes, end excluded) and the average time from their CREATED
+    event, over every shard: ``{'jobs_printed': n, 'average_hours': h}``.
+    """
+    created = JobEvent.objects.filter(
+        job_id=OuterRef('job_id'), kind='CREATED'
+    ).order_by().values('created_at')[:1]
+    printed = JobEvent.objects.filter(
+        kind='STATUS', new_value='PRINTED', created_at__gte=start, created_at__lt=end
+    ).annotate(started=Subquery(created))
+    # Jobs without a CREATED event have no start and count for nothing
+    totals = scatter(lambda alias: on_shard(printed, alias).aggregate(
+        jobs=Count('started'),
+        elapsed=Sum(F('created_at') - F('started'), output_field=DurationField()),
+    ))
+    jobs = sum(row['jobs'] for row in totals)
+    elapsed = sum((row['elapsed'].total_seconds() for row in totals if row['elapsed'] is not None), 0.0)
+    return {
+        'jobs_printed': jobs,
+        'average_hours': round(elapsed / jobs / 3600, 1) if jobs else None,
+    }
@@ -0,0 +1,24 @@
+import django_filters
+
+from settings.cache import find_branch
+from .models import Job, JobArchive
+
+
+class JobFilter(django_filters.FilterSet):
+    # Filter by branch code, resolved to its key without joining branches
+    branch = django_filters.CharFilter(method='filter_branch')
+
+    class Meta:
+        model = Job
+        fields = ['status', 'payment_status', 'branch', 'job_type']
+
+    def filter_branch(self, queryset, name, value):
+        branch = find_branch(value)
+        if branch is None:
+            return queryset.none()
+        return queryset.filter(branch_id=branch.pk)
+
+
+class JobArchiveFilter(JobFilter):
+    class Meta(JobFilter.Meta):
+        model = JobArchive
@@ -0,0 +1,240 @@
+"""
+The print queue: pending jobs grouped into press runs.
+
+Jobs on the same stock (paper type, weight and size) can run back to back
+without touching the press.  ``build_queue()`` groups the pending jobs by
+stock and orders the groups so consecutive runs share as much of it as
+possible.  Changing paper type costs the most and changing size the least
+(``CHANGEOVER_COSTS``).  Ordering starts from the group with the oldest job
+and always moves on to the cheapest group left, preferring older work
+among equally cheap ones.
+
+With ``gang=True`` each group's small jobs are also packed onto shared
+press sheets.  A group's press sheet is the compatible sheet among
+``settings.GANG_PRESS_SHEETS`` that takes the most pieces ("ups") of its
+size (``jobs.imposition``).  For a run of ``run_sheets`` sheets a job needs
+``ceil(quantity / run_sheets)`` ups.  Jobs that can't fill a sheet alone
+are packed best-fit-decreasing into forms of that many ups.  Each form is
+one plate set, printed for as many sheets as its largest share needs.
+
+Jobs are read as plain rows, one query per shard, and the grouping,
+ordering and packing are in-memory work over the pending jobs only.
+"""
+import heapq
+import math
+
+import numpy as np
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from paragon_jms.sharding import on_shard, scatter, shard_aliases, shard_for_branch, sharding_enabled
+from settings.cache import get_branch_registry
+from .imposition import impose
+from .models import Job
+
+STOCK = ('paper_type', 'paper_weight', 'paper_size')
+# What moving to a group that differs in each part of the stock costs
+CHANGEOVER_COSTS = {'paper_type': 4, 'paper_weight': 2, 'paper_size': 1}
+GANG_RUN_SHEETS = 500
+FIELDS = (
+    'job_id', 'docket_number', 'branch_id', 'customer', 'product_type__name', 'quantity',
+    'created_at', 'paper_type_id', 'paper_type__name', 'paper_weight_id', 'paper_weight__gsm',
+    'paper_size_id', 'paper_size__name', 'paper_size__width_mm', 'paper_size__height_mm',
+)
+
+
+def pending_rows(branch=None):
+    """The pending jobs, oldest first, as rows of ``FIELDS``, from every shard or one branch's."""
+    queryset = Job.objects.filter(status='PENDING').order_by('created_at', 'job_id').values(*FIELDS)
+    aliases = None
+    if branch is not None:
+        queryset = queryset.filter(branch_id=branch.pk)
+        if sharding_enabled():
+            # The branch's shard and default, which keeps the jobs written before sharding
+            aliases = sorted({DEFAULT_DB_ALIAS, shard_for_branch(branch)}, key=shard_aliases().index)
+    per_shard = scatter(lambda alias: list(on_shard(queryset, alias)), aliases)
+    return list(heapq.merge(*per_shard, key=lambda row: (row['created_at'], row['job_id'])))
+
+
+def group_rows(rows):
+    """Groups of rows on the same stock, in order of their oldest job."""
+    groups = {}
+    for row in rows:
+        key = (row['paper_type_id'], row['paper_weight_id'], row['paper_size_id'])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {'key': key, 'rows': []}
+        group['rows'].append(row)
+    return list(groups.values())
+
+
+def order_groups(groups):
+    """
+    ``groups`` (in priority order) reordered to keep changeovers cheap:
+    start with the first, then repeatedly take the cheapest group to change
+    to from the last one, the earliest on a tie.
+    """
+    if len(groups) < 2:
+        return list(groups)
+    # Missing stock (-1) compares like any other value
+    keys = np.array(
+        [[-1 if part is None else part for part in group['key']] for group in groups], dtype=np.int64
+    )
+    weights = np.array([CHANGEOVER_COSTS[part] for part in STOCK], dtype=np.int64)
+    done = np.zeros(len(groups), dtype=bool)
+    order = [0]
+    done[0] = True
+    for _ in range(len(groups) - 1):
+        costs = (keys != keys[order[-1]]) @ weights
+        costs[done] = np.iinfo(np.int64).max
+        # argmin returns the first of equal costs, i.e. the oldest work
+        following = int(np.argmin(costs))
+        done[following] = True
+        order.append(following)
+    return [groups[position] for position in order]
+
+
+def changes(previous, group):
+    """The parts of the stock that change from ``previous`` to ``group``."""
+    if previous is None:
+        return []
+    return [part for part, old, new in zip(STOCK, previous['key'], group['key']) if old != new]
+
+
+def press_sheet(row):
+    """
+    The press sheet (``settings.GANG_PRESS_SHEETS``) compatible with the
+    row's weight that takes the most ups of its paper size, as
+    ``(paper_size_id, name, ups)``, or None if none takes two.
+    """
+    if row['paper_size_id'] is None:
+        return None
+    result = impose(
+        row['paper_size__width_mm'], row['paper_size__height_mm'],
+        paper_weight_id=row['paper_weight_id'],
+    )
+    names = [result['table'].names[position] for position in result['positions']]
+    press = np.array([name in settings.GANG_PRESS_SHEETS for name in names], dtype=bool)
+    if not press.any():
+        return None
+    # Results come least paper first (one piece here), so the first of the
+    # most ups is the smallest such sheet and wastes least
+    ups = np.where(press, result['ups'], 0)
+    best = int(np.argmax(ups))
+    if ups[best] < 2:
+        return None
+    return int(result['paper_size_id'][best]), names[best], int(ups[best])
+
+
+def pack(rows, ups, run_sheets):
+    """
+    Best-fit-decreasing packing of the jobs that can't fill a sheet alone
+    over ``run_sheets`` sheets into forms of ``ups`` ups.  Returns
+    ``(forms, solo)``: forms as lists of ``(row, ups)`` and the rows that
+    run on their own.
+    """
+    small, solo = [], []
+    for row in rows:
+        needed = math.ceil(row['quantity'] / run_sheets)
+        if needed < ups:
+            small.append((needed, row))
+        else:
+            solo.append(row)
+    small.sort(key=lambda item: -item[0])
+
+    forms = []
+    # Open forms by the ups they have left, so each job takes the fullest one it fits
+    by_free = [[] for _ in range(ups + 1)]
+    for needed, row in small:
+        for free in range(needed, ups + 1):
+            if by_free[free]:
+                form = by_free[free].pop()
+                break
+        else:
+            form, free = [], ups
+            forms.append(form)
+        form.append((row, needed))
+        by_free[free - needed].append(form)
+    return forms, solo
+
+
+def _job(row, branches):
+    return {
+        'job_id': row['job_id'],
+        'docket_number': row['docket_number'],
+        'branch': branches.code_for(row['branch_id']),
+        'customer': row['customer'],
+        'product_type': row['product_type__name'],
+        'quantity': row['quantity'],
+        'created_at': row['created_at'],
+    }
+
+
+def _gang(rows, run_sheets):
+    sheet = press_sheet(rows[0])
+    if sheet is None:
+        return None
+    paper_size_id, name, ups = sheet
+    forms, solo = pack(rows, ups, run_sheets)
+    return {
+        'press_sheet': {'id': paper_size_id, 'name': name, 'ups': ups},
+        'forms': [
+            {
+                'sheets': max(math.ceil(row['quantity'] / share) for row, share in form),
+                'ups_used': sum(share for _, share in form),
+                'jobs': [{'job_id': row['job_id'], 'ups': share} for row, share in form],
+            }
+            for form in forms
+        ],
+        'run_alone': [row['job_id'] for row in solo],
+    }
+
+
+def build_queue(branch=None):
+    """
+    The pending jobs as press runs in running order: ``(groups, changeovers)``.
+    Each group has its ``position``, the ``changes`` from the run before
+    and its rows, oldest first; ``changeovers`` counts each kind of change.
+    """
+    groups = order_groups(group_rows(pending_rows(branch)))
+    changeovers = dict.fromkeys(STOCK, 0)
+    previous = None
+    for position, group in enumerate(groups, start=1):
+        group['position'] = position
+        group['changes'] = changes(previous, group)
+        for part in group['changes']:
+            changeovers[part] += 1
+        previous = group
+    return groups, changeovers
+
+
+def describe(group, gang=False, run_sheets=GANG_RUN_SHEETS, jobs_limit=None):
+    """
+    A ``build_queue()`` group as the API returns it, with its gang forms if
+    ``gang``.  ``jobs`` lists the oldest ``jobs_limit`` jobs (all if None);
+    ``job_count`` and ``total_quantity`` always cover the whole run.
+    """
+    rows = group['rows']
+    first = rows[0]
+    branches = get_branch_registry()
+    entry = {
+        'position': group['position'],
+        'paper_type': None if first['paper_type_id'] is None else {
+            'id': first['paper_type_id'], 'name': first['paper_type__name'],
+        },
+        'paper_weight': None if first['paper_weight_id'] is None else {
+            'id': first['paper_weight_id'], 'gsm': first['paper_weight__gsm'],
+        },
+        'paper_size': None if first['paper_size_id'] is None else {
+            'id': first['paper_size_id'], 'name': first['paper_size__name'],
+        },
+        'changes': group['changes'],
+        'job_count': len(rows),
+        'total_quantity': sum(row['quantity'] for row in rows),
+        'oldest': first['created_at'],
+        'jobs': [_job(row, branches) for row in rows[:jobs_limit]],
+    }
+    if gang:
+        entry['gang'] = _gang(rows, run_sheets)
+    return entry
@@ -0,0 +1,204 @@
+"""
+Imposition / sheet-yield calculator.
+
+Given a finished piece size, works out how many pieces ("ups") fit on each
+press sheet in the catalog, in both orientations, how many sheets a run of
+``quantity`` pieces needs and how much of each sheet is wasted.
+
+All sheets are evaluated at once with NumPy.  The sheet table is built once
+per catalog version (shared with ``products.compatibility``) and the
+quantity-independent part of each quote is memoised, so repeated quotes
+only pay for a ceil-divide.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+import threading
+
+import numpy as np
+
+from monitoring.query_budget import unbudgeted
+from products.compatibility import get_index
+from products.models import PaperSize
+
+DEFAULT_BLEED_MM = 3.0
+DEFAULT_GUTTER_MM = 0.0
+DEFAULT_MARGIN_MM = 0.0
+
+_CACHE_SIZE = 256
+_layout_cache = OrderedDict()
+_sheet_tables = {}
+_lock = threading.Lock()
+
+
+class SheetTable:
+    """Column arrays for every catalog size, aligned with the index bit order."""
+
+    def __init__(self, index):
+        self.version = index.version
+        rows = {
+            row['id']: row
+            for row in PaperSize.objects.values('id', 'name', 'width_mm', 'height_mm')
+        }
+        self.ids = np.array(index.size_ids, dtype=np.int64)
+        self.names = [rows.get(pk, {}).get('name', '') for pk in index.size_ids]
+        self.widths = np.array(
+            [float(rows.get(pk, {}).get('width_mm') or 0) for pk in index.size_ids],
+            dtype=np.float64,
+        )
+        self.heights = np.array(
+            [float(rows.get(pk, {}).get('height_mm') or 0) for pk in index.size_ids],
+            dtype=np.float64,
+        )
+
+    def mask(self, bits):
+        """Turn a size bitset from the compatibility index into a boolean mask."""
+        count = len(self.ids)
+        if count == 0:
+            return np.zeros(0, dtype=bool)
+        raw = np.frombuffer(bits.to_bytes((count + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder='little')[:count].astype(bool)
+
+
+def _sheet_table(index):
+    table = _sheet_tables.get(index.version)
+    if table is None:
+        with unbudgeted():
+            table = SheetTable(index)
+        with _lock:
+            _sheet_tables.clear()
+            _sheet_tables[index.version] = table
+    return table
+
+
+def _fit(usable_w, usable_h, piece_w, piece_h, gutter):
+    """Pieces across and down for every sheet, for one piece orientation."""
+    step_w = piece_w + gutter
+    step_h = piece_h + gutter
+    across = np.floor((usable_w + gutter) / step_w)
+    down = np.floor((usable_h + gutter) / step_h)
+    across = np.where(usable_w >= piece_w, across, 0)
+    down = np.where(usable_h >= piece_h, down, 0)
+    return across.astype(np.int64), down.astype(np.int64)
+
+
+def _layout(table, selected, width, height, bleed, gutter, margin):
+    """Quantity-independent layout for the selected sheets (memoised)."""
+    key = (table.version, selected.tobytes(), width, height, bleed, gutter, margin)
+    with _lock:
+        cached = _layout_cache.get(key)
+        if cached is not None:
+            _layout_cache.move_to_end(key)
+            return cached
+
+    sheet_w = table.widths[selected]
+    sheet_h = table.heights[selected]
+    usable_w = sheet_w - 2 * margin
+    usable_h = sheet_h - 2 * margin
+    piece_w = width + 2 * bleed
+    piece_h = height + 2 * bleed
+
+    across, down = _fit(usable_w, usable_h, piece_w, piece_h, gutter)
+    across_r, down_r = _fit(usable_w, usable_h, piece_h, piece_w, gutter)
+    ups = across * down
+    ups_r = across_r * down_r
+    rotated = ups_r > ups
+
+    ups_best = np.where(rotated, ups_r, ups)
+    sheet_area = sheet_w * sheet_h
+    with np.errstate(divide='ignore', invalid='ignore'):
+        waste = np.where(
+            sheet_area > 0,
+            100.0 * (1.0 - ups_best * (width * height) / sheet_area),
+            100.0,
+        )
+
+    layout = {
+        'positions': np.flatnonzero(selected),
+        'across': np.where(rotated, across_r, across),
+        'down': np.where(rotated, down_r, down),
+        'ups': ups_best,
+        'rotated': rotated,
+        'waste': np.clip(waste, 0.0, 100.0),
+    }
+    with _lock:
+        _layout_cache[key] = layout
+        if len(_layout_cache) > _CACHE_SIZE:
+            _layout_cache.popitem(last=False)
+    return layout
+
+
+def impose(width_mm, height_mm, quantity=1, bleed_mm=DEFAULT_BLEED_MM,
+           gutter_mm=DEFAULT_GUTTER_MM, margin_mm=DEFAULT_MARGIN_MM,
+           paper_weight_id=None, paper_size_ids=None):
+    """
+    Evaluate every compatible sheet for a finished size.
+
+    Returns a dict of NumPy arrays (one entry per sheet that fits at least
+    one piece): ``paper_size_id``, ``ups``, ``across``, ``down``,
+    ``rotated``, ``sheets`` and ``waste_percent``, ordered by the paper the
+    run uses (sheets times sheet area), then sheets needed, then waste.
+    Counting sheets alone would favour the biggest sheet for any real
+    quantity.
+    """
+    index = get_index()
+    table = _sheet_table(index)
+
+    bits = index.sizes_for_weight(paper_weight_id)
+    selected = table.mask(bits) & (table.widths > 0) & (table.heights > 0)
+    if paper_size_ids is not None:
+        selected &= np.isin(table.ids, np.asarray(list(paper_size_ids), dtype=np.int64))
+
+    layout = _layout(
+        table, selected,
+        float(width_mm), float(height_mm),
+        float(bleed_mm), float(gutter_mm), float(margin_mm),
+    )
+
+    fits = layout['ups'] > 0
+    ups = layout['ups'][fits]
+    sheets = -(-int(quantity) // ups) if len(ups) else ups
+    waste = layout['waste'][fits]
+    positions = layout['positions'][fits]
+    paper = sheets * table.widths[positions] * table.heights[positions]
+    order = np.lexsort((waste, sheets, paper))
+    positions = positions[order]
+
+    return {
+        'positions': positions,
+        'paper_size_id': table.ids[positions],
+        'ups': ups[order],
+        'across': layout['across'][fits][order],
+        'down': layout['down'][fits][order],
+        'rotated': layout['rotated'][fits][order],
+        'sheets': sheets[order],
+        'waste_percent': waste[order],
+        'table': table,
+    }
+
+
+def _mm(value):
+    # Match DRF's DecimalField output for dimensions
+    return str(Decimal(str(value)).quantize(Decimal('0.01')))
+
+
+def quote(width_mm, height_mm, quantity=1, limit=None, **options):
+    """Imposition results as a list of plain dicts, least paper first."""
+    result = impose(width_mm, height_mm, quantity, **options)
+    table = result['table']
+    count = len(result['positions']) if limit is None else min(limit, len(result['positions']))
+
+    return [
+        {
+            'paper_size': int(result['paper_size_id'][i]),
+            'paper_size_name': table.names[result['positions'][i]],
+            'sheet_width_mm': _mm(table.widths[result['positions'][i]]),
+            'sheet_height_mm': _mm(table.heights[result['positions'][i]]),
+            'orientation': 'rotated' if result['rotated'][i] else 'normal',
+            'across': int(result['across'][i]),
+            'down': int(result['down'][i]),
+            'ups': int(result['ups'][i]),
+            'sheets': int(result['sheets'][i]),
+            'waste_percent': round(float(result['waste_percent'][i]), 2),
+        }
+        for i in range(count)
+    ]
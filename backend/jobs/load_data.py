@@ -0,0 +1,395 @@
+"""
+Synthetic jobs at production scale, for load and performance testing.
+
+``python manage.py generate_load_data --jobs N`` writes N jobs built from
+the existing branches, catalog and staff (run ``seed_data`` first).  The
+mix is skewed the way real order books are: a few branches, products and
+repeat customers take most of the work, weekdays are busier than
+weekends, the book grows over the period, and how far a job has got
+(pending, printed, paid) depends on how old it is.  Every product, paper
+type, weight and size combination passes the compatibility index, as a
+job created through the API would, and each job comes with the event log
+(``jobs.events``) of getting where it is: taken, printed and paid.
+
+Jobs are generated a batch at a time, each batch from its own random
+seed, so a given ``--seed`` produces the same jobs whatever the number of
+workers.  Each batch is written to its branches' shards with
+``bulk_create()`` in one transaction per shard that holds the shard's
+docket counters, exactly as creating one job does: dockets are the next
+free numbers in the shard's slot (``jobs.dockets.free_docket_numbers()``),
+the counters are moved past them, and with sharding the job ids are
+taken from the shard's slot too.  Only the allocation and the insert run
+under the lock; building the jobs does not.
+"""
+import bisect
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from decimal import Decimal
+import random
+
+import django
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.utils import timezone
+
+from paragon_jms.backup import keep_timestamps
+from paragon_jms.sharding import shard_for_branch, sharding_enabled, slot
+from products.compatibility import get_index
+from products.models import PaperSize, PaperType, PaperWeight, ProductType
+from settings.cache import get_branch_registry
+from .dockets import format_docket, free_docket_numbers, get_counter, next_job_id
+from .models import DocketCounter, Job, JobEvent
+
+COMPANY_WORDS = [
+    'Acacia', 'Baobab', 'Zambezi', 'Mukuvisi', 'Msasa', 'Sunrise', 'Highveld',
+    'Granite', 'Kopje', 'Mopane', 'Savanna', 'Limpopo', 'Victoria', 'Eastgate',
+    'Unity', 'Horizon', 'Summit', 'Pioneer', 'Heritage', 'Crescent',
+]
+COMPANY_TRADES = [
+    'Logistics', 'Pharmacy', 'Motors', 'Holdings', 'Foods', 'Engineering',
+    'Hardware', 'Academy', 'Clinic', 'Properties', 'Insurance', 'Traders',
+    'Solutions', 'Media', 'Construction', 'Farms', 'Hotels', 'Fellowship',
+    'Microfinance', 'Consulting',
+]
+COMPANY_SUFFIXES = ['(Pvt) Ltd', 'Ltd', '& Co', 'Group', 'Trust', '']
+FIRST_NAMES = [
+    'Tendai', 'Rutendo', 'Farai', 'Chipo', 'Tatenda', 'Nyasha', 'Kudzai',
+    'Tafadzwa', 'Blessing', 'Grace', 'Themba', 'Sipho', 'Rudo', 'Tinashe',
+    'Memory', 'Simba', 'Precious', 'Tapiwa', 'Vimbai', 'Nokuthula',
+]
+LAST_NAMES = [
+    'Moyo', 'Ncube', 'Sibanda', 'Dube', 'Chikwanha', 'Mutasa', 'Nyathi',
+    'Mapfumo', 'Chirwa', 'Banda', 'Gumbo', 'Mhlanga', 'Zulu', 'Marufu',
+    'Mukanya', 'Ndlovu', 'Chari', 'Makoni', 'Shumba', 'Mpofu',
+]
+FINISHES = [
+    'full colour, single-sided', 'full colour, double-sided', 'black and white',
+    'with logo', 'laminated', 'spot UV', 'perforated', 'numbered',
+]
+NOTES = ['Rush order', 'Proof before print', 'Deliver to client', 'Collect at branch', 'Repeat of last order']
+
+# Run lengths and how often each is ordered: small and medium runs dominate
+QUANTITIES = [50, 100, 250, 500, 1000, 2000, 5000, 10000, 20000]
+QUANTITY_WEIGHTS = [5, 15, 15, 20, 20, 10, 8, 5, 2]
+DESIGN_COSTS = [0, 0, 0, 0, 0, 10, 15, 20, 25, 50, 75, 100, 150]
+# Orders taken per hour of the day
+HOUR_WEIGHTS = {7: 2, 8: 8, 9: 12, 10: 12, 11: 11, 12: 7, 13: 8, 14: 11, 15: 10, 16: 8, 17: 4, 18: 1}
+WEEKDAY_WEIGHTS = [1.0, 1.0, 1.0, 1.0, 0.9, 0.45, 0.1]
+FOREIGN_SHARE = 0.15
+MAX_COST = Decimal('99999999.99')
+
+
+def _cumulative(weights):
+    total, cumulative = 0, []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def _zipf(count, exponent=1.0):
+    """Weights of a Zipf distribution over ``count`` ranks."""
+    return _cumulative(1 / rank ** exponent for rank in range(1, count + 1))
+
+
+def _pick(rng, items, cumulative):
+    return items[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+
+
+class LoadPlan:
+    """
+    Everything a batch is generated from: branches, catalog combinations,
+    customers, staff and the date range, with their distributions.  Built
+    once from the database and handed to every worker.
+    """
+
+    def __init__(self, seed=0, days=365, customers=None, jobs=0, branch_codes=None):
+        rng = random.Random(f'{seed}:plan')
+        self.seed = seed
+        self.now = timezone.now()
+        self.days = days
+
+        registry = get_branch_registry()
+        branches = [
+            branch for code, branch in sorted(registry.by_code.items())
+            if (code in branch_codes if branch_codes else branch.is_active)
+        ]
+        if not branches:
+            raise ValueError('No branches to create jobs for')
+        rng.shuffle(branches)
+        self.branches = [branch.pk for branch in branches]
+        self.shards = {branch.pk: shard_for_branch(branch) for branch in branches}
+        self.branch_weights = _zipf(len(branches), 0.8)
+
+        self._plan_catalog(rng)
+        self._plan_customers(rng, customers or min(max(jobs // 40, 25), 50000))
+
+        staff = get_user_model().objects.filter(approved=True, role__isnull=False)
+        takers = sorted(staff.values_list('full_name', flat=True))
+        reps = sorted(staff.filter(role='SALES_REPRESENTATIVE').values_list('full_name', flat=True))
+        if not takers:
+            takers = [f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(8)]
+        self.order_takers = takers
+        self.sales_reps = reps or takers
+
+        # Busier on weekdays, and the book grows over the period
+        today = timezone.localtime(self.now).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.day_starts = [today - timedelta(days=offset) for offset in range(days)]
+        self.day_weights = _cumulative(
+            WEEKDAY_WEIGHTS[start.weekday()] * (1.3 - 0.6 * offset / days)
+            for offset, start in enumerate(self.day_starts)
+        )
+        self.hours = list(HOUR_WEIGHTS)
+        self.hour_weights = _cumulative(HOUR_WEIGHTS.values())
+        self.quantity_weights = _cumulative(QUANTITY_WEIGHTS)
+
+    def _plan_catalog(self, rng):
+        """Every valid (type, weight, size) per product, each product with its own favourites."""
+        index = get_index()
+        type_ids = sorted(PaperType.objects.values_list('id', flat=True))
+        weight_ids = sorted(PaperWeight.objects.values_list('id', flat=True))
+        size_ids = sorted(PaperSize.objects.filter(
+            is_custom=False, width_mm__gt=0, height_mm__gt=0
+        ).values_list('id', flat=True))
+
+        self.products = []
+        for product_id, name in ProductType.objects.order_by('id').values_list('id', 'name'):
+            combinations = [
+                (type_id, weight_id, size_id)
+                for type_id in type_ids if index.is_valid(product_id, type_id)
+                for weight_id in weight_ids if index.is_valid(product_id, type_id, weight_id)
+                for size_id in size_ids if index.is_valid(product_id, type_id, weight_id, size_id)
+            ]
+            if not combinations:
+                continue
+            rng.shuffle(combinations)
+            # Price per copy at a run of one; longer runs are cheaper per copy
+            unit_price = rng.uniform(0.05, 2.5)
+            self.products.append((product_id, name, unit_price, combinations, _zipf(len(combinations), 1.2)))
+        if not self.products:
+            raise ValueError('The catalog has no valid product specifications')
+        rng.shuffle(self.products)
+        self.product_weights = _zipf(len(self.products), 0.7)
+
+    def _plan_customers(self, rng, count):
+        """``count`` customers; a few of them place most of the orders."""
+        names = set()
+        self.customers = []
+        while len(self.customers) < count:
+            name = ' '.join(filter(None, (
+                rng.choice(COMPANY_WORDS), rng.choice(COMPANY_TRADES), rng.choice(COMPANY_SUFFIXES)
+            )))
+            if name in names:
+                name = f'{name} {len(self.customers)}'
+            names.add(name)
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            domain = ''.join(word for word in name.lower().split()[:2] if word.isalnum())
+            self.customers.append((
+                name,
+                f'{first} {last}',
+                f'+26377{rng.randrange(10 ** 7):07d}',
+                f'{first.lower()}.{last.lower()}@{domain}.co.zw',
+            ))
+        self.customer_weights = _zipf(count, 0.7)
+
+    def job(self, rng):
+        """One unsaved job; its docket (LOCAL) and, with sharding, its id are allocated on insert."""
+        branch_id = _pick(rng, self.branches, self.branch_weights)
+        product_id, product_name, unit_price, combinations, weights = _pick(rng, self.products, self.product_weights)
+        paper_type_id, paper_weight_id, paper_size_id = _pick(rng, combinations, weights)
+        customer, contact_person, mobile_number, email_address = _pick(rng, self.customers, self.customer_weights)
+        quantity = _pick(rng, QUANTITIES, self.quantity_weights)
+
+        created_at = min(
+            _pick(rng, self.day_starts, self.day_weights)
+            + timedelta(hours=_pick(rng, self.hours, self.hour_weights), seconds=rng.randrange(3600)),
+            self.now,
+        )
+        status, payment_status, status_at, updated_at = self._progress(rng, created_at)
+        print_cost = min(
+            Decimal(max(5.0, unit_price * quantity ** 0.8 * rng.lognormvariate(0, 0.25))).quantize(Decimal('0.01')),
+            MAX_COST,
+        )
+        design_cost = Decimal(rng.choice(DESIGN_COSTS)).quantize(Decimal('0.01'))
+        payment_ref = ''
+        if payment_status != 'NOT_MARKED':
+            payment_ref = f"{'REC' if payment_status == 'RECEIPTED' else 'INV'}-{rng.randrange(10 ** 6):06d}"
+
+        job = Job(
+            branch_id=branch_id,
+            job_type='FOREIGN' if rng.random() < FOREIGN_SHARE else 'LOCAL',
+            sales_rep=rng.choice(self.sales_reps),
+            order_taken_by=rng.choice(self.order_takers),
+            customer=customer,
+            contact_person=contact_person,
+            mobile_number=mobile_number,
+            email_address=email_address,
+            quantity=quantity,
+            description=f'{product_name}, {rng.choice(FINISHES)}',
+            product_type_id=product_id,
+            paper_type_id=paper_type_id,
+            paper_weight_id=paper_weight_id,
+            paper_size_id=paper_size_id,
+            notes=rng.choice(NOTES) if rng.random() < 0.3 else '',
+            print_cost=print_cost,
+            design_cost=design_cost,
+            total_cost=print_cost + design_cost,
+            status=status,
+            payment_status=payment_status,
+            payment_ref=payment_ref,
+            date=created_at,
+            created_at=created_at,
+            updated_at=updated_at,
+        )
+        # The history that got it there, given its id on insert
+        events = [JobEvent(kind='CREATED', created_at=created_at)]
+        if status != 'PENDING':
+            events.append(JobEvent(
+                kind='STATUS', field='status', old_value='PENDING', new_value=status, created_at=status_at
+            ))
+        if payment_status != 'NOT_MARKED':
+            events += [
+                JobEvent(kind='PAYMENT', field='payment_status', old_value='NOT_MARKED',
+                         new_value=payment_status, created_at=updated_at),
+                JobEvent(kind='PAYMENT', field='payment_ref', new_value=payment_ref, created_at=updated_at),
+            ]
+        job.load_events = events
+        return job
+
+    def _progress(self, rng, created_at):
+        """
+        (status, payment_status, status changed at, updated_at) of a job
+        created at ``created_at``: older jobs got further.
+        """
+        age = self.now - created_at
+        roll = rng.random()
+        if roll < 0.03:
+            status = 'CANCELLED'
+        elif age < timedelta(days=2):
+            status = 'PENDING' if roll < 0.7 else 'PRINTED'
+        elif age < timedelta(days=14):
+            status = 'PENDING' if roll < 0.2 else 'PRINTED'
+        else:
+            status = 'PENDING' if roll < 0.05 else 'PRINTED'
+
+        payment_status = 'NOT_MARKED'
+        if status == 'PRINTED':
+            unpaid = 0.6 if age < timedelta(days=7) else 0.08
+            if rng.random() >= unpaid:
+                payment_status = 'RECEIPTED' if rng.random() < 0.65 else 'INVOICED'
+        elif status == 'PENDING' and rng.random() < 0.1:
+            payment_status = 'RECEIPTED'
+
+        # Printed within a few days, paid within a month of that
+        updated_at = created_at + timedelta(minutes=rng.randrange(5, 120))
+        if status != 'PENDING':
+            updated_at += timedelta(hours=rng.uniform(1, 120))
+        status_at = min(updated_at, self.now)
+        if payment_status != 'NOT_MARKED':
+            updated_at += timedelta(days=rng.uniform(0, 30))
+        return status, payment_status, status_at, min(updated_at, self.now)
+
+
+def insert_jobs(jobs, alias):
+    """
+    Write jobs for one shard, and their events, in one transaction,
+    allocating their dockets from the shard's counters (and ids, with
+    sharding) as creating them one by one would.  FOREIGN jobs are numbered
+    from the FOREIGN counter, skipping dockets taken on any shard or in the
+    archive.
+    """
+    jobs = sorted(jobs, key=lambda job: job.created_at)
+    job_types = [job_type for job_type in ('LOCAL', 'FOREIGN') if any(job.job_type == job_type for job in jobs)]
+    if sharding_enabled():
+        # The LOCAL counter lock also serializes job id allocation
+        job_types = ['LOCAL'] + [job_type for job_type in job_types if job_type != 'LOCAL']
+    for job_type in job_types:
+        get_counter(alias, job_type)
+
+    with transaction.atomic(using=alias):
+        # Always locked in the same order, so concurrent batches can't deadlock
+        counters = {
+            counter.job_type: counter
+            for counter in DocketCounter.objects.using(alias).select_for_update().filter(
+                job_type__in=job_types
+            ).order_by('job_type')
+        }
+        for job_type in job_types:
+            typed = [job for job in jobs if job.job_type == job_type]
+            if not typed:
+                continue
+            counter = counters[job_type]
+            # FOREIGN dockets are typed in through the API on any shard
+            numbers = free_docket_numbers(counter, alias, len(typed), anywhere=job_type == 'FOREIGN')
+            for job, number in zip(typed, numbers):
+                job.docket_number = format_docket(number, job_type)
+            counter.current_number = numbers[-1]
+            counter.save()
+
+        if sharding_enabled():
+            stride, _ = slot(alias)
+            counter = counters['LOCAL']
+            first = next_job_id(counter, alias)
+            for position, job in enumerate(jobs):
+                job.job_id = first + position * stride
+            counter.last_job_id = jobs[-1].job_id
+            counter.save()
+
+        with keep_timestamps(Job):
+            Job.objects.using(alias).bulk_create(jobs)
+
+        events = []
+        for job in jobs:
+            for event in job.load_events:
+                event.job_id = job.job_id
+                events.append(event)
+        JobEvent.objects.using(alias).bulk_create(events)
+    return len(jobs)
+
+
+def generate_batch(plan, index, size):
+    """Generate batch ``index`` of ``plan`` and write it.  Returns how many jobs were written."""
+    rng = random.Random(f'{plan.seed}:{index}')
+    by_shard = {}
+    for _ in range(size):
+        job = plan.job(rng)
+        by_shard.setdefault(plan.shards[job.branch_id], []).append(job)
+    return sum(insert_jobs(jobs, alias) for alias, jobs in by_shard.items())
+
+
+def batch_sizes(total, batch_size):
+    return [min(batch_size, total - start) for start in range(0, total, batch_size)]
+
+
+_plan = None
+
+
+def _start_worker(plan):
+    global _plan
+    # Spawned workers start without Django; forked ones already have it
+    django.setup()
+    _plan = plan
+
+
+def _run_batch(index, size):
+    return generate_batch(_plan, index, size)
+
+
+def generate(plan, total, batch_size=2000, workers=1):
+    """
+    Write ``total`` jobs in batches of ``batch_size``, with ``workers``
+    processes if more than one.  Yields the number of jobs of each batch
+    as it is written (in completion order with workers).
+    """
+    sizes = batch_sizes(total, batch_size)
+    if workers <= 1:
+        for index, size in enumerate(sizes):
+            yield generate_batch(plan, index, size)
+        return
+
+    # Workers open their own connections; forked ones must not share ours
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_start_worker, initargs=(plan,)) as pool:
+        futures = [pool.submit(_run_batch, index, size) for index, size in enumerate(sizes)]
+        for future in as_completed(futures):
+            yield future.result()
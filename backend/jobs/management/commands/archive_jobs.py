@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from jobs import archive
+from paragon_jms.sharding import shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        'Move printed, receipted or invoiced jobs not changed for --days days '
+        'from the jobs table to jobs_archive, in batches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.JOB_ARCHIVE_AFTER_DAYS,
+                            help='Archive settled jobs last changed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Jobs moved per transaction')
+        parser.add_argument('--shard', action='append', dest='shards',
+                            help='Only archive on this shard alias (repeatable)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the jobs that would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        aliases = shard_aliases()
+        targets = options['shards'] or aliases
+        unknown = set(targets) - set(aliases)
+        if unknown:
+            raise CommandError(f'Unknown shards: {", ".join(sorted(unknown))}')
+
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        total = 0
+        for alias in targets:
+            if options['dry_run']:
+                count = archive.archivable(alias, cutoff).count()
+                self.stdout.write(f'{alias}: {count} job(s) would be archived')
+                total += count
+                continue
+
+            moved = 0
+            while True:
+                batch = archive.archive_batch(alias, cutoff, options['batch_size'])
+                if not batch:
+                    break
+                moved += batch
+                # Analytics and dashboards recount the archive
+                archive.invalidate()
+                self.stdout.write(f'{alias}: {moved} job(s) archived')
+            total += moved
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{total} job(s) would be archived'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Archived {total} job(s) settled before {cutoff:%Y-%m-%d %H:%M}'))
@@ -0,0 +1,69 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from jobs.load_data import LoadPlan, generate
+from settings.cache import get_branch_registry
+
+
+class Command(BaseCommand):
+    help = (
+        'Create --jobs synthetic jobs with realistic branch, product, customer, '
+        'status and date distributions, in bulk, for load and performance testing'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=10000,
+                            help='Number of jobs to create')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Jobs generated and inserted per transaction')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes generating and inserting batches')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed; the same seed creates the same jobs')
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread the jobs over this many days up to today')
+        parser.add_argument('--customers', type=int,
+                            help='Number of distinct customers (default: one per 40 jobs)')
+        parser.add_argument('--branch', action='append', dest='branches',
+                            help='Only create jobs for this branch code (repeatable)')
+
+    def handle(self, *args, **options):
+        for option in ('jobs', 'batch_size', 'workers', 'days'):
+            if options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} must be at least 1')
+        if options['customers'] is not None and options['customers'] < 1:
+            raise CommandError('--customers must be at least 1')
+
+        if options['branches']:
+            unknown = set(options['branches']) - set(get_branch_registry().codes)
+            if unknown:
+                raise CommandError(f'Unknown branches: {", ".join(sorted(unknown))}')
+
+        try:
+            plan = LoadPlan(
+                seed=options['seed'],
+                days=options['days'],
+                customers=options['customers'],
+                jobs=options['jobs'],
+                branch_codes=options['branches'],
+            )
+        except ValueError as e:
+            raise CommandError(f'{e} (run seed_data first)')
+
+        shards = set(plan.shards.values())
+        if options['workers'] > 1 and any(connections[alias].vendor == 'sqlite' for alias in shards):
+            raise CommandError('SQLite takes one writer at a time: use --workers 1')
+
+        started = time.monotonic()
+        created = 0
+        for count in generate(plan, options['jobs'], options['batch_size'], options['workers']):
+            created += count
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{created}/{options["jobs"]} job(s), {created / elapsed:.0f}/s')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} job(s) for {len(plan.branches)} branch(es) '
+            f'and {len(plan.customers)} customer(s) in {time.monotonic() - started:.1f}s'
+        ))
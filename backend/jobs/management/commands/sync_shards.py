@@ -0,0 +1,76 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from jobs.dockets import create_counter, get_counter, highest_docket_number
+from jobs.events import move_job
+from jobs.models import DocketCounter, Job, JobArchive
+from paragon_jms import sharding
+from settings.cache import get_branch_registry
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy branches and the catalog rows jobs point at from default to every job shard, '
+        'and start each shard\'s docket counters above every existing docket'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shard', action='append', dest='shards',
+                            help='Only sync this shard alias (repeatable)')
+        parser.add_argument('--move-jobs', action='store_true',
+                            help="Also move jobs on default whose branch now maps to another shard")
+
+    def handle(self, *args, **options):
+        aliases = sharding.shard_aliases()
+        if not sharding.sharding_enabled():
+            raise CommandError('Sharding is off: set JOB_SHARD_URLS to add shard databases')
+
+        unknown = set(settings.JOB_SHARD_BRANCHES.values()) - set(aliases)
+        if unknown:
+            raise CommandError(f'JOB_SHARD_BRANCHES names unknown shards: {", ".join(sorted(unknown))}')
+        sharding.slot(DEFAULT_DB_ALIAS)  # validates JOB_SHARD_STRIDE
+
+        missing = set(settings.JOB_SHARD_BRANCHES) - set(get_branch_registry().codes)
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'JOB_SHARD_BRANCHES maps branches that do not exist: {", ".join(sorted(missing))}'
+            ))
+
+        targets = options['shards'] or [alias for alias in aliases if alias != DEFAULT_DB_ALIAS]
+        for alias in targets:
+            if alias not in aliases or alias == DEFAULT_DB_ALIAS:
+                raise CommandError(f'{alias} is not a shard other than default')
+            for label in sharding.REFERENCE_MODELS:
+                written, deleted = sharding.sync_reference_rows(apps.get_model(label), alias)
+                self.stdout.write(f'{alias}: {label}: {written} rows copied, {deleted} removed')
+
+            for job_type in ('LOCAL', 'FOREIGN'):
+                if not DocketCounter.objects.using(alias).filter(job_type=job_type).exists():
+                    counter = create_counter(alias, job_type)
+                    self.stdout.write(f'{alias}: {job_type} docket counter starts at {counter.current_number}')
+
+        # Catch default's counter up too, so its first job doesn't probe every legacy docket
+        counter = get_counter(DEFAULT_DB_ALIAS)
+        highest = highest_docket_number(DEFAULT_DB_ALIAS)
+        if highest > counter.current_number:
+            counter.current_number = highest
+            counter.save()
+            self.stdout.write(f'{DEFAULT_DB_ALIAS}: LOCAL docket counter moved up to {highest}')
+
+        if options['move_jobs']:
+            self._move_jobs(targets)
+
+        self.stdout.write(self.style.SUCCESS(f'Synced {len(targets)} shard(s)'))
+
+    def _move_jobs(self, targets):
+        codes = [code for code, alias in settings.JOB_SHARD_BRANCHES.items() if alias in targets]
+        registry = get_branch_registry()
+        branch_ids = [registry.by_code[code].pk for code in codes if code in registry.by_code]
+        moved = 0
+        for model in (Job, JobArchive):
+            for job in model.objects.using(DEFAULT_DB_ALIAS).filter(branch_id__in=branch_ids).iterator():
+                move_job(job, sharding.shard_for_branch(job.branch_id))
+                moved += 1
+        self.stdout.write(f'Moved {moved} live and archived job(s), with their events, from {DEFAULT_DB_ALIAS} to their branch shards')
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings', '0001_initial'),
+        ('jobs', '0002_remove_job_cover_stock_remove_job_size_and_more'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='job',
+            old_name='branch',
+            new_name='branch_code',
+        ),
+        # Nullable while both columns exist, so the migrations can be reversed
+        migrations.AlterField(
+            model_name='job',
+            name='branch_code',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='branch',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='jobs', to='settings.branch'),
+        ),
+    ]
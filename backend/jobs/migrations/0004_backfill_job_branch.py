@@ -0,0 +1,49 @@
+from django.db import migrations
+
+
+# The branches that used to be hard-coded as Job.BRANCH_CHOICES
+BRANCHES = [
+    ('BORROWDALE', 'Borrowdale'),
+    ('EASTLEA', 'Eastlea'),
+    ('BELGRAVIA', 'Belgravia'),
+    ('AVONDALE', 'Avondale'),
+    ('MSASA', 'Msasa'),
+    ('CHITUNGWIZA', 'Chitungwiza'),
+]
+
+
+def backfill_branches(apps, schema_editor):
+    Branch = apps.get_model('settings', 'Branch')
+    Job = apps.get_model('jobs', 'Job')
+
+    db_alias = schema_editor.connection.alias
+    names = dict(BRANCHES)
+    codes = set(names) | set(Job.objects.using(db_alias).values_list('branch_code', flat=True).distinct())
+    for code in sorted(codes):
+        branch, _ = Branch.objects.using(db_alias).get_or_create(
+            code=code[:20],
+            defaults={'name': names.get(code, code.replace('_', ' ').title())},
+        )
+        Job.objects.using(db_alias).filter(branch_code=code).update(branch=branch)
+
+
+def restore_branch_codes(apps, schema_editor):
+    Branch = apps.get_model('settings', 'Branch')
+    Job = apps.get_model('jobs', 'Job')
+    db_alias = schema_editor.connection.alias
+    for branch in Branch.objects.using(db_alias).all():
+        Job.objects.using(db_alias).filter(branch=branch).update(branch_code=branch.code)
+
+
+# Its own migration: on PostgreSQL the UPDATEs leave deferred FK trigger events
+# pending, and ALTER TABLE on jobs in the same transaction then fails
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings', '0001_initial'),
+        ('jobs', '0003_job_branch_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_branches, restore_branch_codes),
+    ]
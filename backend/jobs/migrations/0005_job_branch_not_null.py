@@ -0,0 +1,21 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0004_backfill_job_branch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='branch',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='jobs', to='settings.branch'),
+        ),
+        migrations.RemoveField(
+            model_name='job',
+            name='branch_code',
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-19 08:24
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings', '0001_initial'),
+        ('products', '0005_price_rates'),
+        ('jobs', '0005_job_branch_not_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobArchive',
+            fields=[
+                ('job_type', models.CharField(choices=[('LOCAL', 'Local'), ('FOREIGN', 'Foreign')], max_length=10)),
+                ('docket_number', models.CharField(max_length=20, unique=True)),
+                ('sales_rep', models.CharField(max_length=100)),
+                ('order_taken_by', models.CharField(max_length=100)),
+                ('customer', models.CharField(max_length=200)),
+                ('contact_person', models.CharField(max_length=100)),
+                ('mobile_number', models.CharField(max_length=20)),
+                ('email_address', models.EmailField(max_length=254)),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('description', models.TextField()),
+                ('notes', models.TextField(blank=True)),
+                ('print_cost', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('design_cost', models.DecimalField(decimal_places=2, default=0, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('total_cost', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('PRINTED', 'Printed'), ('CANCELLED', 'Cancelled')], default='PENDING', max_length=20)),
+                ('payment_status', models.CharField(choices=[('NOT_MARKED', 'Not Marked'), ('RECEIPTED', 'Receipted'), ('INVOICED', 'Invoiced')], default='NOT_MARKED', max_length=20)),
+                ('payment_ref', models.CharField(blank=True, max_length=50)),
+                ('job_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateTimeField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_jobs', to='settings.branch')),
+                ('paper_size', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_jobs', to='products.papersize')),
+                ('paper_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_jobs', to='products.papertype')),
+                ('paper_weight', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_jobs', to='products.paperweight')),
+                ('product_type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_jobs', to='products.producttype')),
+            ],
+            options={
+                'db_table': 'jobs_archive',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
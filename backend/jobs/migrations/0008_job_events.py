@@ -0,0 +1,47 @@
+from itertools import islice
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def backfill_created(apps, schema_editor):
+    # Jobs from before the event log get their CREATED event, so turnaround
+    # figures can start from it
+    JobEvent = apps.get_model('jobs', 'JobEvent')
+    db_alias = schema_editor.connection.alias
+    for model_name in ('Job', 'JobArchive'):
+        model = apps.get_model('jobs', model_name)
+        rows = model.objects.using(db_alias).values_list('job_id', 'created_at').order_by().iterator()
+        while batch := list(islice(rows, 1000)):
+            JobEvent.objects.using(db_alias).bulk_create([
+                JobEvent(job_id=job_id, kind='CREATED', created_at=created_at) for job_id, created_at in batch
+            ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0007_jobarchive_archived_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.IntegerField()),
+                ('kind', models.CharField(choices=[('CREATED', 'Created'), ('STATUS', 'Status'), ('PAYMENT', 'Payment'), ('EDIT', 'Edit')], max_length=10)),
+                ('field', models.CharField(blank=True, max_length=30)),
+                ('old_value', models.TextField(blank=True)),
+                ('new_value', models.TextField(blank=True)),
+                ('actor_id', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'job_events',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['job_id', 'kind', 'created_at'], name='job_events_job_time'), models.Index(fields=['kind', 'created_at'], name='job_events_kind_time')],
+            },
+        ),
+        migrations.RunPython(backfill_created, migrations.RunPython.noop),
+    ]
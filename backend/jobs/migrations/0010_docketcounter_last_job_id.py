@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0009_job_status_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='docketcounter',
+            name='last_job_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0010_docketcounter_last_job_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='jobevent',
+            name='kind',
+            field=models.CharField(choices=[('CREATED', 'Created'), ('STATUS', 'Status'), ('PAYMENT', 'Payment'), ('EDIT', 'Edit'), ('DELETED', 'Deleted')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0011_jobevent_deleted_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobMove',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.IntegerField()),
+                ('source', models.CharField(max_length=100)),
+                ('moved_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'job_moves',
+                'indexes': [models.Index(fields=['moved_at'], name='job_moves_time')],
+            },
+        ),
+    ]
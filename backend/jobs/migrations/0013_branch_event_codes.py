@@ -0,0 +1,40 @@
+from django.db import migrations
+
+
+def branch_ids_to_codes(apps, schema_editor):
+    Branch = apps.get_model('settings', 'Branch')
+    JobEvent = apps.get_model('jobs', 'JobEvent')
+
+    db_alias = schema_editor.connection.alias
+    codes = {}
+    for pk, code in Branch.objects.using(db_alias).values_list('id', 'code'):
+        codes[str(pk)] = codes[pk.hex] = code
+    events = JobEvent.objects.using(db_alias).filter(field='branch')
+    for column in ('old_value', 'new_value'):
+        for value in events.values_list(column, flat=True).distinct():
+            if value in codes:
+                events.filter(**{column: value}).update(**{column: codes[value]})
+
+
+def branch_codes_to_ids(apps, schema_editor):
+    Branch = apps.get_model('settings', 'Branch')
+    JobEvent = apps.get_model('jobs', 'JobEvent')
+
+    db_alias = schema_editor.connection.alias
+    events = JobEvent.objects.using(db_alias).filter(field='branch')
+    for pk, code in Branch.objects.using(db_alias).values_list('id', 'code'):
+        for column in ('old_value', 'new_value'):
+            events.filter(**{column: code}).update(**{column: str(pk)})
+
+
+# Branch EDIT events stored the branch's key; they now store its code
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('settings', '0001_initial'),
+        ('jobs', '0012_job_moves'),
+    ]
+
+    operations = [
+        migrations.RunPython(branch_ids_to_codes, branch_codes_to_ids),
+    ]
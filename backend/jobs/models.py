@@ -1,10 +1,13 @@
 from django.db import models
 from django.conf import settings
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from products.models import ProductType, PaperType, PaperWeight, PaperSize
 
 
-class Job(models.Model):
+class JobRecord(models.Model):
+    """The columns shared by live jobs and archived ones."""
+
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
         ('PRINTED', 'Printed'),
@@ -17,24 +20,11 @@ class Job(models.Model):
         ('INVOICED', 'Invoiced'),
     ]
     
-    BRANCH_CHOICES = [
-        ('BORROWDALE', 'Borrowdale'),
-        ('EASTLEA', 'Eastlea'),
-        ('BELGRAVIA', 'Belgravia'),
-        ('AVONDALE', 'Avondale'),
-        ('MSASA', 'Msasa'),
-        ('CHITUNGWIZA', 'Chitungwiza'),
-    ]
-    
     JOB_TYPE_CHOICES = [
         ('LOCAL', 'Local'),
         ('FOREIGN', 'Foreign'),
     ]
 
-    # Job Identification
-    job_id = models.AutoField(primary_key=True)
-    date = models.DateTimeField(auto_now_add=True)
-    branch = models.CharField(max_length=50, choices=BRANCH_CHOICES)
     job_type = models.CharField(max_length=10, choices=JOB_TYPE_CHOICES)
     docket_number = models.CharField(max_length=20, unique=True)
     
@@ -52,34 +42,6 @@ class Job(models.Model):
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
     description = models.TextField()
     
-    # Product Specifications
-    product_type = models.ForeignKey(
-        ProductType,
-        on_delete=models.PROTECT,
-        related_name='jobs'
-    )
-    paper_type = models.ForeignKey(
-        PaperType,
-        on_delete=models.PROTECT,
-        related_name='jobs',
-        null=True,
-        blank=True
-    )
-    paper_weight = models.ForeignKey(
-        PaperWeight,
-        on_delete=models.PROTECT,
-        related_name='jobs',
-        null=True,
-        blank=True
-    )
-    paper_size = models.ForeignKey(
-        PaperSize,
-        on_delete=models.PROTECT,
-        related_name='jobs',
-        null=True,
-        blank=True
-    )
-    
     # Additional Information
     notes = models.TextField(blank=True)
     
@@ -114,6 +76,48 @@ class Job(models.Model):
     )
     payment_ref = models.CharField(max_length=50, blank=True)
     
+    class Meta:
+        abstract = True
+
+
+class Job(JobRecord):
+    # Job Identification
+    job_id = models.AutoField(primary_key=True)
+    date = models.DateTimeField(auto_now_add=True)
+    branch = models.ForeignKey(
+        'settings.Branch',
+        on_delete=models.PROTECT,
+        related_name='jobs'
+    )
+
+    # Product Specifications
+    product_type = models.ForeignKey(
+        ProductType,
+        on_delete=models.PROTECT,
+        related_name='jobs'
+    )
+    paper_type = models.ForeignKey(
+        PaperType,
+        on_delete=models.PROTECT,
+        related_name='jobs',
+        null=True,
+        blank=True
+    )
+    paper_weight = models.ForeignKey(
+        PaperWeight,
+        on_delete=models.PROTECT,
+        related_name='jobs',
+        null=True,
+        blank=True
+    )
+    paper_size = models.ForeignKey(
+        PaperSize,
+        on_delete=models.PROTECT,
+        related_name='jobs',
+        null=True,
+        blank=True
+    )
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -129,6 +133,121 @@ class Job(models.Model):
     class Meta:
         db_table = 'jobs'
         ordering = ['-created_at']
+        indexes = [
+            # The pending queue and the status-filtered job lists
+            models.Index(fields=['status', 'created_at'], name='jobs_status_created'),
+        ]
+
+
+class JobArchive(JobRecord):
+    """
+    A settled job moved out of ``jobs`` by ``archive_jobs``.  Rows keep the
+    job's id, docket and timestamps unchanged and are never edited.
+    """
+    job_id = models.IntegerField(primary_key=True)
+    date = models.DateTimeField()
+    branch = models.ForeignKey(
+        'settings.Branch',
+        on_delete=models.PROTECT,
+        related_name='archived_jobs'
+    )
+
+    product_type = models.ForeignKey(
+        ProductType,
+        on_delete=models.PROTECT,
+        related_name='archived_jobs'
+    )
+    paper_type = models.ForeignKey(
+        PaperType,
+        on_delete=models.PROTECT,
+        related_name='archived_jobs',
+        null=True,
+        blank=True
+    )
+    paper_weight = models.ForeignKey(
+        PaperWeight,
+        on_delete=models.PROTECT,
+        related_name='archived_jobs',
+        null=True,
+        blank=True
+    )
+    paper_size = models.ForeignKey(
+        PaperSize,
+        on_delete=models.PROTECT,
+        related_name='archived_jobs',
+        null=True,
+        blank=True
+    )
+
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.docket_number} - {self.customer} (archived)"
+
+    class Meta:
+        db_table = 'jobs_archive'
+        ordering = ['-created_at']
+
+
+class JobEvent(models.Model):
+    """
+    One change to a job, appended in the same transaction as the change and
+    never edited.  ``job_id`` is a plain column rather than a foreign key, so
+    a job's events stay put when it is archived and follow it between
+    shards (``jobs.events.move_job``).
+    """
+    KIND_CHOICES = [
+        ('CREATED', 'Created'),
+        ('STATUS', 'Status'),
+        ('PAYMENT', 'Payment'),
+        ('EDIT', 'Edit'),
+        ('DELETED', 'Deleted'),
+    ]
+
+    job_id = models.IntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    field = models.CharField(max_length=30, blank=True)
+    old_value = models.TextField(blank=True)
+    new_value = models.TextField(blank=True)
+    # Users live on the default database, which may not be the job's shard
+    actor_id = models.IntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Job {self.job_id}: {self.kind} {self.field} {self.old_value} -> {self.new_value}"
+
+    class Meta:
+        db_table = 'job_events'
+        ordering = ['created_at', 'id']
+        indexes = [
+            # A job's timeline, and its event of a kind (e.g. when it was created)
+            models.Index(fields=['job_id', 'kind', 'created_at'], name='job_events_job_time'),
+            # Time-range scans of one kind, e.g. jobs printed this month
+            models.Index(fields=['kind', 'created_at'], name='job_events_kind_time'),
+        ]
+
+
+class JobMove(models.Model):
+    """
+    A job moved onto this shard from another (``jobs.events.move_job``).
+    The job's rows keep their timestamps when they are copied, so
+    incremental backups find them through their moves instead
+    (``paragon_jms.backup``).
+    """
+    job_id = models.IntegerField()
+    source = models.CharField(max_length=100)
+    moved_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Job {self.job_id} from {self.source}"
+
+    class Meta:
+        db_table = 'job_moves'
+        indexes = [
+            models.Index(fields=['moved_at'], name='job_moves_time'),
+        ]
 
 
 class DocketCounter(models.Model):
@@ -139,6 +258,9 @@ class DocketCounter(models.Model):
     
     job_type = models.CharField(max_length=10, choices=JOB_TYPE_CHOICES, unique=True)
     current_number = models.IntegerField(default=0)
+    # With sharding, the highest job id the shard has allocated (kept on
+    # its LOCAL row); null until the first allocation looks it up
+    last_job_id = models.IntegerField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
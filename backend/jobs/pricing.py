@@ -0,0 +1,204 @@
+"""
+Batch pricing engine for print_cost quotes.
+
+Active ``PriceRate`` rows are compiled once per rates version into NumPy
+column arrays (blank keys stored as -1, money as integer ten-thousandths).
+Rates have their own version (``settings.versions``), bumped by
+``products.signals`` on every rate edit, so editing a rate doesn't rebuild
+the catalog's compatibility index, nor a catalog edit the rates.
+A batch of quote lines is priced with a single lines × rates match matrix:
+the best rate per line is the most specific match, then the highest
+quantity break, so no per-line queries are issued.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+import threading
+import time
+
+from django.conf import settings
+import numpy as np
+
+from monitoring.query_budget import unbudgeted
+from products.models import PriceRate
+from settings import versions
+from .imposition import impose
+
+RATES_VERSION_KEY = 'products:price_rates_version'
+
+SCALE = 10000
+WILDCARD = -1
+KEYS = ('product_type', 'paper_type', 'paper_weight', 'paper_size')
+
+_lock = threading.Lock()
+_table = None
+_checked_at = 0.0
+
+
+def _to_units(value):
+    return int((Decimal(value) * SCALE).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _to_money(units):
+    return (Decimal(int(units)) / SCALE).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+class RateTable:
+    """Active price rates as parallel arrays."""
+
+    def __init__(self, version=None):
+        self.version = version
+        rows = list(
+            PriceRate.objects.filter(is_active=True).values_list(
+                'id', 'product_type_id', 'paper_type_id', 'paper_weight_id', 'paper_size_id',
+                'min_quantity', 'setup_cost', 'unit_price', 'sheet_price'
+            )
+        )
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.keys = np.array(
+            [[WILDCARD if pk is None else pk for pk in row[1:5]] for row in rows],
+            dtype=np.int64,
+        ).reshape(len(rows), len(KEYS))
+        self.min_quantity = np.array([row[5] for row in rows], dtype=np.int64)
+        self.setup = np.array([_to_units(row[6]) for row in rows], dtype=np.int64)
+        self.unit = np.array([_to_units(row[7]) for row in rows], dtype=np.int64)
+        self.sheet = np.array([_to_units(row[8]) for row in rows], dtype=np.int64)
+
+        # Specificity dominates, the quantity break decides ties
+        specificity = (self.keys != WILDCARD).sum(axis=1)
+        top_break = int(self.min_quantity.max()) + 1 if len(rows) else 1
+        self.rank = specificity * top_break + self.min_quantity
+
+    def match(self, keys, quantities):
+        """Index of the winning rate for every line, or -1 when none applies."""
+        if len(self.ids) == 0:
+            return np.full(len(quantities), -1, dtype=np.int64)
+
+        lines = keys[:, None, :]
+        rates = self.keys[None, :, :]
+        matches = ((rates == WILDCARD) | (rates == lines)).all(axis=2)
+        matches &= self.min_quantity[None, :] <= quantities[:, None]
+
+        scores = np.where(matches, self.rank[None, :], -1)
+        best = scores.argmax(axis=1)
+        return np.where(scores[np.arange(len(best)), best] >= 0, best, -1)
+
+
+def get_rate_table():
+    """Return the current rate table, rebuilding it if the rates have changed."""
+    global _table, _checked_at
+
+    ttl = getattr(settings, 'PRICE_RATES_CHECK_SECONDS', 5)
+    now = time.monotonic()
+    table = _table
+    if table is not None and now - _checked_at < ttl:
+        return table
+
+    version = versions.current(RATES_VERSION_KEY)
+
+    with _lock:
+        if _table is None or _table.version != version:
+            with unbudgeted():
+                _table = RateTable(version)
+        _checked_at = now
+        return _table
+
+
+def invalidate():
+    """Bump the rates version so every process rebuilds its rate table."""
+    global _table
+    versions.bump(RATES_VERSION_KEY)
+    _table = None
+
+
+def _yield_for(line, options):
+    """
+    The sheets a line needs.  A line's ``paper_size`` is the stock its rate
+    is priced on, so its finished ``width_mm``/``height_mm`` are imposed on
+    that sheet only; without a finished size it runs one piece per sheet.
+    Without a stock the best sheet in the catalog is used.
+    """
+    width = line.get('width_mm')
+    height = line.get('height_mm')
+    size = line.get('paper_size')
+    if width is None or height is None:
+        if size is None:
+            return None
+        return {
+            'paper_size': size.pk,
+            'paper_size_name': size.name,
+            'ups': 1,
+            'sheets': line['quantity'],
+            'waste_percent': 0.0,
+        }
+
+    result = impose(
+        width, height, line['quantity'],
+        paper_weight_id=getattr(line.get('paper_weight'), 'pk', None),
+        paper_size_ids=[size.pk] if size is not None else None,
+        **options
+    )
+    if len(result['positions']) == 0:
+        return None
+
+    table = result['table']
+    position = result['positions'][0]
+    return {
+        'paper_size': int(result['paper_size_id'][0]),
+        'paper_size_name': table.names[position],
+        'ups': int(result['ups'][0]),
+        'sheets': int(result['sheets'][0]),
+        'waste_percent': round(float(result['waste_percent'][0]), 2),
+    }
+
+
+def price_lines(lines, **imposition_options):
+    """
+    Price a batch of validated quote lines.
+
+    Each line is a dict with ``quantity`` and optional ``product_type``,
+    ``paper_type``, ``paper_weight`` and ``paper_size`` model instances
+    (plus optional finished ``width_mm``/``height_mm``).  Returns one result
+    dict per line, in order.
+    """
+    table = get_rate_table()
+    count = len(lines)
+
+    keys = np.array(
+        [[getattr(line.get(key), 'pk', None) or WILDCARD for key in KEYS] for line in lines],
+        dtype=np.int64,
+    ).reshape(count, len(KEYS))
+    quantities = np.array([line['quantity'] for line in lines], dtype=np.int64)
+    yields = [_yield_for(line, imposition_options) for line in lines]
+    sheets = np.array([y['sheets'] if y else 0 for y in yields], dtype=np.int64)
+
+    best = table.match(keys, quantities)
+    found = best >= 0
+    safe = np.where(found, best, 0)
+    if len(table.ids):
+        totals = (
+            table.setup[safe]
+            + table.unit[safe] * quantities
+            + table.sheet[safe] * sheets
+        )
+    else:
+        totals = np.zeros(count, dtype=np.int64)
+
+    results = []
+    for i in range(count):
+        if not found[i]:
+            results.append({
+                'rate': None,
+                'print_cost': None,
+                'unit_cost': None,
+                'yield': yields[i],
+                'error': 'No price rate matches this line',
+            })
+            continue
+        results.append({
+            'rate': int(table.ids[best[i]]),
+            'print_cost': str(_to_money(totals[i])),
+            'unit_cost': str(
+                (Decimal(int(totals[i])) / SCALE / int(quantities[i])).quantize(Decimal('0.0001'))
+            ),
+            'yield': yields[i],
+        })
+    return results
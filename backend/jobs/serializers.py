@@ -1,12 +1,63 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from django.db import transaction
-from .models import Job, DocketCounter
+from django.db import DEFAULT_DB_ALIAS, transaction
+from . import customers
+from .dockets import create_counter, next_docket_number, next_job_id
+from .events import record_created
+from .gang import GANG_RUN_SHEETS
+from .models import Job, JobArchive, JobEvent, DocketCounter
+from products.compatibility import get_index as get_compatibility_index
+from products.models import ProductType, PaperType, PaperWeight, PaperSize
+from settings.models import Branch
 from products.serializers import (
     ProductTypeSerializer,
     PaperTypeSerializer,
     PaperWeightSerializer,
     PaperSizeSerializer
 )
+from paragon_jms.sharding import on_shard, shard_exists, shard_for_branch, sharding_enabled
+from settings.cache import find_branch, get_branch
+
+
+class BranchCodeField(serializers.RelatedField):
+    """
+    Reads and writes a job's branch as its code, via the cached registry.
+
+    Async views pass a registry they loaded on a worker thread as the
+    ``branches`` context, so rendering never queries from the event loop.
+    """
+    default_error_messages = {
+        'does_not_exist': '"{value}" is not a known branch.',
+    }
+
+    def __init__(self, **kwargs):
+        if not kwargs.get('read_only'):
+            kwargs.setdefault('queryset', Branch.objects.all())
+        super().__init__(**kwargs)
+
+    def use_pk_only_optimization(self):
+        return True
+
+    def to_internal_value(self, data):
+        branch = find_branch(str(data))
+        if branch is None:
+            self.fail('does_not_exist', value=data)
+        return branch
+
+    def branch(self, pk):
+        registry = self.context.get('branches')
+        return registry.get(pk) if registry is not None else get_branch(pk)
+
+    def to_representation(self, value):
+        branch = self.branch(value.pk)
+        return branch.code if branch else None
+
+
+class BranchNameField(BranchCodeField):
+    def to_representation(self, value):
+        branch = self.branch(value.pk)
+        return branch.name if branch else None
 
 
 class JobSerializer(serializers.ModelSerializer):
@@ -14,7 +65,8 @@ class JobSerializer(serializers.ModelSerializer):
     paper_type = PaperTypeSerializer(read_only=True)
     paper_weight = PaperWeightSerializer(read_only=True)
     paper_size = PaperSizeSerializer(read_only=True)
-    branch_display = serializers.CharField(source='get_branch_display', read_only=True)
+    branch = BranchCodeField()
+    branch_display = BranchNameField(source='branch', read_only=True)
     job_type_display = serializers.CharField(source='get_job_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     payment_status_display = serializers.CharField(source='get_payment_status_display', read_only=True)
@@ -42,7 +94,51 @@ class JobSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class JobCreateSerializer(serializers.ModelSerializer):
+class PaperSpecificationMixin:
+    """
+    Reject paper type / weight / size combinations the catalog does not allow
+    for the job's product type.
+    """
+
+    def validate_paper_specification(self, attrs):
+        def current(field):
+            if field in attrs:
+                return attrs[field]
+            return getattr(self.instance, field, None)
+
+        # Edits that leave the specification as it was (including a PUT or
+        # form that resends it unchanged) keep legacy combinations
+        if self.instance is not None and all(
+            getattr(current(field), 'pk', None) == getattr(self.instance, f'{field}_id', None)
+            for field in ('product_type', 'paper_type', 'paper_weight', 'paper_size')
+        ):
+            return attrs
+
+        product_type = current('product_type')
+        if product_type is None:
+            return attrs
+
+        specification = {
+            field: getattr(current(field), 'pk', None)
+            for field in ('paper_type', 'paper_weight', 'paper_size')
+        }
+        invalid_field = get_compatibility_index().check(
+            product_type.pk,
+            specification['paper_type'],
+            specification['paper_weight'],
+            specification['paper_size'],
+        )
+        if invalid_field:
+            label = invalid_field.replace('_', ' ')
+            raise serializers.ValidationError({
+                invalid_field: f"This {label} is not compatible with the selected product specification"
+            })
+        return attrs
+
+
+class JobCreateSerializer(PaperSpecificationMixin, serializers.ModelSerializer):
+    branch = BranchCodeField()
+
     class Meta:
         model = Job
         fields = [
@@ -53,6 +149,9 @@ class JobCreateSerializer(serializers.ModelSerializer):
             'design_cost'
         ]
         read_only_fields = ('job_id',)
+        # LOCAL dockets are allocated on save, and FOREIGN ones are checked
+        # on every shard and in the archive below
+        extra_kwargs = {'docket_number': {'validators': []}}
 
     def validate_docket_number(self, value):
         """
@@ -63,60 +162,56 @@ class JobCreateSerializer(serializers.ModelSerializer):
         if job_type == 'FOREIGN':
             if not value or not value.startswith('FOR-'):
                 raise serializers.ValidationError("Foreign docket numbers must start with 'FOR-'")
-            if Job.objects.filter(docket_number=value).exists():
+            if any(shard_exists(model.objects.filter(docket_number=value)) for model in (Job, JobArchive)):
                 raise serializers.ValidationError("This docket number already exists")
         return value
 
-    def _generate_unique_docket_number(self, counter):
-        """
-        Generate a unique docket number by checking against existing numbers.
-        Returns tuple of (docket_number, new_counter_value)
-        """
-        base_number = counter.current_number + 1
-        while True:
-            docket_number = f"LOC-{base_number:03d}"
-            if not Job.objects.filter(docket_number=docket_number).exists():
-                return docket_number, base_number
-            base_number += 1
+    def validate(self, attrs):
+        return self.validate_paper_specification(attrs)
 
     def create(self, validated_data):
-        # Only handle docket number generation for LOCAL jobs
-        if validated_data['job_type'] == 'LOCAL':
-            try:
-                with transaction.atomic():
+        # Jobs are written to their branch's shard (the only one, unsharded)
+        alias = shard_for_branch(validated_data['branch'])
+
+        # Calculate total cost
+        print_cost = validated_data.get('print_cost', 0)
+        design_cost = validated_data.get('design_cost', 0)
+        validated_data['total_cost'] = print_cost + design_cost
+
+        request = self.context.get('request')
+        actor = request.user.pk if request is not None else None
+        try:
+            with transaction.atomic(using=alias):
+                # Only LOCAL jobs need a docket number, but on a shard the
+                # counter lock also serializes job id allocation, so every job takes it
+                if validated_data['job_type'] == 'LOCAL' or sharding_enabled():
                     # Lock the counter row to prevent concurrent access
-                    counter = DocketCounter.objects.select_for_update().get(job_type='LOCAL')
-                    
-                    # Generate a unique docket number
-                    docket_number, new_counter_value = self._generate_unique_docket_number(counter)
-                    
-                    # Update the counter with the new value
-                    counter.current_number = new_counter_value
+                    counter = on_shard(DocketCounter.objects, alias).select_for_update().get(job_type='LOCAL')
+
+                    if validated_data['job_type'] == 'LOCAL':
+                        # Generate a unique docket number and advance the counter
+                        docket_number, counter.current_number = next_docket_number(counter, alias)
+                        validated_data['docket_number'] = docket_number
+                    if sharding_enabled():
+                        validated_data['job_id'] = counter.last_job_id = next_job_id(counter, alias)
                     counter.save()
-                    
-                    # Set the docket number in validated data
-                    validated_data['docket_number'] = docket_number
-                    
-                    # Calculate total cost
-                    print_cost = validated_data.get('print_cost', 0)
-                    design_cost = validated_data.get('design_cost', 0)
-                    validated_data['total_cost'] = print_cost + design_cost
-                    
-                    # Create the job with the generated docket number
-                    return super().create(validated_data)
-            except DocketCounter.DoesNotExist:
-                # If counter doesn't exist, create it and retry
-                DocketCounter.objects.create(job_type='LOCAL', current_number=0)
-                return self.create(validated_data)
-        else:
-            # For FOREIGN jobs, calculate total cost and create the job
-            print_cost = validated_data.get('print_cost', 0)
-            design_cost = validated_data.get('design_cost', 0)
-            validated_data['total_cost'] = print_cost + design_cost
-            return super().create(validated_data)
-
-
-class JobUpdateSerializer(serializers.ModelSerializer):
+
+                if sharding_enabled():
+                    job = on_shard(Job.objects, alias).create(**validated_data)
+                else:
+                    job = super().create(validated_data)
+                record_created(job, actor)
+                transaction.on_commit(lambda: customers.record(job), using=alias)
+                return job
+        except DocketCounter.DoesNotExist:
+            # If counter doesn't exist, create it and retry
+            create_counter(alias)
+            return self.create(validated_data)
+
+
+class JobUpdateSerializer(PaperSpecificationMixin, serializers.ModelSerializer):
+    branch = BranchCodeField()
+
     class Meta:
         model = Job
         fields = [
@@ -126,6 +221,9 @@ class JobUpdateSerializer(serializers.ModelSerializer):
             'print_cost', 'design_cost'
         ]
 
+    def validate(self, attrs):
+        return self.validate_paper_specification(attrs)
+
 
 class JobStatusUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -149,6 +247,18 @@ class JobPaymentUpdateSerializer(serializers.ModelSerializer):
         return attrs
 
 
+class JobEventSerializer(serializers.ModelSerializer):
+    actor = serializers.SerializerMethodField()
+
+    class Meta:
+        model = JobEvent
+        fields = ['kind', 'field', 'old_value', 'new_value', 'actor_id', 'actor', 'created_at']
+
+    def get_actor(self, obj):
+        # Names are looked up once per timeline, as users live on the default database
+        return self.context.get('actors', {}).get(obj.actor_id)
+
+
 class DocketCounterSerializer(serializers.ModelSerializer):
     next_number = serializers.SerializerMethodField()
 
@@ -158,10 +268,87 @@ class DocketCounterSerializer(serializers.ModelSerializer):
 
     def get_next_number(self, obj):
         if obj.job_type == 'LOCAL':
-            base_number = obj.current_number + 1
-            while True:
-                docket_number = f"LOC-{base_number:03d}"
-                if not Job.objects.filter(docket_number=docket_number).exists():
-                    return base_number
-                base_number += 1
+            return next_docket_number(obj, self.context.get('shard', DEFAULT_DB_ALIAS))[1]
         return obj.current_number + 1
+
+
+class ImpositionRequestSerializer(serializers.Serializer):
+    width_mm = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    height_mm = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    paper_size = serializers.PrimaryKeyRelatedField(queryset=PaperSize.objects.all(), required=False)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+    bleed_mm = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, default=Decimal('3'))
+    gutter_mm = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, default=Decimal('0'))
+    margin_mm = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, default=Decimal('0'))
+    paper_weight = serializers.PrimaryKeyRelatedField(queryset=PaperWeight.objects.all(), required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=10)
+
+    def validate(self, attrs):
+        # Finished size comes from explicit dimensions or a catalog size
+        paper_size = attrs.pop('paper_size', None)
+        if paper_size is not None:
+            attrs.setdefault('width_mm', paper_size.width_mm)
+            attrs.setdefault('height_mm', paper_size.height_mm)
+        if not attrs.get('width_mm') or not attrs.get('height_mm'):
+            raise serializers.ValidationError(
+                "Either width_mm and height_mm or paper_size is required"
+            )
+        return attrs
+
+
+class PrintQueueRequestSerializer(serializers.Serializer):
+    branch = BranchCodeField(required=False)
+    gang = serializers.BooleanField(default=False)
+    run_sheets = serializers.IntegerField(min_value=1, max_value=100000, default=GANG_RUN_SHEETS)
+    jobs_limit = serializers.IntegerField(min_value=1, max_value=500, required=False)
+
+
+class CustomerAutocompleteRequestSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class QuoteLineSerializer(serializers.Serializer):
+    # Catalog keys are resolved in bulk by QuoteRequestSerializer, not per line
+    product_type = serializers.IntegerField(required=False, allow_null=True)
+    paper_type = serializers.IntegerField(required=False, allow_null=True)
+    paper_weight = serializers.IntegerField(required=False, allow_null=True)
+    paper_size = serializers.IntegerField(required=False, allow_null=True)
+    width_mm = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    height_mm = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0.01'), required=False)
+    quantity = serializers.IntegerField(min_value=1)
+
+    def to_representation(self, instance):
+        instance = {key: getattr(value, 'pk', value) for key, value in instance.items()}
+        return super().to_representation(instance)
+
+
+class QuoteRequestSerializer(serializers.Serializer):
+    lines = QuoteLineSerializer(many=True, allow_empty=False, max_length=500)
+    bleed_mm = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, default=Decimal('3'))
+    gutter_mm = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, default=Decimal('0'))
+    margin_mm = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, default=Decimal('0'))
+
+    QUOTE_KEYS = {
+        'product_type': ProductType,
+        'paper_type': PaperType,
+        'paper_weight': PaperWeight,
+        'paper_size': PaperSize,
+    }
+
+    def validate_lines(self, lines):
+        errors = [{} for _ in lines]
+        for field, model in self.QUOTE_KEYS.items():
+            ids = {line[field] for line in lines if line.get(field) is not None}
+            found = model.objects.in_bulk(ids) if ids else {}
+            for line, line_errors in zip(lines, errors):
+                pk = line.get(field)
+                if pk is None:
+                    continue
+                if pk not in found:
+                    line_errors[field] = [f'Invalid pk "{pk}" - object does not exist.']
+                else:
+                    line[field] = found[pk]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return lines
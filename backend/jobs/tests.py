@@ -0,0 +1,521 @@
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+import io
+
+from django.core.management import call_command
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from monitoring.testing import QueryBudgetTestCase, ShardedTestCase
+from paragon_jms.sharding import shard_aliases
+from products.compatibility import CATALOG_VERSION_KEY
+from products.models import PaperSize, PriceRate, ProductType
+from settings import versions
+from settings.cache import get_system_settings
+from settings.models import CacheVersion
+from users.models import User
+from . import customers, pricing
+from .archive import find_job
+from .gang import press_sheet
+from .imposition import impose, quote
+from .models import DocketCounter, Job, JobArchive, JobEvent
+
+ROLES = ['SUPERUSER', 'DESIGNER', 'SALES_REPRESENTATIVE', 'OPERATOR', 'CLERK']
+
+
+def new_job_data(job, **changes):
+    """A job create payload copied from ``job``."""
+    return {
+        'branch': job.branch.code,
+        'job_type': 'LOCAL',
+        'docket_number': 'LOC-000',
+        'sales_rep': job.sales_rep,
+        'order_taken_by': job.order_taken_by,
+        'customer': job.customer,
+        'contact_person': job.contact_person,
+        'mobile_number': job.mobile_number,
+        'email_address': job.email_address,
+        'quantity': job.quantity,
+        'description': job.description,
+        'product_type': job.product_type_id,
+        'print_cost': str(job.print_cost),
+        'design_cost': str(job.design_cost),
+        **changes,
+    }
+
+
+class JobQueryBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.job = Job.objects.order_by('job_id').first()
+
+    def test_job_list(self):
+        for role in ROLES:
+            with self.subTest(role=role):
+                self.assertWithinBudget(reverse('job-list'), role=role)
+
+    def test_job_list_filtered(self):
+        self.assertWithinBudget(reverse('job-list') + '?status=PENDING&search=a')
+
+    def test_job_detail(self):
+        self.assertWithinBudget(reverse('job-detail', args=[self.job.job_id]))
+
+    def test_job_events(self):
+        self.assertWithinBudget(reverse('job-events', args=[self.job.job_id]))
+
+    def test_job_create(self):
+        self.assertWithinBudget(
+            reverse('job-list'), role='DESIGNER', method='POST', status=201, data=new_job_data(self.job)
+        )
+
+    def test_job_edit(self):
+        self.assertWithinBudget(
+            reverse('job-detail', args=[self.job.job_id]), method='PATCH', data={'notes': 'Rush'}
+        )
+
+    def test_job_delete(self):
+        self.assertWithinBudget(reverse('job-detail', args=[self.job.job_id]), method='DELETE', status=204)
+        events = self.assertWithinBudget(reverse('job-events', args=[self.job.job_id])).json()
+        self.assertEqual(events[-1]['kind'], 'DELETED')
+
+    def test_status_update(self):
+        self.assertWithinBudget(
+            reverse('job-status-update', args=[self.job.job_id]), method='PATCH', data={'status': 'PRINTED'}
+        )
+
+    def test_payment_update(self):
+        self.assertWithinBudget(
+            reverse('job-payment-update', args=[self.job.job_id]), method='PATCH',
+            data={'payment_status': 'RECEIPTED', 'payment_ref': 'R-1'},
+        )
+
+    def test_job_by_docket(self):
+        self.assertWithinBudget(reverse('job-by-docket', args=[self.job.docket_number]))
+
+    def test_pending_jobs(self):
+        self.assertWithinBudget(reverse('pending_jobs'))
+
+    def test_print_queue(self):
+        self.assertWithinBudget(reverse('print_queue') + '?gang=true')
+
+    def test_print_queue_jobs_limit(self):
+        runs = self.assertWithinBudget(reverse('print_queue') + '?jobs_limit=1').json()['results']
+        self.assertTrue(all(len(run['jobs']) == min(run['job_count'], 1) for run in runs))
+
+    def test_customer_autocomplete(self):
+        self.assertWithinBudget(reverse('customer-autocomplete') + f'?q={self.job.customer[:3]}')
+
+    def test_customer_autocomplete_scoping(self):
+        Job.objects.filter(pk=self.job.pk).update(customer='Zambezi Unique Traders', sales_rep='Someone Else')
+        # Rebuild the index, which other tests built before this change
+        customers._index = None
+        self.addCleanup(setattr, customers, '_index', None)
+        path = reverse('customer-autocomplete') + '?q=zambezi unique'
+        self.assertWithinBudget(path, role='CLERK', status=403)
+        self.assertEqual(self.assertWithinBudget(path, role='SALES_REPRESENTATIVE').json()['results'], [])
+        results = self.assertWithinBudget(path, role='DESIGNER').json()['results']
+        self.assertEqual([result['customer'] for result in results], ['Zambezi Unique Traders'])
+
+    def test_docket_counter(self):
+        self.assertWithinBudget(reverse('docket_counter'))
+
+    def test_job_analytics(self):
+        self.assertWithinBudget(reverse('job_analytics'))
+
+    def test_designer_stats(self):
+        self.assertWithinBudget(reverse('designer_stats'), role='DESIGNER')
+
+    def test_imposition(self):
+        self.assertWithinBudget(reverse('job-imposition') + '?width_mm=148&height_mm=210&quantity=500')
+
+    def test_quote(self):
+        self.assertWithinBudget(reverse('job-quote'), method='POST', data={'lines': [
+            {'product_type': self.job.product_type_id, 'paper_size': self.job.paper_size_id, 'quantity': 500},
+            {'width_mm': '90', 'height_mm': '55', 'quantity': 1000},
+        ]})
+
+
+
+class ImpositionTests(QueryBudgetTestCase):
+
+    def on_sra3(self, width, height, quantity=1, **options):
+        sra3 = PaperSize.objects.get(name='SRA3')
+        return quote(width, height, quantity, paper_size_ids=[sra3.pk], **options)[0]
+
+    def test_ups_across_and_down(self):
+        # A5 without bleed, 148 x 210 on 320 x 450: 2 x 2 as is, 1 x 3 turned
+        result = self.on_sra3(148, 210, 500, bleed_mm=0)
+        self.assertEqual(
+            (result['orientation'], result['across'], result['down'], result['ups']), ('normal', 2, 2, 4)
+        )
+        self.assertEqual(result['sheets'], 125)
+        self.assertEqual(self.on_sra3(148, 210, 501, bleed_mm=0)['sheets'], 126)
+        # 100 - 100 * 4 * 148 * 210 / (320 * 450)
+        self.assertEqual(result['waste_percent'], 13.67)
+
+    def test_rotation(self):
+        # A4 with 3mm bleed is 216 x 303: once as is, twice turned
+        result = self.on_sra3(210, 297)
+        self.assertEqual(
+            (result['orientation'], result['across'], result['down'], result['ups']), ('rotated', 1, 2, 2)
+        )
+
+    def test_bleed_gutter_and_margin(self):
+        self.assertEqual(self.on_sra3(100, 100, bleed_mm=0)['ups'], 3 * 4)
+        # 106mm pieces: 3 across (318mm) but only 4 down
+        self.assertEqual(self.on_sra3(100, 100)['ups'], 3 * 4)
+        # Gutters between pieces only: 3 x 110 - 10 fits 320, 4 x 110 - 10 fits 450
+        self.assertEqual(self.on_sra3(100, 100, bleed_mm=0, gutter_mm=10)['ups'], 3 * 4)
+        self.assertEqual(self.on_sra3(100, 100, bleed_mm=0, gutter_mm=20)['ups'], 2 * 3)
+        # A 15mm margin leaves 290 x 420
+        self.assertEqual(self.on_sra3(100, 100, bleed_mm=0, margin_mm=15)['ups'], 2 * 4)
+        # 5mm bleed makes 110mm pieces, which fit 2 x 4
+        self.assertEqual(self.on_sra3(100, 100, bleed_mm=5)['ups'], 2 * 4)
+
+    def test_sheets_too_small_are_left_out(self):
+        result = impose(400, 500)
+        self.assertTrue(len(result['positions']))
+        table = result['table']
+        for position in result['positions']:
+            self.assertGreaterEqual(
+                max(table.widths[position], table.heights[position]), 506
+            )
+        sra3 = PaperSize.objects.get(name='SRA3')
+        self.assertEqual(quote(400, 500, paper_size_ids=[sra3.pk]), [])
+
+    def test_least_paper_first(self):
+        results = quote(90, 55, 1000)
+        paper = [
+            result['sheets'] * float(result['sheet_width_mm']) * float(result['sheet_height_mm'])
+            for result in results
+        ]
+        self.assertEqual(paper, sorted(paper))
+        # Not the largest sheet, which needs the fewest sheets
+        largest = max(results, key=lambda result: float(result['sheet_width_mm']) * float(result['sheet_height_mm']))
+        self.assertNotEqual(results[0]['paper_size'], largest['paper_size'])
+        # A single piece goes on the smallest sheet it fits
+        self.assertEqual(quote(90, 55, 1)[0]['paper_size_name'], 'A7')
+
+    def test_gang_press_sheet_takes_most_ups(self):
+        a5 = PaperSize.objects.get(name='A5')
+        sheet = press_sheet({
+            'paper_size_id': a5.pk, 'paper_size__width_mm': a5.width_mm,
+            'paper_size__height_mm': a5.height_mm, 'paper_weight_id': None,
+        })
+        # 154 x 216 with bleed: 2 x 2 on SRA3
+        self.assertEqual(sheet[1:], ('SRA3', 4))
+
+
+class PricingTests(QueryBudgetTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.cards = ProductType.objects.get(name='Business Cards')
+        cls.flyers = ProductType.objects.get(name='Flyers')
+        cls.sra3 = PaperSize.objects.get(name='SRA3')
+        cls.default = PriceRate.objects.create(setup_cost=10, unit_price=Decimal('0.5'))
+        cls.card = PriceRate.objects.create(
+            product_type=cls.cards, setup_cost=20, unit_price=Decimal('0.1'), sheet_price=Decimal('0.2')
+        )
+        cls.card_500 = PriceRate.objects.create(
+            product_type=cls.cards, min_quantity=500, setup_cost=20, unit_price=Decimal('0.05')
+        )
+        cls.card_sra3 = PriceRate.objects.create(
+            product_type=cls.cards, paper_size=cls.sra3, setup_cost=5, sheet_price=1
+        )
+        PriceRate.objects.create(
+            product_type=cls.cards, paper_size=cls.sra3, min_quantity=1000, setup_cost=0, is_active=False
+        )
+
+    def quote(self, *lines):
+        response = self.assertWithinBudget(reverse('job-quote'), method='POST', data={'lines': list(lines)})
+        return [(line['rate'], line['print_cost']) for line in response.json()['lines']]
+
+    def test_most_specific_rate_wins(self):
+        self.assertEqual(self.quote(
+            {'product_type': self.flyers.pk, 'quantity': 100},
+            {'product_type': self.cards.pk, 'quantity': 100},
+            # 96 x 61 with bleed: 21 ups on SRA3, so 48 sheets. The SRA3 rate
+            # beats the bigger quantity break, and the inactive rate is skipped
+            {'product_type': self.cards.pk, 'paper_size': self.sra3.pk,
+             'width_mm': '90', 'height_mm': '55', 'quantity': 1000},
+        ), [
+            (self.default.pk, '60.00'),
+            (self.card.pk, '30.00'),
+            (self.card_sra3.pk, '53.00'),
+        ])
+
+    def test_quantity_breaks(self):
+        self.assertEqual(self.quote(
+            {'product_type': self.cards.pk, 'quantity': 499},
+            {'product_type': self.cards.pk, 'quantity': 500},
+            {'product_type': self.cards.pk, 'quantity': 2000},
+        ), [
+            (self.card.pk, '69.90'),
+            (self.card_500.pk, '45.00'),
+            (self.card_500.pk, '120.00'),
+        ])
+
+    def test_no_matching_rate(self):
+        self.default.delete()
+        response = self.assertWithinBudget(reverse('job-quote'), method='POST', data={'lines': [
+            {'product_type': self.flyers.pk, 'quantity': 100},
+        ]})
+        self.assertEqual(response.json()['lines'][0]['error'], 'No price rate matches this line')
+
+    def test_rates_have_their_own_version(self):
+        catalog = versions.current(CATALOG_VERSION_KEY)
+        rates = versions.current(pricing.RATES_VERSION_KEY)
+        self.card.unit_price = Decimal('0.2')
+        self.card.save()
+        self.assertEqual(versions.current(CATALOG_VERSION_KEY), catalog)
+        self.assertEqual(versions.current(pricing.RATES_VERSION_KEY), rates + 1)
+        self.assertEqual(self.quote({'product_type': self.cards.pk, 'quantity': 100}), [(self.card.pk, '40.00')])
+
+        # A catalog edit leaves the rate table alone
+        table = pricing.get_rate_table()
+        self.flyers.save()
+        self.assertEqual(versions.current(CATALOG_VERSION_KEY), catalog + 1)
+        self.assertEqual(versions.current(pricing.RATES_VERSION_KEY), rates + 1)
+        with self.settings(PRICE_RATES_CHECK_SECONDS=0):
+            self.assertIs(pricing.get_rate_table(), table)
+
+class CustomerIndexTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        customers._index = None
+        self.addCleanup(setattr, customers, '_index', None)
+        self.template = Job.objects.order_by('job_id').first()
+
+    def add_job(self, **changes):
+        """Insert a job directly, as another process would (nothing is recorded here)."""
+        job = Job.objects.get(pk=self.template.pk)
+        job.pk = None
+        job.docket_number = f'TST-{Job.objects.count()}'
+        for field, value in changes.items():
+            setattr(job, field, value)
+        job.save()
+        return job
+
+    def search(self, prefix, **kwargs):
+        return customers.get_index().search(prefix, **kwargs)
+
+    def test_index_content(self):
+        self.add_job(customer='Zambezi  Unique traders', contact_person='Old Contact')
+        self.add_job(customer='zambezi unique Traders ', contact_person='New Contact')
+
+        results = self.search('ZAMBEZI   unique')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['customer'], 'zambezi unique Traders ')
+        self.assertEqual(results[0]['contact_person'], 'New Contact')
+        self.assertEqual(results[0]['job_count'], 2)
+        self.assertEqual(self.search('unique'), [])
+
+    @override_settings(CUSTOMER_INDEX_CHECK_SECONDS=0)
+    def test_catch_up_after_create_in_another_process(self):
+        index = customers.get_index()
+        self.assertEqual(self.search('zambezi'), [])
+
+        # Nothing new: one range aggregate per shard and no rows read
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in shard_aliases()
+            ]
+            index.catch_up()
+        self.assertEqual(sum(len(queries) for queries in captured), len(shard_aliases()))
+
+        self.add_job(customer='Zambezi Unique Traders')
+        self.assertEqual([result['customer'] for result in self.search('zambezi')], ['Zambezi Unique Traders'])
+        self.assertIs(customers.get_index(), index)
+
+    @override_settings(CUSTOMER_INDEX_CHECK_SECONDS=3600)
+    def test_create_writes_no_version_and_is_found_at_once(self):
+        customers.get_index()
+        # Loading system settings the first time creates (and versions) them
+        get_system_settings()
+        before = list(CacheVersion.objects.order_by('key').values_list('key', 'version'))
+        data = new_job_data(self.template, customer='Zambezi Unique Traders')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertWithinBudget(reverse('job-list'), role='DESIGNER', method='POST', status=201, data=data)
+
+        self.assertEqual(list(CacheVersion.objects.order_by('key').values_list('key', 'version')), before)
+        self.assertEqual([result['customer'] for result in self.search('zambezi')], ['Zambezi Unique Traders'])
+
+    def test_sales_reps_only_find_their_own_customers(self):
+        rep = User.objects.filter(role='SALES_REPRESENTATIVE', approved=True).order_by('date_joined').first()
+        self.add_job(customer='Zambezi Unique Traders', sales_rep=rep.full_name)
+        self.add_job(customer='Zambezi Unique Printers', sales_rep='Someone Else')
+
+        path = reverse('customer-autocomplete') + '?q=zambezi unique'
+        results = self.assertWithinBudget(path, role='SALES_REPRESENTATIVE').json()['results']
+        self.assertEqual([result['customer'] for result in results], ['Zambezi Unique Traders'])
+        results = self.assertWithinBudget(path, role='DESIGNER').json()['results']
+        self.assertEqual(
+            [result['customer'] for result in results],
+            ['Zambezi Unique Printers', 'Zambezi Unique Traders'],
+        )
+        self.assertWithinBudget(path, role='OPERATOR', status=403)
+
+
+class ArchiveTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.job = Job.objects.exclude(branch=None).order_by('job_id').first()
+        self.analytics = self.assertWithinBudget(reverse('job_analytics')).json()
+        self.admin_stats = self.assertWithinBudget(reverse('admin_stats')).json()
+        Job.objects.filter(pk=self.job.pk).update(
+            status='PRINTED', payment_status='RECEIPTED', updated_at=timezone.now() - timedelta(days=400)
+        )
+        call_command('archive_jobs', days=90, stdout=io.StringIO())
+
+    def test_archived(self):
+        self.assertFalse(Job.objects.filter(pk=self.job.pk).exists())
+        self.assertEqual(JobArchive.objects.get(pk=self.job.pk).docket_number, self.job.docket_number)
+
+    def test_find_job_reads_through_to_archive(self):
+        found = find_job(job_id=self.job.pk)
+        self.assertIsInstance(found, JobArchive)
+        self.assertEqual(found.docket_number, self.job.docket_number)
+        with self.assertRaises(Job.DoesNotExist):
+            find_job(job_id=-1)
+
+        detail = self.assertWithinBudget(reverse('job-detail', args=[self.job.pk])).json()
+        by_docket = self.assertWithinBudget(reverse('job-by-docket', args=[self.job.docket_number])).json()
+        self.assertEqual(detail, by_docket)
+        self.assertEqual((detail['job_id'], detail['status']), (self.job.pk, 'PRINTED'))
+
+    def test_archived_jobs_are_read_only(self):
+        self.assertWithinBudget(reverse('job-detail', args=[self.job.pk]), method='DELETE', status=409)
+        self.assertWithinBudget(
+            reverse('job-status-update', args=[self.job.pk]), method='PATCH', status=409, data={'status': 'PENDING'}
+        )
+        self.assertTrue(JobArchive.objects.filter(pk=self.job.pk).exists())
+
+    def test_rollups_include_archived_jobs(self):
+        analytics = self.assertWithinBudget(reverse('job_analytics')).json()
+        before, after = self.analytics['financial_stats'], analytics['financial_stats']
+        # Still counted, now as receipted
+        self.assertEqual(sum(after.values()), sum(before.values()))
+        self.assertEqual(
+            after['total_receipted'],
+            before['total_receipted'] + (self.job.payment_status != 'RECEIPTED'),
+        )
+
+        def branch_jobs(analytics):
+            return {row['branch']: row['job_count'] for row in analytics['branch_performance']}
+
+        self.assertEqual(branch_jobs(analytics), branch_jobs(self.analytics))
+        admin_stats = self.assertWithinBudget(reverse('admin_stats')).json()
+        self.assertEqual(admin_stats['total_jobs'], self.admin_stats['total_jobs'])
+
+
+class ShardingTests(ShardedTestCase):
+
+    def jobs_on(self, alias):
+        return list(Job.objects.using(alias).order_by('job_id'))
+
+    def test_seed_jobs_moved(self):
+        self.assertEqual(self.jobs_on('default'), [])
+        self.assertEqual({job.branch.code for job in self.jobs_on('north')}, {'BORROWDALE'})
+        self.assertEqual({job.branch.code for job in self.jobs_on('south')}, {'PADDINGTON'})
+        for job in self.jobs_on('south'):
+            self.assertEqual(JobEvent.objects.using('default').filter(job_id=job.job_id).count(), 0)
+
+    def test_create_allocates_from_shard_counter(self):
+        job = self.jobs_on('south')[0]
+        highest = max(job.job_id for alias in shard_aliases() for job in self.jobs_on(alias))
+        created = self.assertWithinBudget(
+            reverse('job-list'), role='DESIGNER', method='POST', status=201, data=new_job_data(job)
+        ).json()
+
+        # south's slot is the numbers n with n % 10 == 3
+        self.assertGreater(created['job_id'], highest)
+        self.assertEqual(created['job_id'] % 10, 3)
+        number = int(created['docket_number'].split('-')[1])
+        self.assertEqual(number % 10, 3)
+        counter = DocketCounter.objects.using('south').get(job_type='LOCAL')
+        self.assertEqual((counter.current_number, counter.last_job_id), (number, created['job_id']))
+        self.assertTrue(Job.objects.using('south').filter(job_id=created['job_id']).exists())
+        self.assertTrue(JobEvent.objects.using('south').filter(job_id=created['job_id'], kind='CREATED').exists())
+
+        # The next job on the shard takes the next numbers in its slot
+        again = self.assertWithinBudget(
+            reverse('job-list'), role='DESIGNER', method='POST', status=201, data=new_job_data(job)
+        ).json()
+        self.assertEqual(again['job_id'], created['job_id'] + 10)
+        self.assertEqual(int(again['docket_number'].split('-')[1]), number + 10)
+
+    def test_move_job_between_shards(self):
+        job = next(job for job in self.jobs_on('north') if job.status != 'PRINTED')
+        events = JobEvent.objects.using('north').filter(job_id=job.job_id).count()
+        self.assertWithinBudget(
+            reverse('job-detail', args=[job.job_id]), method='PATCH', data={'branch': 'PADDINGTON'}
+        )
+
+        self.assertFalse(Job.objects.using('north').filter(job_id=job.job_id).exists())
+        moved = Job.objects.using('south').get(job_id=job.job_id)
+        self.assertEqual((moved.branch.code, moved.docket_number), ('PADDINGTON', job.docket_number))
+        self.assertEqual(JobEvent.objects.using('north').filter(job_id=job.job_id).count(), 0)
+        # Its events, and the EDIT event of the move itself
+        self.assertEqual(JobEvent.objects.using('south').filter(job_id=job.job_id).count(), events + 1)
+        detail = self.assertWithinBudget(reverse('job-detail', args=[job.job_id])).json()
+        self.assertEqual(detail['branch'], 'PADDINGTON')
+
+    def test_timeline_survives_move_and_delete(self):
+        job = next(job for job in self.jobs_on('north') if job.status != 'PRINTED')
+        path = reverse('job-events', args=[job.job_id])
+        before = self.assertWithinBudget(path).json()
+        self.assertWithinBudget(
+            reverse('job-detail', args=[job.job_id]), method='PATCH', data={'branch': 'PADDINGTON'}
+        )
+        self.assertWithinBudget(reverse('job-detail', args=[job.job_id]), method='DELETE', status=204)
+
+        events = self.assertWithinBudget(path).json()
+        self.assertEqual(events[:len(before)], before)
+        edit, deleted = events[len(before):]
+        self.assertEqual(
+            (edit['kind'], edit['field'], edit['old_value'], edit['new_value']),
+            ('EDIT', 'branch', 'BORROWDALE', 'PADDINGTON'),
+        )
+        self.assertEqual(deleted['kind'], 'DELETED')
+        self.assertFalse(JobEvent.objects.using('north').filter(job_id=job.job_id).exists())
+
+    def test_list_gathers_every_shard_in_order(self):
+        jobs = self.jobs_on('north') + self.jobs_on('south')
+        expected = [job.job_id for job in sorted(jobs, key=lambda job: (job.created_at, job.job_id), reverse=True)]
+        response = self.assertWithinBudget(reverse('job-list')).json()
+        self.assertEqual(response['count'], len(jobs))
+        self.assertEqual([job['job_id'] for job in response['results']], expected[:len(response['results'])])
+
+        north = self.assertWithinBudget(reverse('job-list') + '?branch=BORROWDALE').json()
+        self.assertEqual(
+            sorted(job['job_id'] for job in north['results']), [job.job_id for job in self.jobs_on('north')]
+        )
+
+    def test_job_by_docket_on_any_shard(self):
+        for alias in ('north', 'south'):
+            job = self.jobs_on(alias)[-1]
+            with self.subTest(shard=alias):
+                found = self.assertWithinBudget(reverse('job-by-docket', args=[job.docket_number])).json()
+                self.assertEqual(found['job_id'], job.job_id)
+        self.assertWithinBudget(reverse('job-by-docket', args=['LOC-99999']), status=404)
+
+    def test_analytics_merge_shards(self):
+        jobs = self.jobs_on('north') + self.jobs_on('south')
+        analytics = self.assertWithinBudget(reverse('job_analytics')).json()
+        branches = {row['branch']: row['job_count'] for row in analytics['branch_performance']}
+        self.assertEqual(branches, {
+            'BORROWDALE': len(self.jobs_on('north')),
+            'PADDINGTON': len(self.jobs_on('south')),
+        })
+        financial = analytics['financial_stats']
+        self.assertEqual(
+            sum(financial.values()),
+            sum(1 for job in jobs if job.payment_status in ('RECEIPTED', 'INVOICED', 'NOT_MARKED')),
+        )
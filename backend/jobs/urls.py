@@ -1,4 +1,5 @@
 from django.urls import path
+from paragon_jms.async_api import server_view
 from . import views
 
 urlpatterns = [
@@ -6,9 +7,15 @@ urlpatterns = [
     path('<int:job_id>/', views.JobDetailView.as_view(), name='job-detail'),
     path('<int:job_id>/status/', views.update_job_status, name='job-status-update'),
     path('<int:job_id>/payment/', views.update_job_payment, name='job-payment-update'),
-    path('branches/', views.get_branches, name='branch-list'),
-    path('pending/', views.pending_jobs, name='pending_jobs'),
+    path('<int:job_id>/events/', views.job_events, name='job-events'),
+    path('docket/<str:docket_number>/', views.job_by_docket, name='job-by-docket'),
+    path('branches/', server_view(views.get_branches, views.aget_branches), name='branch-list'),
+    path('pending/', server_view(views.pending_jobs, views.apending_jobs), name='pending_jobs'),
+    path('queue/', views.print_queue, name='print_queue'),
+    path('customers/autocomplete/', views.customer_autocomplete, name='customer-autocomplete'),
     path('docket-counter/', views.docket_counter, name='docket_counter'),
     path('analytics/', views.job_analytics, name='job_analytics'),
-    path('designer-stats/', views.designer_stats, name='designer_stats'),
+    path('designer-stats/', server_view(views.designer_stats, views.adesigner_stats), name='designer_stats'),
+    path('imposition/', views.imposition, name='job-imposition'),
+    path('quote/', views.quote, name='job-quote'),
 ]
@@ -1,28 +1,72 @@
+from asgiref.sync import sync_to_async
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import Http404
 from django.db.models import Count, Q, Max, Sum, F
 from django.db.models.functions import TruncDate, ExtractMonth
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Job, DocketCounter
+from .models import Job, JobArchive
+from . import customers
+from .analytics import archive_rollups, job_rollups, merge_rollups, payment_count
+from .archive import JOB_RELATIONS, find_job
+from .dockets import get_counter, highest_docket_number, docket_slot_owner
+from .events import move_job, record_changes, record_deleted, snapshot, timeline, turnaround
+from .filters import JobArchiveFilter, JobFilter
+from .gang import build_queue, describe
 from .serializers import (
     JobSerializer, 
     JobCreateSerializer, 
     JobUpdateSerializer,
     JobStatusUpdateSerializer,
     JobPaymentUpdateSerializer,
-    DocketCounterSerializer
+    JobEventSerializer,
+    CustomerAutocompleteRequestSerializer,
+    DocketCounterSerializer,
+    ImpositionRequestSerializer,
+    PrintQueueRequestSerializer,
+    QuoteRequestSerializer
 )
-from products.models import PaperSize
+from .imposition import quote as imposition_quote
+from .pricing import price_lines
+from products.sizes import get_or_create_custom_size
+from monitoring.query_budget import query_budget
+from paragon_jms.async_api import async_api_view
+from paragon_jms.compression import cache_compressed
+from paragon_jms.db_router import replica_reads
+from paragon_jms.sharding import (
+    ShardedQuerySet,
+    ascatter,
+    ashard_count,
+    merge_ordered,
+    on_shard,
+    scatter,
+    shard_aliases,
+    shard_count,
+    shard_exists,
+    shard_for_branch,
+    shard_get,
+    sharding_enabled,
+    slot_owner,
+)
+from settings.cache import get_branch_registry, get_system_settings
+from users.models import User
 
 
 class JobListCreateView(generics.ListCreateAPIView):
+    cache_compressed = True
+    replica_reads = True
+    # Creating: up to four catalog lookups, then the docket counter lock,
+    # docket probe, counter update, insert and CREATED event
+    query_budget = 9
     queryset = Job.objects.all()
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['status', 'payment_status', 'branch', 'job_type']
     search_fields = ['customer', 'docket_number', 'description']
     ordering_fields = ['date', 'job_id', 'customer']
     ordering = ['-created_at']
@@ -32,14 +76,18 @@ class JobListCreateView(generics.ListCreateAPIView):
             return JobCreateSerializer
         return JobSerializer
 
+    def archived(self):
+        # ?archived=true lists the job history in the archive instead
+        return self.request.query_params.get('archived') in ('true', 'True', '1')
+
+    @property
+    def filterset_class(self):
+        return JobArchiveFilter if self.archived() else JobFilter
+
     def get_queryset(self):
         user = self.request.user
-        queryset = Job.objects.select_related(
-            'product_type',
-            'paper_type',
-            'paper_weight',
-            'paper_size'
-        )
+        model = JobArchive if self.archived() else Job
+        queryset = model.objects.select_related(*JOB_RELATIONS)
         
         if user.role == 'SALES_REPRESENTATIVE':
             queryset = queryset.filter(sales_rep=user.full_name)
@@ -50,6 +98,16 @@ class JobListCreateView(generics.ListCreateAPIView):
 
         return queryset
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if not sharding_enabled():
+            return queryset
+        # Gather from every shard, or only the filtered branch's and default,
+        # which keeps the jobs written before sharding
+        branch = self.request.query_params.get('branch')
+        aliases = sorted({DEFAULT_DB_ALIAS, shard_for_branch(branch)}, key=shard_aliases().index) if branch else None
+        return ShardedQuerySet(queryset, aliases=aliases)
+
     def perform_create(self, serializer):
         user = self.request.user
 
@@ -91,6 +149,9 @@ class JobListCreateView(generics.ListCreateAPIView):
 
 
 class JobDetailView(generics.RetrieveUpdateDestroyAPIView):
+    # Editing: the lookup, update and its events, and with a move to
+    # another shard, reading and deleting the job and its events here
+    query_budget = 7
     queryset = Job.objects.select_related(
         'product_type',
         'paper_type',
@@ -105,6 +166,21 @@ class JobDetailView(generics.RetrieveUpdateDestroyAPIView):
             return JobUpdateSerializer
         return JobSerializer
 
+    def get_object(self):
+        # update() checks edit permission on the job before saving it, so
+        # keep the first lookup rather than searching the shards again
+        if getattr(self, '_job', None) is not None:
+            return self._job
+        # Try the shard whose slot the id is in first, then the archive
+        job_id = self.kwargs[self.lookup_field]
+        try:
+            job = find_job(preferred=slot_owner(job_id), job_id=job_id)
+        except Job.DoesNotExist:
+            raise Http404
+        self.check_object_permissions(self.request, job)
+        self._job = job
+        return job
+
     def check_edit_permission(self, job):
         user = self.request.user
         
@@ -128,6 +204,21 @@ class JobDetailView(generics.RetrieveUpdateDestroyAPIView):
         self.check_edit_permission(job)
         return super().update(request, *args, **kwargs)
 
+    def destroy(self, request, *args, **kwargs):
+        # Archived jobs are settled and read-only
+        if isinstance(self.get_object(), JobArchive):
+            return Response(
+                {'error': 'Archived jobs cannot be changed'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        # The timeline outlives the job, ending with who deleted it
+        with transaction.atomic(using=instance._state.db):
+            record_deleted(instance, actor=self.request.user.pk)
+            instance.delete()
+
     def perform_update(self, serializer):
         # Auto-calculate total_cost
         validated_data = serializer.validated_data
@@ -135,9 +226,19 @@ class JobDetailView(generics.RetrieveUpdateDestroyAPIView):
         design_cost = validated_data.get("design_cost", 0) or 0
         validated_data["total_cost"] = print_cost + design_cost
         
-        serializer.save()
-
-
+        job = serializer.instance
+        with transaction.atomic(using=job._state.db):
+            before = snapshot(job, validated_data)
+            job = serializer.save()
+            record_changes(job, before, actor=self.request.user.pk)
+            if any(field in before and before[field] != getattr(job, field) for field in customers.CUSTOMER_FIELDS):
+                transaction.on_commit(lambda: customers.record(job, created=False), using=job._state.db)
+            if sharding_enabled():
+                # A job moved to another branch belongs on that branch's shard
+                move_job(job, shard_for_branch(job.branch_id))
+
+
+@query_budget(3)
 @api_view(['PATCH'])
 @permission_classes([permissions.IsAuthenticated])
 def update_job_status(request, job_id):
@@ -151,8 +252,23 @@ def update_job_status(request, job_id):
         )
     
     try:
-        job = Job.objects.get(job_id=job_id)
+        job = shard_get(
+            Job.objects.select_related(
+                'product_type',
+                'paper_type',
+                'paper_weight',
+                'paper_size'
+            ),
+            preferred=slot_owner(job_id),
+            job_id=job_id
+        )
     except Job.DoesNotExist:
+        # Archived jobs are settled and read-only
+        if shard_exists(JobArchive.objects.filter(job_id=job_id)):
+            return Response(
+                {'error': 'Archived jobs cannot be changed'},
+                status=status.HTTP_409_CONFLICT
+            )
         return Response(
             {'error': 'Job not found'}, 
             status=status.HTTP_404_NOT_FOUND
@@ -160,11 +276,15 @@ def update_job_status(request, job_id):
     
     serializer = JobStatusUpdateSerializer(job, data=request.data, partial=True)
     serializer.is_valid(raise_exception=True)
-    serializer.save()
+    with transaction.atomic(using=job._state.db):
+        before = snapshot(job, serializer.validated_data)
+        serializer.save()
+        record_changes(job, before, actor=user.pk)
     
     return Response(JobSerializer(job).data)
 
 
+@query_budget(3)
 @api_view(['PATCH'])
 @permission_classes([permissions.IsAuthenticated])
 def update_job_payment(request, job_id):
@@ -178,8 +298,23 @@ def update_job_payment(request, job_id):
         )
     
     try:
-        job = Job.objects.get(job_id=job_id)
+        job = shard_get(
+            Job.objects.select_related(
+                'product_type',
+                'paper_type',
+                'paper_weight',
+                'paper_size'
+            ),
+            preferred=slot_owner(job_id),
+            job_id=job_id
+        )
     except Job.DoesNotExist:
+        # Archived jobs are settled and read-only
+        if shard_exists(JobArchive.objects.filter(job_id=job_id)):
+            return Response(
+                {'error': 'Archived jobs cannot be changed'},
+                status=status.HTTP_409_CONFLICT
+            )
         return Response(
             {'error': 'Job not found'}, 
             status=status.HTTP_404_NOT_FOUND
@@ -187,61 +322,177 @@ def update_job_payment(request, job_id):
     
     serializer = JobPaymentUpdateSerializer(job, data=request.data, partial=True)
     serializer.is_valid(raise_exception=True)
-    serializer.save()
+    with transaction.atomic(using=job._state.db):
+        before = snapshot(job, serializer.validated_data)
+        serializer.save()
+        record_changes(job, before, actor=user.pk)
     
     return Response(JobSerializer(job).data)
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
-def pending_jobs(request):
-    jobs = Job.objects.filter(status='PENDING').select_related(
+def job_events(request, job_id):
+    """A job's timeline: its events, oldest first, live, archived or deleted."""
+    events = timeline(job_id)
+    if not events and not (
+        shard_exists(Job.objects.filter(job_id=job_id))
+        or shard_exists(JobArchive.objects.filter(job_id=job_id))
+    ):
+        return Response(
+            {'error': 'Job not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    actor_ids = {event.actor_id for event in events if event.actor_id is not None}
+    actors = dict(User.objects.filter(pk__in=actor_ids).values_list('pk', 'full_name')) if actor_ids else {}
+    serializer = JobEventSerializer(events, many=True, context={'actors': actors})
+    return Response(serializer.data)
+
+
+@query_budget(4)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def job_by_docket(request, docket_number):
+    """A job by its docket number, from the live jobs or the archive."""
+    try:
+        job = find_job(preferred=docket_slot_owner(docket_number), docket_number=docket_number)
+    except Job.DoesNotExist:
+        return Response(
+            {'error': 'Job not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(JobSerializer(job).data)
+
+
+def _pending_queryset():
+    return Job.objects.filter(status='PENDING').select_related(
         'product_type',
         'paper_type',
         'paper_weight',
         'paper_size'
     )
-    serializer = JobSerializer(jobs, many=True)
+
+
+@query_budget(2)
+@cache_compressed
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def pending_jobs(request):
+    queryset = _pending_queryset()
+    jobs = merge_ordered(scatter(lambda alias: list(on_shard(queryset, alias))), queryset)
+    # The serializer resolves branch codes through a registry loaded here,
+    # rechecked if it misses a branch added since
+    registry = get_branch_registry()
+    if any(registry.get(job.branch_id) is None for job in jobs):
+        registry = get_branch_registry(recheck=True)
+    serializer = JobSerializer(jobs, many=True, context={'branches': registry})
     return Response(serializer.data)
 
 
+@query_budget(2)
+@cache_compressed
+@replica_reads
+@async_api_view(['GET'])
+async def apending_jobs(request):
+    """``pending_jobs`` for ASGI."""
+    queryset = _pending_queryset()
+
+    async def fetch(alias):
+        return [job async for job in on_shard(queryset, alias)]
+
+    jobs = merge_ordered(await ascatter(fetch), queryset)
+    registry = await sync_to_async(get_branch_registry)()
+    if any(registry.get(job.branch_id) is None for job in jobs):
+        registry = await sync_to_async(get_branch_registry)(recheck=True)
+    serializer = JobSerializer(jobs, many=True, context={'branches': registry})
+    return Response(serializer.data)
+
+
+@query_budget(1)
+@replica_reads
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def print_queue(request):
+    """
+    Pending jobs grouped by stock into press runs, in the order that keeps
+    changeovers down, a page of runs at a time, each listing up to
+    ``jobs_limit`` of its jobs.  ``?gang=true`` also packs each run's small
+    jobs onto shared sheets of ``run_sheets`` sheets.  Reads the pending
+    jobs once per shard; the budget counts each database separately.
+    """
+    serializer = PrintQueueRequestSerializer(data=request.GET)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    jobs_limit = params.get('jobs_limit', getattr(settings, 'PRINT_QUEUE_RUN_JOBS', 50))
+
+    groups, changeovers = build_queue(params.get('branch'))
+    paginator = api_settings.DEFAULT_PAGINATION_CLASS()
+    page = paginator.paginate_queryset(groups, request)
+    response = paginator.get_paginated_response([
+        describe(group, gang=params['gang'], run_sheets=params['run_sheets'], jobs_limit=jobs_limit)
+        for group in page
+    ])
+    response.data['changeovers'] = changeovers
+    return response
+
+
+@query_budget(0)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def customer_autocomplete(request):
+    """
+    Customers whose name starts with ``?q=``, with the contact details of
+    their latest job, from this process's in-memory index (``jobs.customers``).
+    For the job form, so only roles that take jobs may look customers up,
+    and sales reps only find the customers of their own jobs.
+    """
+    user = request.user
+    if user.role in ['CLERK', 'OPERATOR']:
+        return Response(
+            {'error': 'Permission denied'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    serializer = CustomerAutocompleteRequestSerializer(data=request.GET)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    sales_rep = user.full_name if user.role == 'SALES_REPRESENTATIVE' else None
+    return Response({
+        'results': customers.get_index().search(params['q'], params['limit'], sales_rep=sales_rep)
+    })
+
+
+@query_budget(6)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def docket_counter(request):
     job_type = request.GET.get('type', 'LOCAL')
+
+    # Each shard numbers its own dockets: use ?branch=, else the default branch
+    alias = shard_for_branch(request.GET.get('branch') or get_system_settings().default_branch_id)
     
     # Get the current counter
-    counter, created = DocketCounter.objects.get_or_create(
-        job_type=job_type,
-        defaults={'current_number': 0}
-    )
+    counter = get_counter(alias, job_type)
     
     # Find the highest existing docket number for LOCAL jobs
     if job_type == 'LOCAL':
-        # Get all LOCAL job docket numbers
-        existing_numbers = Job.objects.filter(
-            job_type='LOCAL',
-            docket_number__startswith='LOC-'
-        ).values_list('docket_number', flat=True)
-        
-        # Extract the highest number from existing docket numbers
-        highest_number = 0
-        for docket_number in existing_numbers:
-            try:
-                num = int(docket_number.split('-')[1])
-                highest_number = max(highest_number, num)
-            except (IndexError, ValueError):
-                continue
+        highest_number = highest_docket_number(alias)
         
         # Update counter if it's behind the highest existing number
         if highest_number >= counter.current_number:
             counter.current_number = highest_number
             counter.save()
     
-    serializer = DocketCounterSerializer(counter)
+    serializer = DocketCounterSerializer(counter, context={'shard': alias})
     return Response(serializer.data)
 
 
+@query_budget(9)
+@cache_compressed
+@replica_reads
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def job_analytics(request):
@@ -255,52 +506,65 @@ def job_analytics(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=30)
     
+    # Every aggregate runs on each shard, live and archived rows are merged
+    # here, and sorting and top-10 limits apply to the combined figures
+    archived = archive_rollups()
+    rollups = merge_rollups(
+        job_rollups(Job, start_date, end_date),
+        {
+            **archived,
+            'daily_profits': [
+                row for row in archived['daily_profits']
+                if start_date <= row['created_date'] <= end_date
+            ],
+        },
+    )
+
     # User performance
-    user_performance = Job.objects.values('order_taken_by').annotate(
-        jobs_created=Count('job_id'),
-        jobs_printed=Count('job_id', filter=Q(status='PRINTED')),
-        jobs_paid=Count('job_id', filter=Q(payment_status__in=['RECEIPTED', 'INVOICED']))
-    ).order_by('-jobs_created')[:10]
+    user_performance = sorted(
+        rollups['user_performance'],
+        key=lambda row: -row['jobs_created']
+    )[:10]
     
-    # Branch performance with profits
-    branch_performance = Job.objects.values('branch').annotate(
-        job_count=Count('job_id'),
-        total_profit=Sum('total_cost', filter=Q(payment_status__in=['RECEIPTED', 'INVOICED']))
-    ).order_by('-job_count')
+    # Branch performance with profits, grouped on the branch key
+    branches = get_branch_registry()
+    branch_performance = [
+        {**row, 'branch': branches.code_for(row['branch'])}
+        for row in sorted(rollups['branch_performance'], key=lambda row: -row['job_count'])
+    ]
     
     # Popular product types with revenue
-    product_performance = Job.objects.values('product_type__name').annotate(
-        job_count=Count('job_id'),
-        total_revenue=Sum('total_cost', filter=Q(payment_status__in=['RECEIPTED', 'INVOICED']))
-    ).order_by('-job_count')[:10]
+    product_performance = sorted(
+        rollups['product_performance'],
+        key=lambda row: -row['job_count']
+    )[:10]
     
     # Financial stats
     financial_stats = {
-        'total_receipted': Job.objects.filter(payment_status='RECEIPTED').count(),
-        'total_invoiced': Job.objects.filter(payment_status='INVOICED').count(),
-        'total_unpaid': Job.objects.filter(payment_status='NOT_MARKED').count(),
+        'total_receipted': payment_count(rollups, 'RECEIPTED'),
+        'total_invoiced': payment_count(rollups, 'INVOICED'),
+        'total_unpaid': payment_count(rollups, 'NOT_MARKED'),
     }
     
     # Daily profits for the last 30 days
-    daily_profits = Job.objects.filter(
-        created_at__date__gte=start_date,
-        created_at__date__lte=end_date,
-        payment_status__in=['RECEIPTED', 'INVOICED']
-    ).annotate(
-        created_date=TruncDate('created_at')
-    ).values('created_date').annotate(
-        total_profit=Sum('total_cost')
-    ).order_by('created_date')
+    daily_profits = sorted(
+        rollups['daily_profits'],
+        key=lambda row: row['created_date']
+    )
     
     # Monthly branch profits
-    monthly_branch_profits = Job.objects.filter(
-        payment_status__in=['RECEIPTED', 'INVOICED']
-    ).annotate(
-        month=ExtractMonth('created_at')
-    ).values('month', 'branch').annotate(
-        total_profit=Sum('total_cost')
-    ).order_by('month', 'branch')
+    monthly_branch_profits = sorted(
+        (
+            {**row, 'branch': branches.code_for(row['branch'])}
+            for row in rollups['monthly_branch_profits']
+        ),
+        key=lambda row: (row['month'], row['branch'] or '')
+    )
     
+    # Hours from taking a job to printing it, for jobs printed in the period
+    now = timezone.now()
+    turnaround_stats = turnaround(now - timedelta(days=30), now)
+
     return Response({
         'user_performance': user_performance,
         'branch_performance': branch_performance,
@@ -308,9 +572,28 @@ def job_analytics(request):
         'financial_stats': financial_stats,
         'daily_profits': daily_profits,
         'monthly_branch_profits': monthly_branch_profits,
+        'turnaround': turnaround_stats,
     })
 
 
+def _designer_stats_querysets():
+    today = timezone.now().date()
+    return {
+        'jobs_today': Job.objects.filter(
+            created_at__date=today
+        ),
+        'pending_jobs': Job.objects.filter(
+            status='PENDING'
+        ),
+        'completed_today': Job.objects.filter(
+            status='PRINTED',
+            updated_at__date=today
+        ),
+    }
+
+
+@query_budget(3)
+@replica_reads
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def designer_stats(request):
@@ -320,32 +603,100 @@ def designer_stats(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
-    # Get today's date
-    today = timezone.now().date()
+    stats = {
+        name: shard_count(queryset)
+        for name, queryset in _designer_stats_querysets().items()
+    }
+    
+    return Response(stats)
+
+
+@query_budget(3)
+@replica_reads
+@async_api_view(['GET'])
+async def adesigner_stats(request):
+    """``designer_stats`` for ASGI."""
+    if request.user.role not in ['DESIGNER', 'SUPERUSER']:
+        return Response(
+            {'error': 'Permission denied'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
     
-    # Calculate stats
     stats = {
-        'jobs_today': Job.objects.filter(
-            created_at__date=today
-        ).count(),
-        'pending_jobs': Job.objects.filter(
-            status='PENDING'
-        ).count(),
-        'completed_today': Job.objects.filter(
-            status='PRINTED',
-            updated_at__date=today
-        ).count(),
+        name: await ashard_count(queryset)
+        for name, queryset in _designer_stats_querysets().items()
     }
     
     return Response(stats)
 
 
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def imposition(request):
+    """Sheet yield (ups, sheets, waste) of a finished size on every compatible sheet."""
+    serializer = ImpositionRequestSerializer(data=request.GET)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+    paper_weight = params.get('paper_weight')
+
+    results = imposition_quote(
+        params['width_mm'],
+        params['height_mm'],
+        quantity=params['quantity'],
+        limit=params['limit'],
+        bleed_mm=params['bleed_mm'],
+        gutter_mm=params['gutter_mm'],
+        margin_mm=params['margin_mm'],
+        paper_weight_id=paper_weight.pk if paper_weight else None,
+    )
+    return Response({
+        'width_mm': str(params['width_mm']),
+        'height_mm': str(params['height_mm']),
+        'quantity': params['quantity'],
+        'results': results,
+    })
+
+
+@query_budget(6)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def quote(request):
+    """Price many quote lines in one call, with the sheet yield behind each price."""
+    serializer = QuoteRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    results = price_lines(
+        params['lines'],
+        bleed_mm=params['bleed_mm'],
+        gutter_mm=params['gutter_mm'],
+        margin_mm=params['margin_mm'],
+    )
+    return Response({
+        'lines': [
+            {**line, **result}
+            for line, result in zip(serializer.data['lines'], results)
+        ]
+    })
+
+
+@query_budget(0)
+@cache_compressed
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_branches(request):
-    """Get a list of all unique branches from jobs."""
-    branches = Job.objects.values_list('branch', flat=True).distinct().order_by('branch')
-    return Response(list(branches))
+    """Get the codes of all branches, from the cached branch registry."""
+    return Response(get_branch_registry().codes)
+
+
+@query_budget(0)
+@cache_compressed
+@async_api_view(['GET'])
+async def aget_branches(request):
+    """``get_branches`` for ASGI."""
+    registry = await sync_to_async(get_branch_registry)()
+    return Response(registry.codes)
 
 
 class JobCreateView(generics.CreateAPIView):
@@ -357,12 +708,11 @@ class JobCreateView(generics.CreateAPIView):
         custom_size_data = request.data.get('custom_size')
         if custom_size_data:
             try:
-                # Create or get the custom size
-                custom_size, created = PaperSize.objects.get_or_create(
-                    name=custom_size_data['name'],
-                    width_mm=custom_size_data['width_mm'],
-                    height_mm=custom_size_data['height_mm'],
-                    defaults={'series': 'OTHER'}
+                # Reuse an existing or near-identical size before creating one
+                custom_size, created = get_or_create_custom_size(
+                    custom_size_data['width_mm'],
+                    custom_size_data['height_mm'],
+                    name=custom_size_data.get('name')
                 )
                 # Update the request data to use the custom size ID
                 mutable_data = request.data.copy()
@@ -0,0 +1,20 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+
+    def ready(self):
+        from . import wrappers
+        connection_created.connect(wrappers.install, dispatch_uid='monitoring.wrappers')
+
+        if getattr(settings, 'METRICS_ENABLED', False):
+            from .metrics import instrument_serializers
+            instrument_serializers()
+
+        if getattr(settings, 'SLOW_QUERY_LOG_ENABLED', False):
+            from .slow_queries import install
+            connection_created.connect(install, dispatch_uid='monitoring.slow_queries')
@@ -0,0 +1,16 @@
+"""Access checks for the monitoring endpoints, which sit outside DRF views."""
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def is_superuser_request(request):
+    """True when the request carries a superuser JWT or superuser session."""
+    from users.authentication import ClaimsJWTAuthentication
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    if result is not None:
+        return result[0].role == 'SUPERUSER'
+
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_authenticated and getattr(user, 'role', None) == 'SUPERUSER')
@@ -0,0 +1,215 @@
+"""
+In-process benchmarks of the hot API endpoints, for ``manage.py benchmark_endpoints``.
+
+Each case is one request made through Django's test client as a given
+role, so it runs the full middleware stack, authentication, routers and
+serialization, and nothing else.  A case is run a few times to warm the
+per-process caches (catalog index, settings, compressed responses), then
+timed ``iterations`` times.  It records:
+
+- wall time per request (median, 95th percentile and fastest),
+- the number of queries on every database, including ones that budgets
+  ignore (``unbudgeted()``), taken from the last timed request,
+- the peak Python memory allocated during one more request, traced with
+  ``tracemalloc`` separately so tracing doesn't slow the timed runs.
+
+Results are plain dicts that ``compare()`` checks against a saved run.
+"""
+import json
+import statistics
+import time
+import tracemalloc
+from urllib.parse import quote
+
+from django.db.models import Exists, OuterRef
+from django.test import Client
+from django.urls import reverse
+
+from jobs.models import Job, JobEvent
+from paragon_jms.sharding import ShardedQuerySet, shard_get
+from products.models import PaperType, ProductType, ProductTypeSpecification
+from settings.cache import get_branch_registry
+from users.authentication import ClaimsRefreshToken
+from users.models import User
+from .wrappers import observe_queries
+
+ROLES = ['SUPERUSER', 'DESIGNER', 'SALES_REPRESENTATIVE', 'OPERATOR', 'CLERK']
+
+
+class Case:
+    def __init__(self, name, path, role='SUPERUSER', method='GET', data=None, headers=None, cleanup=None):
+        self.name = name
+        self.path = path
+        self.role = role
+        self.method = method
+        self.data = data
+        self.headers = headers or {}
+        # Called with each response, untimed, to undo what the request wrote
+        self.cleanup = cleanup
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _delete_created_job(response):
+    job = shard_get(Job.objects, job_id=response.json()['job_id'])
+    JobEvent.objects.using(job._state.db).filter(job_id=job.pk).delete()
+    job.delete()
+
+
+def build_cases():
+    """The benchmark cases, with ids and bodies taken from the current data."""
+    job = ShardedQuerySet(Job.objects.order_by('-created_at'))[0]
+    branches = get_branch_registry()
+    specified = ProductType.objects.filter(
+        Exists(ProductTypeSpecification.objects.filter(product_type=OuterRef('pk')))
+    ).order_by('id').first() or ProductType.objects.order_by('id').first()
+
+    cases = [
+        Case(f'job-list:{role.lower()}', reverse('job-list'), role=role) for role in ROLES
+    ]
+    cases += [
+        Case('job-detail', reverse('job-detail', args=[job.job_id])),
+        Case('job-events', reverse('job-events', args=[job.job_id])),
+        # Uncompressed, so the cleanup can read the new job's id
+        Case('job-create', reverse('job-list'), role='DESIGNER', method='POST', cleanup=_delete_created_job,
+             headers={'HTTP_ACCEPT_ENCODING': 'identity'}, data={
+            'branch': branches.code_for(job.branch_id),
+            'job_type': 'LOCAL',
+            'docket_number': 'LOC-000',
+            'sales_rep': job.sales_rep,
+            'order_taken_by': job.order_taken_by,
+            'customer': job.customer,
+            'contact_person': job.contact_person,
+            'mobile_number': job.mobile_number,
+            'email_address': job.email_address,
+            'quantity': job.quantity,
+            'description': job.description,
+            'product_type': job.product_type_id,
+            'paper_type': job.paper_type_id,
+            'paper_weight': job.paper_weight_id,
+            'paper_size': job.paper_size_id,
+            'print_cost': str(job.print_cost),
+            'design_cost': str(job.design_cost),
+        }),
+        Case('docket-counter', reverse('docket_counter')),
+        Case('pending-jobs', reverse('pending_jobs')),
+        Case('print-queue', reverse('print_queue') + '?gang=true'),
+        Case('customer-autocomplete', reverse('customer-autocomplete') + f'?q={quote(job.customer[:3])}'),
+        Case('job-analytics', reverse('job_analytics')),
+        Case('admin-stats', reverse('admin_stats')),
+        Case('product-types', reverse('product-type-list')),
+        Case('paper-types', reverse('paper-type-list')),
+        Case('paper-weights', reverse('paper-weight-list')),
+        Case('paper-sizes', reverse('paper-size-list')),
+        Case('product-specifications', reverse('product-specifications', args=[specified.pk])),
+        Case('compatible-weights', reverse('compatible-weights') + f'?paper_type_id={PaperType.objects.order_by("id").first().pk}'),
+        Case('compatible-sizes', reverse('compatible-sizes')),
+        Case('nearest-sizes', reverse('nearest-sizes') + '?width_mm=210&height_mm=297'),
+    ]
+    return cases
+
+
+def clients(accept_encoding='br, gzip'):
+    """A test client per role, authenticated as the first approved user with it."""
+    result = {}
+    for role in ROLES:
+        user = User.objects.filter(role=role, approved=True).order_by('date_joined').first()
+        if user is None:
+            continue
+        token = ClaimsRefreshToken.for_user(user).access_token
+        result[role] = Client(HTTP_AUTHORIZATION=f'Bearer {token}', HTTP_ACCEPT_ENCODING=accept_encoding)
+    return result
+
+
+def _request(client, case):
+    if case.data is None:
+        return client.generic(case.method, case.path, **case.headers)
+    return client.generic(
+        case.method, case.path, data=json.dumps(case.data), content_type='application/json', **case.headers
+    )
+
+
+def _failed(case, response):
+    raise RuntimeError(
+        f'{case.name}: {case.method} {case.path} returned {response.status_code}: '
+        f'{response.content[:300].decode(errors="replace")}'
+    )
+
+
+def _call(client, case):
+    response = _request(client, case)
+    if not 200 <= response.status_code < 300:
+        _failed(case, response)
+    if case.cleanup is not None:
+        case.cleanup(response)
+    return response
+
+
+def run_case(client, case, iterations=20, warmup=2):
+    """Warm ``case`` up, time it ``iterations`` times and trace one more run."""
+    for _ in range(warmup):
+        _call(client, case)
+
+    timings = []
+    for _ in range(iterations):
+        counter = _QueryCounter()
+        with observe_queries(counter):
+            started = time.perf_counter()
+            response = _request(client, case)
+            timings.append((time.perf_counter() - started) * 1000)
+        if not 200 <= response.status_code < 300:
+            _failed(case, response)
+        if case.cleanup is not None:
+            case.cleanup(response)
+
+    tracemalloc.start()
+    try:
+        _call(client, case)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'method': case.method,
+        'path': case.path,
+        'role': case.role,
+        'status': response.status_code,
+        'bytes': len(response.content),
+        'wall_ms': {
+            'median': round(statistics.median(timings), 3),
+            'p95': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            'min': round(timings[0], 3),
+        },
+        'queries': counter.count,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def compare(results, baseline, max_regression=None):
+    """
+    Rows of (case, current, baseline, regressions) for the cases in both
+    runs.  With ``max_regression`` (a percentage), a case regresses when its
+    median time grew by more than that or it runs more queries.
+    """
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        regressions = []
+        if max_regression is not None:
+            limit = previous['wall_ms']['median'] * (1 + max_regression / 100)
+            if current['wall_ms']['median'] > limit:
+                regressions.append('time')
+            if current['queries'] > previous['queries']:
+                regressions.append('queries')
+        rows.append((name, current, previous, regressions))
+    return rows
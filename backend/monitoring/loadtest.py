@@ -0,0 +1,474 @@
+"""
+Role-mix load test against a running server.
+
+Run from the backend directory, with the server up and the database
+seeded (``seed_data``, then ``generate_load_data`` for realistic sizes)::
+
+    python -m monitoring.loadtest http://localhost:8000 \\
+        --users operator=4,clerk=2,sales=3,superuser=1 --duration 120 --think 2
+
+Every virtual user logs in through ``/api/auth/login/`` with its role's
+account and then repeats its role's script until the time is up:
+
+- operator: polls pending jobs, opens one and now and then marks it printed
+- clerk: pages through unpaid jobs and receipts or invoices one
+- sales: lists their jobs, browses the catalog and creates a job
+- superuser: opens analytics, the admin dashboard and filtered job lists
+
+Users pause between requests for a random think time (exponential around
+``--think`` seconds) and start spread over ``--ramp-up`` seconds.  Each
+user keeps one HTTP/1.1 keep-alive connection, as a browser tab would.
+``--read-only`` leaves out the status, payment and create requests.
+
+The report gives throughput, error counts and latency percentiles per
+endpoint (paths with ids are grouped by template).  The client is
+asyncio streams and the standard library only, so it runs anywhere the
+backend does and doesn't import Django.
+"""
+import argparse
+import asyncio
+import gzip
+import itertools
+import json
+import random
+import ssl
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_LOGINS = {
+    'operator': ('operator@paragon.com', 'password123'),
+    'clerk': ('clerk@paragon.com', 'password123'),
+    'sales': ('sales@paragon.com', 'password123'),
+    'superuser': ('admin@paragon.com', 'admin123'),
+}
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Finished(Exception):
+    """The test's time is up."""
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection, reopened when the server closes it."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.https = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.https else 80)
+        self.host_header = parts.netloc
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        """(status, headers, body) of one request; retried once on a stale connection."""
+        for attempt in (1, 2):
+            reused = self.writer is not None
+            try:
+                return await asyncio.wait_for(self._exchange(method, path, body, headers or {}), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError, HTTPError):
+                await self.close()
+                # A reused connection may have been closed by the server while idle
+                if not reused or attempt == 2:
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+
+    async def _exchange(self, method, path, body, headers):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=ssl.create_default_context() if self.https else None
+            )
+        lines = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host_header}',
+            'Accept: application/json',
+            'Accept-Encoding: gzip',
+        ]
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        if body is not None:
+            lines += ['Content-Type: application/json', f'Content-Length: {len(body)}']
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('connection closed')
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            content = b''.join(chunks)
+        elif 'content-length' in response_headers:
+            content = await self.reader.readexactly(int(response_headers['content-length']))
+        else:
+            content = await self.reader.read()
+            response_headers['connection'] = 'close'
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        if response_headers.get('content-encoding') == 'gzip':
+            content = gzip.decompress(content)
+        return status, response_headers, content
+
+
+class Stats:
+    """Latencies and outcomes per endpoint label."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def record(self, label, latency, status=None, error=None):
+        self.latencies.setdefault(label, []).append(latency)
+        if error is not None:
+            self.errors.setdefault(label, {}).setdefault(error, 0)
+            self.errors[label][error] += 1
+        else:
+            self.statuses.setdefault(label, {}).setdefault(status, 0)
+            self.statuses[label][status] += 1
+
+    def report(self, elapsed):
+        """One row per endpoint and a total, as dicts."""
+        rows = []
+        labels = sorted(self.latencies, key=lambda label: -len(self.latencies[label]))
+        for label in labels + ['TOTAL']:
+            if label == 'TOTAL':
+                latencies = list(itertools.chain.from_iterable(self.latencies.values()))
+                statuses = {}
+                for counts in self.statuses.values():
+                    for status, count in counts.items():
+                        statuses[status] = statuses.get(status, 0) + count
+                errors = sum(sum(counts.values()) for counts in self.errors.values())
+            else:
+                latencies = self.latencies[label]
+                statuses = self.statuses.get(label, {})
+                errors = sum(self.errors.get(label, {}).values())
+            if not latencies:
+                continue
+            latencies = sorted(latencies)
+            failed = errors + sum(count for status, count in statuses.items() if status >= 400)
+            rows.append({
+                'endpoint': label,
+                'requests': len(latencies),
+                'failed': failed,
+                'throughput': round(len(latencies) / elapsed, 2),
+                'latency_ms': {
+                    **{f'p{p}': round(_percentile(latencies, p) * 1000, 1) for p in PERCENTILES},
+                    'max': round(latencies[-1] * 1000, 1),
+                },
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'errors': self.errors.get(label, {}) if label != 'TOTAL' else {},
+            })
+        return rows
+
+
+def _percentile(ordered, percent):
+    """Nearest-rank percentile of a sorted list."""
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+
+class VirtualUser:
+    def __init__(self, role, login, options, stats, deadline, rng):
+        self.role = role
+        self.email, self.password = login
+        self.options = options
+        self.stats = stats
+        self.deadline = deadline
+        self.rng = rng
+        self.connection = Connection(options.url, options.timeout)
+        self.token = None
+
+    async def think(self):
+        """Pause like a person reading the page; raises ``Finished`` when time is up."""
+        pause = self.rng.expovariate(1 / self.options.think) if self.options.think > 0 else 0
+        remaining = self.deadline - time.monotonic()
+        if pause >= remaining:
+            await asyncio.sleep(max(remaining, 0))
+            raise Finished
+        await asyncio.sleep(pause)
+
+    async def login(self):
+        status, data = await self.call('POST', '/api/auth/login/', {'email': self.email, 'password': self.password},
+                                       authenticate=False)
+        if status != 200 or not data or 'access' not in data:
+            raise RuntimeError(f'{self.role}: login as {self.email} failed ({status})')
+        self.token = data['access']
+
+    async def call(self, method, path, payload=None, label=None, params=None, authenticate=True):
+        """
+        Make one request and record it under ``label`` (default: method and
+        path).  Returns (status, parsed JSON or None); None status on errors.
+        """
+        if time.monotonic() >= self.deadline:
+            raise Finished
+        label = label or f'{method} {path}'
+        url = path + (f'?{urlencode(params)}' if params else '')
+        headers = {'Authorization': f'Bearer {self.token}'} if authenticate and self.token else {}
+        body = json.dumps(payload).encode() if payload is not None else None
+
+        started = time.perf_counter()
+        try:
+            status, _headers, content = await self.connection.request(method, url, body, headers)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, HTTPError, ssl.SSLError) as e:
+            self.stats.record(label, time.perf_counter() - started, error=type(e).__name__)
+            return None, None
+        self.stats.record(label, time.perf_counter() - started, status=status)
+
+        if status == 401 and authenticate:
+            # Expired or revoked token: log in again for the next request
+            await self.login()
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+    async def close(self):
+        await self.connection.close()
+
+
+def _results(data):
+    """The jobs of a list response, paginated or not."""
+    if isinstance(data, dict):
+        return data.get('results') or []
+    return data if isinstance(data, list) else []
+
+
+def _reference(rng):
+    return f'{rng.randrange(10 ** 6):06d}'
+
+
+async def operator_script(user):
+    status, pending = await user.call('GET', '/api/jobs/pending/')
+    await user.think()
+    jobs = _results(pending)
+    if not jobs:
+        return
+    job = user.rng.choice(jobs)
+    await user.call('GET', f'/api/jobs/{job["job_id"]}/', label='GET /api/jobs/{id}/')
+    await user.think()
+    if not user.options.read_only and user.rng.random() < 0.3:
+        await user.call('PATCH', f'/api/jobs/{job["job_id"]}/status/', {'status': 'PRINTED'},
+                        label='PATCH /api/jobs/{id}/status/')
+        await user.think()
+
+
+async def clerk_script(user):
+    jobs = []
+    for page in range(1, user.rng.randint(1, 3) + 1):
+        status, data = await user.call('GET', '/api/jobs/', params={'page': page} if page > 1 else None,
+                                       label='GET /api/jobs/ (unpaid page)')
+        jobs = _results(data) or jobs
+        await user.think()
+        if not (isinstance(data, dict) and data.get('next')):
+            break
+    if jobs and not user.options.read_only:
+        job = user.rng.choice(jobs)
+        receipted = user.rng.random() < 0.65
+        await user.call('PATCH', f'/api/jobs/{job["job_id"]}/payment/', {
+            'payment_status': 'RECEIPTED' if receipted else 'INVOICED',
+            'payment_ref': f'{"REC" if receipted else "INV"}-{_reference(user.rng)}',
+        }, label='PATCH /api/jobs/{id}/payment/')
+        await user.think()
+
+
+async def sales_script(user):
+    status, data = await user.call('GET', '/api/jobs/', label='GET /api/jobs/ (own)')
+    await user.think()
+    status, products = await user.call('GET', '/api/products/product-types/')
+    products = _results(products)
+    if products:
+        product = user.rng.choice(products)
+        await user.call('GET', f'/api/products/product-types/{product["id"]}/specifications/',
+                        label='GET /api/products/product-types/{id}/specifications/')
+    await user.think()
+
+    # A new order like one already on the books, so the paper spec is valid
+    jobs = _results(data)
+    if not jobs or user.options.read_only:
+        return
+    template = user.rng.choice(jobs)
+    await user.call('POST', '/api/jobs/', {
+        'branch': template['branch'],
+        'job_type': 'LOCAL',
+        'docket_number': 'LOC-000',
+        'sales_rep': template['sales_rep'],
+        'order_taken_by': template['order_taken_by'],
+        'customer': template['customer'],
+        'contact_person': template['contact_person'],
+        'mobile_number': template['mobile_number'],
+        'email_address': template['email_address'],
+        'quantity': template['quantity'],
+        'description': template['description'],
+        'product_type': template['product_type']['id'],
+        'paper_type': (template['paper_type'] or {}).get('id'),
+        'paper_weight': (template['paper_weight'] or {}).get('id'),
+        'paper_size': (template['paper_size'] or {}).get('id'),
+        'print_cost': template['print_cost'],
+        'design_cost': template['design_cost'],
+    })
+    await user.think()
+
+
+async def superuser_script(user):
+    await user.call('GET', '/api/jobs/analytics/')
+    await user.think()
+    await user.call('GET', '/api/auth/admin/stats/')
+    await user.think()
+    status, data = await user.call('GET', '/api/jobs/', label='GET /api/jobs/ (filtered)', params={
+        'payment_status': user.rng.choice(['NOT_MARKED', 'RECEIPTED', 'INVOICED']),
+    })
+    jobs = _results(data)
+    await user.think()
+    if jobs:
+        await user.call('GET', f'/api/jobs/{user.rng.choice(jobs)["job_id"]}/', label='GET /api/jobs/{id}/')
+        await user.think()
+
+
+SCRIPTS = {
+    'operator': operator_script,
+    'clerk': clerk_script,
+    'sales': sales_script,
+    'superuser': superuser_script,
+}
+
+
+async def run_user(role, index, total, options, stats, started, rng):
+    await asyncio.sleep(options.ramp_up * index / total)
+    user = VirtualUser(role, options.logins[role], options, stats, started + options.duration, rng)
+    try:
+        await user.login()
+        while True:
+            await SCRIPTS[role](user)
+    except Finished:
+        pass
+    finally:
+        await user.close()
+
+
+async def run(options):
+    stats = Stats()
+    users = [role for role, count in options.users.items() for _ in range(count)]
+    rng = random.Random(options.seed)
+    rng.shuffle(users)
+    started = time.monotonic()
+    tasks = [
+        asyncio.create_task(run_user(role, index, len(users), options, stats, started,
+                                     random.Random(rng.random())))
+        for index, role in enumerate(users)
+    ]
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    failures = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    return stats, time.monotonic() - started, failures
+
+
+def _user_counts(value):
+    counts = {}
+    for part in value.split(','):
+        role, _, count = part.partition('=')
+        role = role.strip()
+        if role not in SCRIPTS or not count.strip().isdigit():
+            raise argparse.ArgumentTypeError(f'expected role=count with roles {", ".join(SCRIPTS)}: {part!r}')
+        counts[role] = int(count)
+    return counts
+
+
+def _login(value):
+    role, _, credentials = value.partition('=')
+    email, _, password = credentials.partition(':')
+    if role not in SCRIPTS or not email or not password:
+        raise argparse.ArgumentTypeError(f'expected role=email:password: {value!r}')
+    return role, (email, password)
+
+
+def print_report(rows, elapsed, out=sys.stdout):
+    out.write(f'\n{len(rows) and rows[-1]["requests"]} requests in {elapsed:.1f}s\n')
+    header = f'{"endpoint":<56} {"reqs":>7} {"fail":>5} {"req/s":>7}' + ''.join(
+        f' {f"p{p}":>8}' for p in PERCENTILES
+    ) + f' {"max":>8}\n'
+    out.write(header)
+    for row in rows:
+        latency = row['latency_ms']
+        out.write(
+            f'{row["endpoint"]:<56} {row["requests"]:>7} {row["failed"]:>5} {row["throughput"]:>7.2f}'
+            + ''.join(f' {latency[f"p{p}"]:>6.0f}ms' for p in PERCENTILES)
+            + f' {latency["max"]:>6.0f}ms\n'
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m monitoring.loadtest', description=__doc__.split('\n\n')[0])
+    parser.add_argument('url', nargs='?', default='http://localhost:8000', help='Base URL of the running server')
+    parser.add_argument('--users', type=_user_counts, default=_user_counts('operator=4,clerk=2,sales=3,superuser=1'),
+                        help='Virtual users per role (default operator=4,clerk=2,sales=3,superuser=1)')
+    parser.add_argument('--login', type=_login, action='append', default=[],
+                        help='Account for a role as role=email:password (default: the seed_data users)')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+    parser.add_argument('--ramp-up', type=float, default=10, help='Seconds over which users start')
+    parser.add_argument('--think', type=float, default=2, help='Mean pause between requests, in seconds')
+    parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as failed')
+    parser.add_argument('--read-only', action='store_true', help='Skip requests that change jobs')
+    parser.add_argument('--seed', type=int, help='Random seed for repeatable user behaviour')
+    parser.add_argument('--json', dest='json_path', help='Also write the report to this JSON file')
+    options = parser.parse_args(argv)
+    options.logins = {**DEFAULT_LOGINS, **dict(options.login)}
+    options.users = {role: count for role, count in options.users.items() if count > 0}
+    if not options.users:
+        parser.error('--users needs at least one user')
+    if options.ramp_up >= options.duration:
+        parser.error('--ramp-up must be shorter than --duration')
+
+    print(f'{sum(options.users.values())} users ({", ".join(f"{role}={count}" for role, count in options.users.items())})'
+          f' against {options.url} for {options.duration:.0f}s')
+    stats, elapsed, failures = asyncio.run(run(options))
+    rows = stats.report(elapsed)
+    print_report(rows, elapsed)
+    for failure in failures:
+        print(f'user failed: {failure}', file=sys.stderr)
+
+    if options.json_path:
+        with open(options.json_path, 'w') as f:
+            json.dump({
+                'url': options.url,
+                'users': options.users,
+                'duration': round(elapsed, 2),
+                'think': options.think,
+                'read_only': options.read_only,
+                'endpoints': rows,
+            }, f, indent=2)
+    return 1 if failures or not rows else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+from contextlib import ExitStack
+from datetime import datetime, timezone
+import fnmatch
+import io
+import json
+import platform
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment,
+    teardown_databases, teardown_test_environment,
+)
+
+from jobs.models import Job
+from monitoring import benchmark
+from paragon_jms.sharding import shard_aliases, shard_count, sharding_enabled
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the hot API endpoints in-process through the test client: wall time, '
+        'queries and peak memory per case, saved as JSON and compared with a baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=10000,
+                            help='Jobs in the generated dataset')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed of the generated dataset')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes generating the dataset (PostgreSQL only)')
+        parser.add_argument('--iterations', type=int, default=20,
+                            help='Timed requests per case')
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Untimed requests per case first')
+        parser.add_argument('--case', action='append', dest='cases',
+                            help='Only run cases matching this pattern, e.g. "job-list:*" (repeatable)')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare with the results in this JSON file')
+        parser.add_argument('--max-regression', type=float,
+                            help='Fail if a median time grows by more than this percentage '
+                                 'over the baseline, or a case runs more queries')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark databases, and their dataset, between runs '
+                                 '(SQLite test databases are in memory and never kept)')
+        parser.add_argument('--current-db', action='store_true',
+                            help='Benchmark the configured databases and their data instead of '
+                                 'a generated dataset (job creation writes and deletes jobs there)')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['jobs'] < 1:
+            raise CommandError('--iterations and --jobs must be at least 1')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read the baseline: {e}')
+
+        setup_test_environment()
+        try:
+            with ExitStack() as stack:
+                if not options['current_db']:
+                    # A private cache, so a shared one (REDIS_URL) never sees benchmark data
+                    stack.enter_context(override_settings(CACHES={'default': {
+                        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                        'LOCATION': 'benchmark',
+                    }}))
+                    verbosity = max(options['verbosity'] - 1, 0)
+                    databases = setup_databases(
+                        verbosity, interactive=False, keepdb=options['keepdb'], serialized_aliases=set()
+                    )
+                    stack.callback(teardown_databases, databases, verbosity, keepdb=options['keepdb'])
+                    self._generate(options)
+                results = self._run(options)
+        finally:
+            teardown_test_environment()
+
+        run = {'meta': self._meta(options), 'cases': results}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(run, f, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if baseline is not None:
+            self._compare(run, baseline, options['max_regression'])
+
+    def _generate(self, options):
+        existing = shard_count(Job.objects)
+        if existing >= options['jobs']:
+            self.stdout.write(f'Reusing the dataset of {existing} job(s)')
+            return
+        call_command('seed_data', stdout=io.StringIO())
+        if sharding_enabled():
+            call_command('sync_shards', '--move-jobs', stdout=io.StringIO())
+        self.stdout.write(f'Generating {options["jobs"] - existing} job(s)...')
+        call_command(
+            'generate_load_data', jobs=options['jobs'] - existing, seed=options['seed'],
+            workers=options['workers'], stdout=io.StringIO(),
+        )
+
+    def _run(self, options):
+        clients = benchmark.clients()
+        cases = benchmark.build_cases()
+        if options['cases']:
+            cases = [
+                case for case in cases
+                if any(fnmatch.fnmatchcase(case.name, pattern) for pattern in options['cases'])
+            ]
+            if not cases:
+                raise CommandError('No case matches --case')
+
+        self.stdout.write(f'{"case":<30} {"median":>10} {"p95":>10} {"queries":>8} {"peak":>11}')
+        results = {}
+        for case in cases:
+            client = clients.get(case.role)
+            if client is None:
+                raise CommandError(f'{case.name} needs an approved {case.role} user')
+            try:
+                result = benchmark.run_case(client, case, options['iterations'], options['warmup'])
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            results[case.name] = result
+            self.stdout.write(
+                f'{case.name:<30} {result["wall_ms"]["median"]:>8.2f}ms {result["wall_ms"]["p95"]:>8.2f}ms '
+                f'{result["queries"]:>8} {result["peak_kib"]:>8.0f}KiB'
+            )
+        return results
+
+    def _meta(self, options):
+        return {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'jobs': shard_count(Job.objects) if options['current_db'] else options['jobs'],
+            'seed': None if options['current_db'] else options['seed'],
+            'database': connection.vendor,
+            'shards': len(shard_aliases()),
+            'iterations': options['iterations'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+
+    def _compare(self, run, baseline, max_regression):
+        different = [
+            key for key in ('jobs', 'database', 'shards')
+            if baseline.get('meta', {}).get(key) != run['meta'][key]
+        ]
+        if different:
+            self.stdout.write(self.style.WARNING(
+                f'The baseline was taken with a different {", ".join(different)}'
+            ))
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Against the baseline (median time, queries, peak memory)'))
+        failed = []
+        for name, current, previous, regressions in benchmark.compare(
+            run['cases'], baseline.get('cases', {}), max_regression
+        ):
+            change = (current['wall_ms']['median'] / previous['wall_ms']['median'] - 1) * 100 \
+                if previous['wall_ms']['median'] else 0.0
+            line = (
+                f'{name:<30} {previous["wall_ms"]["median"]:>8.2f} -> {current["wall_ms"]["median"]:>8.2f}ms '
+                f'({change:+6.1f}%)  {previous["queries"]:>3} -> {current["queries"]:<3} '
+                f'{previous["peak_kib"]:>8.0f} -> {current["peak_kib"]:.0f}KiB'
+            )
+            if regressions:
+                failed.append(name)
+                line = self.style.ERROR(f'{line}  REGRESSED ({", ".join(regressions)})')
+            self.stdout.write(line)
+
+        missing = sorted(set(baseline.get('cases', {})) - set(run['cases']))
+        if missing:
+            self.stdout.write(f'Not run: {", ".join(missing)}')
+        if failed:
+            raise CommandError(f'{len(failed)} case(s) regressed: {", ".join(failed)}')
@@ -0,0 +1,76 @@
+import io
+import itertools
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import parsers, renderers
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from jobs.models import Job
+from jobs.serializers import JobSerializer
+from jobs.views import job_analytics
+from paragon_jms import parsers as fast_parsers
+from paragon_jms import renderers as fast_renderers
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's stdlib JSON renderer/parser with the project's on job list and analytics payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=500,
+                            help='Jobs in the large list payload (existing jobs are repeated if there are fewer)')
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if fast_renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed: both sides use the stdlib'))
+
+        payloads = self._payloads(options['jobs'])
+        self.stdout.write(f'{"payload":<20} {"bytes":>9}  {"render std":>11} {"fast":>9}  '
+                          f'{"parse std":>11} {"fast":>9}  identical')
+        for name, data in payloads:
+            self._compare(name, data, options['iterations'])
+
+    def _payloads(self, count):
+        queryset = Job.objects.select_related('product_type', 'paper_type', 'paper_weight', 'paper_size')
+        jobs = list(queryset.order_by('-created_at')[:count])
+        if not jobs:
+            raise CommandError('No jobs to serialize; run seed_data or generate some first')
+        jobs = list(itertools.islice(itertools.cycle(jobs), count))
+        rows = JobSerializer(jobs, many=True).data
+
+        page = {'count': len(rows), 'next': 'https://localhost/api/jobs/?page=2', 'previous': None,
+                'results': rows[:20]}
+
+        superuser = User.objects.filter(role='SUPERUSER').first()
+        if superuser is None:
+            raise CommandError('The analytics payload needs a superuser')
+        request = APIRequestFactory().get('/api/jobs/analytics/')
+        force_authenticate(request, user=superuser)
+        analytics = job_analytics(request).data
+
+        return [('job list page', page), (f'{count} jobs', rows), ('analytics', analytics)]
+
+    def _compare(self, name, data, iterations):
+        std_renderer, fast_renderer = renderers.JSONRenderer(), fast_renderers.JSONRenderer()
+        std_parser, fast_parser = parsers.JSONParser(), fast_parsers.JSONParser()
+
+        # Materialize querysets in the payload so both sides encode the same rows
+        body = std_renderer.render(data)
+        identical = fast_renderer.render(data) == body
+        identical = identical and fast_parser.parse(io.BytesIO(body)) == std_parser.parse(io.BytesIO(body))
+
+        def timed(func):
+            started = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            return f'{(time.perf_counter() - started) * 1e6 / iterations:8.0f}us'
+
+        self.stdout.write(
+            f'{name:<20} {len(body):>9}  '
+            f'{timed(lambda: std_renderer.render(data)):>11} {timed(lambda: fast_renderer.render(data)):>9}  '
+            f'{timed(lambda: std_parser.parse(io.BytesIO(body))):>11} '
+            f'{timed(lambda: fast_parser.parse(io.BytesIO(body))):>9}  '
+            + (self.style.SUCCESS('yes') if identical else self.style.ERROR('NO'))
+        )
@@ -0,0 +1,92 @@
+from collections import Counter
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.authentication import ClaimsRefreshToken
+from users.models import User
+
+MODES = {'cold': '0', 'warm': '1'}
+
+
+class Command(BaseCommand):
+    help = 'Measure import time and time-to-first-response of a fresh worker process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request (repeatable, default /api/jobs/)')
+        parser.add_argument('--email', default='admin@paragon.com',
+                            help='Authenticate requests as this user (empty for anonymous)')
+        parser.add_argument('--mode', choices=['both'] + sorted(MODES), default='both',
+                            help='cold: no warm-up; warm: run the gunicorn warm-up hooks first')
+        parser.add_argument('--top-imports', type=int, default=0,
+                            help='Also list the N slowest imports (python -X importtime)')
+        parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, STARTUP_PROBE_PATHS=','.join(options['paths'] or ['/api/jobs/']))
+        if options['email']:
+            try:
+                user = User.objects.get(email=options['email'])
+            except User.DoesNotExist:
+                raise CommandError(f'No user with email {options["email"]}')
+            env['STARTUP_PROBE_TOKEN'] = str(ClaimsRefreshToken.for_user(user).access_token)
+
+        modes = sorted(MODES) if options['mode'] == 'both' else [options['mode']]
+        results = {mode: [self._probe(env, MODES[mode]) for _ in range(options['runs'])] for mode in modes}
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            for mode, runs in results.items():
+                self._report(mode, runs)
+
+        if options['top_imports']:
+            self._report_imports(env, options['top_imports'])
+
+    def _probe(self, env, warm, extra_args=()):
+        completed = subprocess.run(
+            [sys.executable, *extra_args, '-m', 'monitoring.startup_probe'],
+            cwd=settings.BASE_DIR, env=dict(env, STARTUP_PROBE_WARM=warm),
+            capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f'Probe failed:\n{completed.stderr}')
+        if extra_args:
+            return completed.stderr
+        return json.loads(completed.stdout)
+
+    def _report(self, mode, runs):
+        def median(values):
+            return f'{statistics.median(values):8.1f} ms'
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{mode} ({len(runs)} runs, medians)'))
+        self.stdout.write(f'    import + setup      {median([run["import_ms"] for run in runs])}')
+        if 'warm_up_ms' in runs[0]:
+            self.stdout.write(f'    warm-up             {median([run["warm_up_ms"] for run in runs])}')
+        self.stdout.write(f'    to first response   {median([run["first_response_ms"] for run in runs])}')
+        for index, request in enumerate(runs[0]['requests']):
+            first = median([run['requests'][index]['first_ms'] for run in runs])
+            second = median([run['requests'][index]['second_ms'] for run in runs])
+            self.stdout.write(f'    {request["path"]} [{request["status"]}]  first {first}  second {second}')
+        self.stdout.write('')
+
+    def _report_imports(self, env, top):
+        # -X importtime lines: "import time: self [us] | cumulative | imported package"
+        cumulative = Counter()
+        for line in self._probe(env, '0', ('-X', 'importtime')).splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _self_us, total_us, name = (part.strip() for part in line[len('import time:'):].split('|'))
+            if '.' not in name:
+                cumulative[name] += int(total_us)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Slowest top-level imports (cumulative)'))
+        for name, micros in cumulative.most_common(top):
+            self.stdout.write(f'    {micros / 1000:8.1f} ms  {name}')
@@ -0,0 +1,77 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.slow_queries import read_entries
+
+ORDERINGS = {
+    'total': lambda stats: stats['total'],
+    'count': lambda stats: stats['count'],
+    'mean': lambda stats: stats['total'] / stats['count'],
+    'max': lambda stats: stats['max'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Summarize the slow-query log by SQL fingerprint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=None, help='Log file (defaults to SLOW_QUERY_LOG_FILE)')
+        parser.add_argument('--top', type=int, default=10, help='Number of fingerprints to show')
+        parser.add_argument('--order-by', choices=sorted(ORDERINGS), default='total')
+        parser.add_argument('--view', help='Only include queries issued by this view (URL name)')
+        parser.add_argument('--since-hours', type=float, help='Only include the last N hours')
+
+    def handle(self, *args, **options):
+        path = options['file'] or settings.SLOW_QUERY_LOG_FILE
+        if not os.path.exists(path):
+            raise CommandError(f'No slow-query log at {path}')
+
+        since = None
+        if options['since_hours'] is not None:
+            since = datetime.now(timezone.utc) - timedelta(hours=options['since_hours'])
+
+        groups = defaultdict(lambda: {
+            'count': 0, 'total': 0.0, 'max': 0.0,
+            'views': Counter(), 'sites': Counter(), 'sql': None,
+        })
+        for entry in read_entries(path):
+            if options['view'] and entry.get('view') != options['view']:
+                continue
+            if since is not None and datetime.fromisoformat(entry['at']) < since:
+                continue
+            stats = groups[entry['fingerprint']]
+            stats['count'] += 1
+            stats['total'] += entry['duration_ms']
+            stats['max'] = max(stats['max'], entry['duration_ms'])
+            stats['views'][entry.get('view') or '-'] += 1
+            stats['sites'][entry.get('call_site') or '-'] += 1
+            if stats['sql'] is None:
+                stats['sql'] = entry.get('sql')
+
+        if not groups:
+            self.stdout.write('No matching queries logged.')
+            return
+
+        grand_total = sum(stats['total'] for stats in groups.values())
+        ranked = sorted(groups.items(), key=lambda item: ORDERINGS[options['order_by']](item[1]), reverse=True)
+
+        self.stdout.write(
+            f'{sum(s["count"] for s in groups.values())} queries, '
+            f'{len(groups)} fingerprints, {grand_total:.1f} ms total\n'
+        )
+        for rank, (shape, stats) in enumerate(ranked[:options['top']], start=1):
+            share = 100.0 * stats['total'] / grand_total if grand_total else 0.0
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'#{rank}  total {stats["total"]:.1f} ms ({share:.1f}%)  '
+                f'count {stats["count"]}  mean {stats["total"] / stats["count"]:.2f} ms  '
+                f'max {stats["max"]:.2f} ms'
+            ))
+            self.stdout.write(f'    {shape[:300]}')
+            views = ', '.join(f'{view} ({count})' for view, count in stats['views'].most_common(3))
+            sites = ', '.join(f'{site} ({count})' for site, count in stats['sites'].most_common(3))
+            self.stdout.write(f'    views: {views}')
+            self.stdout.write(f'    from:  {sites}\n')
@@ -0,0 +1,169 @@
+"""
+Prometheus metrics for API requests.
+
+``MetricsMiddleware`` records, per resolved URL name and status code:
+request latency, database query count and time, time spent building
+serializer ``.data`` and response size.  ``metrics_view`` exposes them in
+the Prometheus text format.
+
+Under gunicorn every worker is a separate process, so when
+``PROMETHEUS_MULTIPROC_DIR`` is set the client library writes samples to
+per-process files in that directory and the endpoint merges them with a
+``MultiProcessCollector`` (see ``gunicorn.conf.py`` for the cleanup hooks).
+"""
+from contextvars import ContextVar
+import hmac
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+)
+from rest_framework import serializers
+
+from .auth import is_superuser_request
+from .middleware import InstrumentationMiddleware
+from .wrappers import observe_queries
+
+LABELS = ('view', 'status')
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUEST_LATENCY = Histogram(
+    'paragon_http_request_duration_seconds',
+    'Request latency by view',
+    LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    'paragon_http_request_db_queries',
+    'Database queries per request',
+    LABELS,
+    buckets=QUERY_BUCKETS,
+)
+DB_TIME = Histogram(
+    'paragon_http_request_db_duration_seconds',
+    'Database time per request',
+    LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+SERIALIZER_TIME = Histogram(
+    'paragon_http_request_serializer_duration_seconds',
+    'Time spent building serializer data per request',
+    LABELS,
+    buckets=LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    'paragon_http_response_size_bytes',
+    'Response body size',
+    LABELS,
+    buckets=SIZE_BUCKETS,
+)
+
+_current = ContextVar('monitoring_request_timer', default=None)
+
+
+class _RequestTimer:
+    """Query count/time (as an execute wrapper) and serializer time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.serializer_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def instrument_serializers():
+    """Time BaseSerializer.data, which every serializer's .data goes through."""
+    original = serializers.BaseSerializer.data
+    if getattr(original.fget, 'instrumented', False):
+        return
+
+    def data(self):
+        timer = _current.get()
+        if timer is None:
+            return original.fget(self)
+        started = time.perf_counter()
+        try:
+            return original.fget(self)
+        finally:
+            timer.serializer_time += time.perf_counter() - started
+
+    data.instrumented = True
+    serializers.BaseSerializer.data = property(data)
+
+
+def _response_size(response):
+    if response.streaming:
+        return None
+    if response.has_header('Content-Length'):
+        return int(response['Content-Length'])
+    return len(response.content)
+
+
+class MetricsMiddleware(InstrumentationMiddleware):
+    """Records per-view latency, DB, serializer and size histograms."""
+
+    def begin(self, request):
+        timer = _RequestTimer()
+        observing = observe_queries(timer)
+        observing.__enter__()
+        return timer, observing, _current.set(timer), time.perf_counter()
+
+    def release(self, state):
+        timer, observing, token, started = state
+        _current.reset(token)
+        observing.__exit__(None, None, None)
+
+    def end(self, request, response, state):
+        timer, observing, token, started = state
+        match = getattr(request, 'resolver_match', None)
+        labels = {
+            'view': (match.url_name or match.view_name) if match else 'unresolved',
+            'status': str(response.status_code),
+        }
+        REQUEST_LATENCY.labels(**labels).observe(time.perf_counter() - started)
+        DB_QUERIES.labels(**labels).observe(timer.count)
+        DB_TIME.labels(**labels).observe(timer.duration)
+        SERIALIZER_TIME.labels(**labels).observe(timer.serializer_time)
+        size = _response_size(response)
+        if size is not None:
+            RESPONSE_SIZE.labels(**labels).observe(size)
+        return response
+
+
+def _authorized(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(header, f'Bearer {token}'):
+        return True
+    # Otherwise fall back to a superuser's API token
+    return is_superuser_request(request)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, protected by METRICS_TOKEN or a superuser JWT."""
+    if not _authorized(request):
+        return HttpResponseForbidden('Forbidden')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
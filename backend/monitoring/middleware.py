@@ -0,0 +1,47 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+
+class InstrumentationMiddleware:
+    """
+    Base for middleware that works unchanged under WSGI and ASGI.
+
+    Subclasses implement ``begin(request)`` (returns per-request state),
+    ``release(state)`` (always runs, e.g. to reset context variables) and
+    ``end(request, response, state)``.  None of them may touch the database
+    directly, so the async path never needs a thread hop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        state = self.begin(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.release(state)
+        return self.end(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.begin(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.release(state)
+        return self.end(request, response, state)
+
+    def begin(self, request):
+        return None
+
+    def release(self, state):
+        pass
+
+    def end(self, request, response, state):
+        return response
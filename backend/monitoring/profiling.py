@@ -0,0 +1,266 @@
+"""
+On-demand request profiling for superusers.
+
+A superuser adds ``X-Profile: 1`` (or ``?_profile=1``) to any request.
+The request then runs under ``cProfile`` while a background thread samples
+its stack for a flamegraph, and every query is recorded.  The response is
+returned unchanged apart from an ``X-Profile-Id`` header.  Artifacts are
+written to ``PROFILE_DIR``:
+
+    <id>.json       summary: wall time, hot functions, SQL time and shapes
+    <id>.pstats     cProfile dump, for snakeviz / pstats
+    <id>.collapsed  folded stacks, for flamegraph.pl / speedscope
+
+They can be downloaded from ``/api/monitoring/profiles/``.  After each
+save the oldest profiles beyond ``PROFILE_MAX_FILES``, or older than
+``PROFILE_MAX_AGE_DAYS``, are deleted.  Requests without the flag pay for
+one header and one query-string lookup.
+
+Under ASGI a flagged request is profiled from a worker thread that drives
+the rest of the chain with ``async_to_sync``; sync views and every ORM
+call made through ``sync_to_async`` run on that thread and are profiled,
+while the coroutine code of async views runs on the event loop and only
+shows up through its queries.
+"""
+from collections import Counter
+import cProfile
+from datetime import datetime, timezone
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from .auth import is_superuser_request
+from .query_budget import QueryRecorder
+
+HEADER = 'HTTP_X_PROFILE'
+QUERY_FLAG = '_profile'
+ARTIFACT_KINDS = {'pstats': '.pstats', 'collapsed': '.collapsed', 'summary': '.json'}
+PROFILE_ID = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+_PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+
+
+def profile_dir():
+    path = getattr(settings, 'PROFILE_DIR', str(settings.BASE_DIR / 'profiles'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def artifact_path(profile_id, kind):
+    if not PROFILE_ID.match(profile_id) or kind not in ARTIFACT_KINDS:
+        return None
+    return os.path.join(profile_dir(), profile_id + ARTIFACT_KINDS[kind])
+
+
+def _label(filename, line, name):
+    if filename.startswith(_PROJECT_ROOT):
+        filename = filename[len(_PROJECT_ROOT):]
+    else:
+        filename = os.path.basename(filename)
+    return f'{name} ({filename}:{line})'
+
+
+def _frame_label(code):
+    return _label(code.co_filename, code.co_firstlineno, code.co_name)
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed interval into folded stacks."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _hot_functions(stats, sort_key, limit):
+    rows = []
+    stats.sort_stats(sort_key)
+    for func in stats.fcn_list[:limit]:
+        calls, primitive, tottime, cumtime, _ = stats.stats[func]
+        rows.append({
+            'function': _label(*func),
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    return rows
+
+
+def _sql_summary(recorder, limit):
+    shapes = {}
+    for query in recorder.queries:
+        shape = shapes.setdefault(query['fingerprint'], {'count': 0, 'total': 0.0, 'sites': Counter()})
+        shape['count'] += 1
+        shape['total'] += query['duration']
+        shape['sites'][query['call_site']] += 1
+    ranked = sorted(shapes.items(), key=lambda item: item[1]['total'], reverse=True)
+    return {
+        'queries': recorder.count,
+        'time_ms': round(recorder.duration * 1000, 3),
+        'top': [
+            {
+                'fingerprint': shape[:500],
+                'count': data['count'],
+                'total_ms': round(data['total'] * 1000, 3),
+                'call_sites': [site for site, _ in data['sites'].most_common(3)],
+            }
+            for shape, data in ranked[:limit]
+        ],
+    }
+
+
+def _wants_profile(request):
+    return request.META.get(HEADER) == '1' or request.GET.get(QUERY_FLAG) == '1'
+
+
+class ProfilingMiddleware:
+    """Profiles flagged requests from superusers and stores the artifacts."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not _wants_profile(request):
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not _wants_profile(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.profile)(request, async_to_sync(self.get_response))
+
+    def profile(self, request, get_response):
+        if not is_superuser_request(request):
+            return get_response(request)
+
+        interval = getattr(settings, 'PROFILE_SAMPLE_INTERVAL_MS', 1) / 1000.0
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), interval)
+        recorder = QueryRecorder()
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            with recorder.record():
+                profiler.enable()
+                try:
+                    response = get_response(request)
+                finally:
+                    profiler.disable()
+        finally:
+            sampler.stop()
+        wall = time.perf_counter() - started
+
+        profile_id = f'{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}'
+        self.save(profile_id, request, response, wall, profiler, sampler, recorder)
+        prune_profiles()
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def save(self, profile_id, request, response, wall, profiler, sampler, recorder):
+        limit = getattr(settings, 'PROFILE_TOP_FUNCTIONS', 25)
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        stats.dump_stats(artifact_path(profile_id, 'pstats'))
+
+        with open(artifact_path(profile_id, 'collapsed'), 'w', encoding='utf-8') as handle:
+            handle.write(sampler.collapsed())
+
+        match = getattr(request, 'resolver_match', None)
+        summary = {
+            'id': profile_id,
+            'at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': (match.url_name or match.view_name) if match else None,
+            'status': response.status_code,
+            'wall_ms': round(wall * 1000, 3),
+            'samples': sum(sampler.stacks.values()),
+            'sql': _sql_summary(recorder, limit),
+            'by_cumulative': _hot_functions(stats, 'cumulative', limit),
+            'by_own_time': _hot_functions(stats, 'tottime', limit),
+        }
+        with open(artifact_path(profile_id, 'summary'), 'w', encoding='utf-8') as handle:
+            json.dump(summary, handle, indent=2)
+        return summary
+
+
+def _stored_ids(directory):
+    """Ids of the stored profiles, newest first (ids start with their UTC time)."""
+    ids = [name[:-5] for name in os.listdir(directory) if name.endswith('.json') and PROFILE_ID.match(name[:-5])]
+
+    def saved_at(profile_id):
+        try:
+            return profile_id[:15], os.stat(os.path.join(directory, profile_id + '.json')).st_mtime_ns
+        except FileNotFoundError:
+            return profile_id[:15], 0
+
+    return sorted(ids, key=saved_at, reverse=True)
+
+
+def prune_profiles():
+    """Delete profiles beyond ``PROFILE_MAX_FILES`` or older than ``PROFILE_MAX_AGE_DAYS``."""
+    directory = profile_dir()
+    max_files = getattr(settings, 'PROFILE_MAX_FILES', 50)
+    cutoff = datetime.now(timezone.utc).timestamp() - getattr(settings, 'PROFILE_MAX_AGE_DAYS', 7) * 86400
+    for position, profile_id in enumerate(_stored_ids(directory)):
+        taken = datetime.strptime(profile_id[:15], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+        if position < max_files and taken.timestamp() >= cutoff:
+            continue
+        for suffix in ARTIFACT_KINDS.values():
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles():
+    """Summaries of stored profiles, newest first (without the function tables)."""
+    directory = profile_dir()
+    profiles = []
+    for profile_id in _stored_ids(directory):
+        with open(os.path.join(directory, profile_id + '.json'), encoding='utf-8') as handle:
+            summary = json.load(handle)
+        profiles.append({
+            key: summary.get(key)
+            for key in ('id', 'at', 'method', 'path', 'view', 'status', 'wall_ms')
+        } | {'sql_ms': summary['sql']['time_ms'], 'queries': summary['sql']['queries']})
+    return profiles
@@ -0,0 +1,246 @@
+"""
+Per-view query budgets and N+1 detection.
+
+Views declare how many queries a request may issue, either with the
+``query_budget`` decorator / class attribute or through
+``settings.QUERY_BUDGETS`` keyed by URL name.  ``QueryRecorder`` counts the
+queries a block of code runs and groups them by SQL fingerprint and call
+site, so repeated identical shapes (N+1 patterns) can be reported with
+the line that issued them.
+
+A budget applies to each database separately, so a view that gathers
+from every job shard (``paragon_jms.sharding``) may run its budget on each.
+
+``QueryBudgetMiddleware`` applies this to every request when
+``QUERY_BUDGET_ENABLED`` is on (the default), logging violations or raising
+when ``QUERY_BUDGET_RAISE`` is on.  Finding a call site walks the stack, so
+unless ``QUERY_BUDGET_CALL_SITES`` is on (by default only with ``DEBUG``)
+a request's queries are only counted until its view's budget is exceeded,
+and only the queries past the budget are attributed and checked for N+1s.
+``assert_max_queries`` gives tests the same checks, and
+``monitoring.testing`` holds the hot views to their budgets in each app's
+tests.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .middleware import InstrumentationMiddleware
+from .sql import call_site, fingerprint
+from .wrappers import observe_queries
+
+logger = logging.getLogger(__name__)
+_unbudgeted = ContextVar('monitoring_unbudgeted', default=0)
+# Not queries, and issued differently by each backend (BEGIN on SQLite
+# only) and inside test cases (savepoints), so budgets leave them out
+TRANSACTION_CONTROL = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when a request or test block breaks its query budget."""
+
+
+@contextmanager
+def unbudgeted():
+    """
+    Exclude the queries in this block from budgets, e.g. when a request
+    happens to rebuild a process-wide cache.
+    """
+    token = _unbudgeted.set(_unbudgeted.get() + 1)
+    try:
+        yield
+    finally:
+        _unbudgeted.reset(token)
+
+
+def query_budget(max_queries):
+    """Declare the query budget of a function-based view."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def budget_alias(alias):
+    """
+    The database whose budget queries on ``alias`` count against.  A job
+    shard has its own; a test mirror (the read replica) shares its primary's.
+    """
+    test_settings = settings.DATABASES.get(alias, {}).get('TEST', {})
+    return test_settings.get('MIRROR') or alias
+
+
+class QueryRecorder:
+    """
+    Records queries on every database connection while active.
+
+    With ``call_sites`` off, queries are only counted (with their SQL) until
+    their database has run more than ``budget`` (a number, or a callable
+    returning one or None while it is not known yet); the queries after
+    that are fingerprinted and attributed to their call sites as well.
+    """
+
+    def __init__(self, call_sites=True, budget=None):
+        self.queries = []
+        self.call_sites = call_sites
+        self.budget = budget
+        self.counts = Counter()
+
+    def _past_budget(self, alias):
+        if callable(self.budget):
+            budget = self.budget()
+            if budget is None:
+                return False
+            self.budget = budget
+        return self.budget is not None and self.counts[alias] > self.budget
+
+    def __call__(self, execute, sql, params, many, context):
+        if _unbudgeted.get() or sql.startswith(TRANSACTION_CONTROL):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            alias = context['connection'].alias
+            query = {
+                'sql': sql,
+                'duration': time.perf_counter() - started,
+                'alias': alias,
+                'call_site': None,
+            }
+            self.counts[budget_alias(alias)] += 1
+            if self.call_sites or self._past_budget(budget_alias(alias)):
+                query['fingerprint'] = fingerprint(sql)
+                query['call_site'] = call_site(skip=2)
+            self.queries.append(query)
+
+    def record(self):
+        return observe_queries(self)
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query['duration'] for query in self.queries)
+
+    def by_database(self):
+        """Queries grouped by the database a budget applies to (``budget_alias()``)."""
+        groups = {}
+        for query in self.queries:
+            groups.setdefault(budget_alias(query['alias']), []).append(query)
+        return groups
+
+    def repeated(self, threshold=None):
+        """
+        Return [(fingerprint, call_site, count)] for shapes issued at least
+        ``threshold`` times from the same place on one database (the same
+        query sent once to each shard is not an N+1).  Only queries with a
+        call site count.
+        """
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 3)
+        shapes = Counter()
+        for queries in self.by_database().values():
+            per_database = Counter(
+                (query['fingerprint'], query['call_site']) for query in queries if query['call_site']
+            )
+            for shape, count in per_database.items():
+                shapes[shape] = max(shapes[shape], count)
+        return [
+            (shape, site, count)
+            for (shape, site), count in shapes.most_common()
+            if count >= threshold
+        ]
+
+    def violations(self, budget=None, threshold=None):
+        """Human-readable list of budget and N+1 problems."""
+        problems = []
+        if budget is not None:
+            for alias, queries in self.by_database().items():
+                if len(queries) <= budget:
+                    continue
+                sites = Counter(query['call_site'] for query in queries if query['call_site']).most_common(3)
+                top = ', '.join(f'{site} ({count})' for site, count in sites) or 'not recorded'
+                where = f' on {alias}' if alias != DEFAULT_DB_ALIAS else ''
+                problems.append(f'{len(queries)} queries{where}, budget is {budget}; top call sites: {top}')
+        for shape, site, count in self.repeated(threshold):
+            problems.append(f'N+1: {count}x at {site}: {shape[:200]}')
+        return problems
+
+
+def budget_for(view_func, url_name):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if url_name in budgets:
+        return budgets[url_name]
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        budget = getattr(view_class, 'query_budget', None)
+    return budget
+
+
+def request_budget(request):
+    """The budget of the view a request resolved to, or None."""
+    match = getattr(request, 'resolver_match', None)
+    return budget_for(match.func, match.url_name) if match else None
+
+
+@contextmanager
+def assert_max_queries(budget=None, threshold=None):
+    """
+    Test helper: fail if the block runs more than ``budget`` queries or
+    repeats the same query shape from one call site ``threshold`` times.
+
+        with assert_max_queries(5):
+            client.get('/api/jobs/')
+    """
+    recorder = QueryRecorder()
+    with recorder.record():
+        yield recorder
+    problems = recorder.violations(budget, threshold)
+    if problems:
+        raise QueryBudgetExceeded('\n'.join(problems))
+
+
+class QueryBudgetMiddleware(InstrumentationMiddleware):
+    """Checks every request against its view's query budget."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'QUERY_BUDGET_ENABLED', True)
+        self.call_sites = getattr(settings, 'QUERY_BUDGET_CALL_SITES', settings.DEBUG)
+
+    def begin(self, request):
+        if not self.enabled:
+            return None
+        # The view, and so its budget, is known once the URL is resolved
+        recorder = QueryRecorder(call_sites=self.call_sites, budget=lambda: request_budget(request))
+        recording = recorder.record()
+        recording.__enter__()
+        return recorder, recording
+
+    def release(self, state):
+        if state is not None:
+            state[1].__exit__(None, None, None)
+
+    def end(self, request, response, state):
+        if state is None:
+            return response
+
+        recorder = state[0]
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match else None
+        problems = recorder.violations(request_budget(request))
+        if problems:
+            message = f'{request.method} {request.path} [{url_name}]: ' + '; '.join(problems)
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,112 @@
+"""
+Opt-in slow-query log.
+
+When ``SLOW_QUERY_LOG_ENABLED`` is on, every database connection gets an
+execute wrapper that times each query and appends the ones slower than
+``SLOW_QUERY_THRESHOLD_MS`` to ``SLOW_QUERY_LOG_FILE`` as JSON lines: SQL
+fingerprint, duration, the view serving the request (if any) and the
+project frame that issued the query.  ``manage.py slow_queries``
+summarizes the file by fingerprint.
+
+Setting the threshold to 0 logs every query, which is the way to find out
+which query shapes dominate total database time rather than just the
+occasional slow one.
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .middleware import InstrumentationMiddleware
+from .sql import call_site, fingerprint
+
+_request = ContextVar('monitoring_slow_query_request', default=None)
+_write_lock = threading.Lock()
+
+SQL_MAX_LENGTH = 2000
+
+
+def _current_view():
+    request = _request.get()
+    if request is None:
+        return None
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f'{request.method} {request.path}'
+    return match.url_name or match.view_name
+
+
+def write_entry(entry, path=None):
+    path = path or settings.SLOW_QUERY_LOG_FILE
+    line = json.dumps(entry, separators=(',', ':')) + '\n'
+    # A single O_APPEND write per entry keeps lines intact across workers
+    with _write_lock:
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+
+class SlowQueryLogger:
+    """execute_wrapper that logs queries slower than the threshold."""
+
+    def __init__(self, threshold_ms=None, path=None):
+        if threshold_ms is None:
+            threshold_ms = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100)
+        self.threshold = threshold_ms / 1000.0
+        self.path = path
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                write_entry({
+                    'at': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+                    'fingerprint': fingerprint(sql),
+                    'sql': sql[:SQL_MAX_LENGTH],
+                    'duration_ms': round(duration * 1000, 3),
+                    'view': _current_view(),
+                    'call_site': call_site(skip=2),
+                    'alias': context['connection'].alias,
+                    'many': many,
+                }, self.path)
+
+
+_logger = None
+
+
+def install(sender=None, connection=None, **kwargs):
+    """connection_created receiver: attach the logger once per connection."""
+    global _logger
+    if _logger is None:
+        _logger = SlowQueryLogger()
+    if _logger not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_logger)
+
+
+class SlowQueryMiddleware(InstrumentationMiddleware):
+    """Lets the slow-query log attribute queries to the view being served."""
+
+    def begin(self, request):
+        return _request.set(request)
+
+    def release(self, token):
+        _request.reset(token)
+
+
+def read_entries(path):
+    """Yield logged entries, skipping lines that fail to parse."""
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
@@ -0,0 +1,69 @@
+"""
+SQL helpers shared by the query instrumentation: fingerprinting and
+call-site attribution.
+"""
+import os
+import re
+import sys
+
+from django.conf import settings
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+_PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+_SKIP = (
+    os.path.join(_PROJECT_ROOT, 'monitoring') + os.sep,
+    # Shard scatter-gather helpers: report the code that gathered instead
+    os.path.join(_PROJECT_ROOT, 'paragon_jms', 'sharding.py'),
+    os.sep + 'site-packages' + os.sep,
+    os.sep + 'dist-packages' + os.sep,
+)
+
+
+def fingerprint(sql):
+    """
+    Normalize SQL so that queries differing only in literals or IN-list
+    length share a fingerprint.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def _serializer_field(frame):
+    # DRF resolves declarative fields (source='assigned_by.full_name') in
+    # Field.get_attribute, so no project frame is on the stack for them
+    if frame.f_code.co_name != 'get_attribute':
+        return None
+    field = frame.f_locals.get('self')
+    parent = getattr(field, 'parent', None)
+    if parent is None or not hasattr(field, 'field_name'):
+        return None
+    if getattr(parent, 'many', False):
+        parent = getattr(parent, 'child', parent)
+    serializer = type(parent)
+    return f'{serializer.__module__}.{serializer.__name__}.{field.field_name}'
+
+
+def call_site(skip=1):
+    """
+    Return "path:line in function" for the innermost project frame that
+    issued the current query, ignoring Django/DRF and this package.  Queries
+    triggered by a serializer field are attributed to that field.
+    """
+    frame = sys._getframe(skip)
+    while frame is not None:
+        field = _serializer_field(frame)
+        if field:
+            return field
+        filename = frame.f_code.co_filename
+        if filename.startswith(_PROJECT_ROOT) and not any(part in filename for part in _SKIP):
+            relative = filename[len(_PROJECT_ROOT):]
+            return f'{relative}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
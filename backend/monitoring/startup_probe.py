@@ -0,0 +1,70 @@
+"""
+Child process for ``manage.py benchmark_startup``.
+
+Run as ``python -m monitoring.startup_probe`` from the backend directory.
+It loads the WSGI application the way a gunicorn worker does, optionally
+runs the warm-up hooks, then calls the application directly for each path
+in ``STARTUP_PROBE_PATHS`` and prints the timings as one JSON object.
+"""
+import time
+
+_started = time.perf_counter()
+
+import json  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+from wsgiref.util import setup_testing_defaults  # noqa: E402
+
+
+def _ms(since):
+    return round((time.perf_counter() - since) * 1000, 2)
+
+
+def _call(application, path, host, token):
+    environ = {'PATH_INFO': path, 'HTTP_HOST': host, 'wsgi.url_scheme': 'https'}
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    setup_testing_defaults(environ)
+    status = []
+
+    def start_response(line, headers, exc_info=None):
+        status.append(int(line.split()[0]))
+
+    started = time.perf_counter()
+    result = application(environ, start_response)
+    try:
+        for _chunk in result:
+            pass
+    finally:
+        getattr(result, 'close', lambda: None)()
+    return _ms(started), status[0]
+
+
+def main():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paragon_jms.settings')
+    from paragon_jms.wsgi import application
+    from django.conf import settings
+
+    timings = {'import_ms': _ms(_started)}
+    if os.environ.get('STARTUP_PROBE_WARM') == '1':
+        from paragon_jms.warmup import warm_up_app, warm_up_worker
+        started = time.perf_counter()
+        warm_up_app()
+        warm_up_worker()
+        timings['warm_up_ms'] = _ms(started)
+
+    host = next((h for h in settings.ALLOWED_HOSTS if '*' not in h and not h.startswith('.')), 'localhost')
+    token = os.environ.get('STARTUP_PROBE_TOKEN')
+    requests = []
+    for path in os.environ.get('STARTUP_PROBE_PATHS', '/api/jobs/').split(','):
+        first, status = _call(application, path, host, token)
+        timings.setdefault('first_response_ms', _ms(_started))
+        second, _status = _call(application, path, host, token)
+        requests.append({'path': path, 'status': status, 'first_ms': first, 'second_ms': second})
+    timings['requests'] = requests
+
+    json.dump(timings, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
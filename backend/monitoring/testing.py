@@ -0,0 +1,70 @@
+"""
+Test helpers that hold views to their declared query budgets.
+
+``QueryBudgetTestCase`` seeds the test database with ``seed_data`` and
+``assertWithinBudget()`` requests a URL as a user of a given role inside
+``assert_max_queries``, with the budget the URL's view declares (see
+``monitoring.query_budget``).  A view that grows a query, or an N+1, then
+fails its app's tests.  Every database is available to the tests, so they
+also run with job shards.  ``ShardedTestCase`` spreads the seed jobs over
+the suite's ``north`` and ``south`` shards.
+"""
+import io
+import json
+
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import resolve
+
+from users.authentication import ClaimsRefreshToken
+from users.models import User
+from .query_budget import assert_max_queries, budget_for
+
+
+# Production settings (DEBUG off) would redirect every test request to HTTPS
+@override_settings(SECURE_SSL_REDIRECT=False)
+class QueryBudgetTestCase(TestCase):
+    # Job shards (JOB_SHARD_URLS, or the test suite's own) are read and written too
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('seed_data', stdout=io.StringIO())
+
+    def client_for(self, role):
+        user = User.objects.filter(role=role, approved=True).order_by('date_joined').first()
+        token = ClaimsRefreshToken.for_user(user).access_token
+        return Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def assertWithinBudget(self, path, role='SUPERUSER', method='GET', data=None, status=200, client=None):
+        """Request ``path`` and fail if it breaks its view's budget; returns the response."""
+        match = resolve(path.split('?', 1)[0])
+        budget = budget_for(match.func, match.url_name)
+        self.assertIsNotNone(budget, f'{match.url_name} declares no query budget')
+
+        if client is None:
+            client = Client() if role is None else self.client_for(role)
+        kwargs = {}
+        if data is not None:
+            kwargs = {'data': json.dumps(data), 'content_type': 'application/json'}
+        with assert_max_queries(budget):
+            response = client.generic(method, path, **kwargs)
+        self.assertEqual(response.status_code, status, response.content[:300])
+        return response
+
+
+@override_settings(
+    JOB_SHARDS=['default', 'north', 'south'],
+    JOB_SHARD_BRANCHES={'BORROWDALE': 'north', 'PADDINGTON': 'south'},
+    JOB_SHARD_STRIDE=10,
+    DATABASE_ROUTERS=['paragon_jms.sharding.ShardRouter'],
+)
+class ShardedTestCase(QueryBudgetTestCase):
+    """The seed jobs spread over two shards, as ``sync_shards --move-jobs`` leaves them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Copy the migrations' reference rows first, so the seed's are copied by key
+        call_command('sync_shards', stdout=io.StringIO())
+        super().setUpTestData()
+        call_command('sync_shards', '--move-jobs', stdout=io.StringIO())
@@ -0,0 +1,75 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.models import User
+from .query_budget import QueryRecorder
+from .testing import QueryBudgetTestCase
+
+
+class QueryRecorderTests(TestCase):
+
+    def run_queries(self, recorder, count):
+        with recorder.record():
+            for _ in range(count):
+                list(User.objects.filter(role='CLERK'))
+
+    def test_call_sites_only_past_the_budget(self):
+        recorder = QueryRecorder(call_sites=False, budget=lambda: 2)
+        self.run_queries(recorder, 5)
+        self.assertEqual(recorder.count, 5)
+        self.assertEqual([query['call_site'] is not None for query in recorder.queries], [False] * 2 + [True] * 3)
+        # The three named repeats are an N+1
+        problems = recorder.violations(2)
+        self.assertEqual(len(problems), 2)
+        self.assertTrue(problems[0].startswith('5 queries, budget is 2; top call sites: '))
+        self.assertNotIn('not recorded', problems[0])
+        self.assertTrue(problems[1].startswith('N+1: 3x at '))
+
+    def test_unknown_budget_only_counts(self):
+        recorder = QueryRecorder(call_sites=False, budget=lambda: None)
+        self.run_queries(recorder, 5)
+        self.assertEqual(recorder.count, 5)
+        self.assertTrue(all(query['call_site'] is None for query in recorder.queries))
+        self.assertEqual(recorder.violations(), [])
+
+    def test_call_sites(self):
+        recorder = QueryRecorder()
+        self.run_queries(recorder, 3)
+        self.assertTrue(all(query['call_site'] for query in recorder.queries))
+        self.assertEqual(len(recorder.violations()), 1)
+
+
+@override_settings(QUERY_BUDGETS={'all_users': 0}, QUERY_BUDGET_RAISE=False)
+class QueryBudgetMiddlewareTests(QueryBudgetTestCase):
+
+    def test_logs_violations_without_call_sites(self):
+        client = self.client_for('SUPERUSER')
+        with self.settings(QUERY_BUDGET_CALL_SITES=False), self.assertLogs('monitoring.query_budget', 'WARNING') as logs:
+            client.get(reverse('all_users'))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('[all_users]', logs.output[0])
+        self.assertIn('budget is 0; top call sites:', logs.output[0])
+
+
+class ProfilingTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = self.settings(PROFILE_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_profiles_flagged_superuser_requests_only(self):
+        path = reverse('all_users')
+        self.assertNotIn('X-Profile-Id', self.client_for('SUPERUSER').get(path))
+        self.assertNotIn('X-Profile-Id', self.client_for('CLERK').get(path, HTTP_X_PROFILE='1'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+        response = self.client_for('SUPERUSER').get(path, HTTP_X_PROFILE='1')
+        profile_id = response['X-Profile-Id']
+        self.assertTrue(any(name.startswith(profile_id) for name in os.listdir(self.directory)))
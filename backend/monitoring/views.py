@@ -0,0 +1,58 @@
+import json
+import os
+
+from django.http import FileResponse, Http404
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .profiling import artifact_path, list_profiles
+from .query_budget import query_budget
+
+
+def _permission_denied():
+    return Response(
+        {'error': 'Permission denied'},
+        status=status.HTTP_403_FORBIDDEN
+    )
+
+
+@query_budget(0)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def profile_list(request):
+    if request.user.role != 'SUPERUSER':
+        return _permission_denied()
+    return Response(list_profiles())
+
+
+@query_budget(0)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def profile_detail(request, profile_id):
+    if request.user.role != 'SUPERUSER':
+        return _permission_denied()
+
+    path = artifact_path(profile_id, 'summary')
+    if path is None or not os.path.exists(path):
+        raise Http404
+    with open(path, encoding='utf-8') as handle:
+        return Response(json.load(handle))
+
+
+@query_budget(0)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def profile_download(request, profile_id, kind):
+    if request.user.role != 'SUPERUSER':
+        return _permission_denied()
+
+    path = artifact_path(profile_id, kind)
+    if path is None or not os.path.exists(path):
+        raise Http404
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=os.path.basename(path),
+        content_type='application/octet-stream',
+    )
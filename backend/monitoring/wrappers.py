@@ -0,0 +1,54 @@
+"""
+Context-scoped database execute wrappers.
+
+``connection.execute_wrapper()`` attaches a wrapper to the connection of
+the current thread only.  Under ASGI an async view's queries run on a
+worker thread (via ``sync_to_async``), not on the event-loop thread where
+middleware runs, so wrappers installed by middleware would never see
+them.
+
+Instead every connection gets one permanent ``QueryDispatcher`` when it
+is created, and code that wants to observe queries registers its wrapper
+in a context variable with ``observe_queries()``.  Context variables follow
+a request into ``sync_to_async`` threads, so the same recorders work for
+sync views, async views and plain code alike.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import functools
+
+from django.db import connections
+
+_active = ContextVar('monitoring_query_wrappers', default=())
+
+
+class QueryDispatcher:
+    """Runs a query through the wrappers active in the current context."""
+
+    def __call__(self, execute, sql, params, many, context):
+        wrappers = _active.get()
+        for wrapper in reversed(wrappers):
+            execute = functools.partial(wrapper, execute)
+        return execute(sql, params, many, context)
+
+
+dispatcher = QueryDispatcher()
+
+
+def install(sender=None, connection=None, **kwargs):
+    """connection_created receiver: attach the dispatcher once per connection."""
+    if dispatcher not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, dispatcher)
+
+
+@contextmanager
+def observe_queries(wrapper):
+    """Pass every query run in this context through ``wrapper``."""
+    # Connections opened before the signal was connected (e.g. in tests)
+    for connection in connections.all(initialized_only=True):
+        install(connection=connection)
+    token = _active.set(_active.get() + (wrapper,))
+    try:
+        yield wrapper
+    finally:
+        _active.reset(token)
@@ -0,0 +1,11 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'paragon_jms.settings')
+# Async requests run their ORM calls on short-lived per-request threads, so
+# persistent connections would never be reused; use a pooler (PgBouncer)
+# instead and let Django close connections after each request.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+# Serve the read endpoints with their async views (see async_api.server_view)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+application = get_asgi_application()
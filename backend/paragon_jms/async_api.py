@@ -0,0 +1,164 @@
+"""
+Async counterparts of DRF's ``@api_view`` plumbing.
+
+DRF 3.14 views are synchronous, so under ASGI every DRF request holds a
+worker thread for its whole duration.  ``async_api_view`` lets read-only
+endpoints be written as ``async def`` views that use Django's async ORM
+while keeping DRF's behaviour: the configured authentication classes,
+the same error responses (through DRF's exception handler), and
+responses rendered by the project's ``JSONRenderer`` (so the bytes match
+the sync version).
+
+Under WSGI an async view would run through ``async_to_sync`` and gain
+nothing, so each async view has a sync twin and ``server_view()`` routes
+a URL to the one that suits the server (``settings.ASYNC_VIEWS``, which
+``asgi.py`` turns on).
+"""
+import functools
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .renderers import JSONRenderer
+
+
+def _handle_exception(exc, request, args, kwargs):
+    """What ``APIView.handle_exception()`` does, for exceptions of any type."""
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        header = request.authenticators and request.authenticators[0].authenticate_header(request)
+        if header:
+            exc.auth_header = header
+        else:
+            exc.status_code = status.HTTP_403_FORBIDDEN
+
+    context = {'view': None, 'args': args, 'kwargs': kwargs, 'request': request}
+    response = api_settings.EXCEPTION_HANDLER(exc, context)
+    if response is None:
+        # Not an API error: let Django turn it into a 500
+        raise exc
+    response.exception = True
+    return response
+
+
+def _authenticate(request):
+    # Runs on a worker thread: session and token lookups may hit the database
+    return request.user
+
+
+def async_api_view(http_method_names=('GET',)):
+    """
+    Decorate an ``async def view(request, ...)`` that returns a DRF
+    ``Response``.  Requests must be authenticated, as with the project's
+    default ``IsAuthenticated`` permission.
+    """
+    allowed = [method.upper() for method in http_method_names]
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(django_request, *args, **kwargs):
+            request = Request(
+                django_request,
+                authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+            )
+            try:
+                if request.method not in allowed:
+                    raise exceptions.MethodNotAllowed(request.method)
+                user = await sync_to_async(_authenticate)(request)
+                if not (user and user.is_authenticated):
+                    raise exceptions.NotAuthenticated()
+                response = await view(request, *args, **kwargs)
+            except Exception as exc:
+                response = _handle_exception(exc, request, args, kwargs)
+
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+            response.renderer_context = {'request': request, 'response': response, 'view': None}
+            response['Allow'] = ', '.join(allowed + ['OPTIONS'])
+            patch_vary_headers(response, ['Accept'])
+            return response
+
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def server_view(sync_view, async_view):
+    """
+    The view to route a URL to: ``async_view`` when the app is served
+    under ASGI (``settings.ASYNC_VIEWS``), else its sync twin.
+    """
+    return async_view if getattr(settings, 'ASYNC_VIEWS', False) else sync_view
+
+
+async def paginated(request, queryset, serializer_class):
+    """
+    List response shaped exactly like a DRF ``ListAPIView``: ordering from
+    ``?ordering=``, the default pagination class and the serializer's data.
+    The count and the requested page are read with the async ORM (a
+    ``COUNT`` and one ``LIMIT``/``OFFSET`` query); the rest is pure Python.
+    """
+    view = _ListContext(serializer_class)
+    for backend in api_settings.DEFAULT_FILTER_BACKENDS:
+        # Without declared fields only OrderingFilter changes anything,
+        # and filter_queryset is lazy, so no query runs here
+        queryset = backend().filter_queryset(request, queryset, view)
+
+    paginator_class = api_settings.DEFAULT_PAGINATION_CLASS
+    if paginator_class is None:
+        return serializer_class([obj async for obj in queryset], many=True).data
+
+    paginator = paginator_class()
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return serializer_class([obj async for obj in queryset], many=True).data
+
+    count = await queryset.acount()
+    page_number = request.query_params.get(paginator.page_query_param) or 1
+    if page_number in paginator.last_page_strings:
+        page_number = max(math.ceil(count / page_size), 1)
+    try:
+        offset = (int(page_number) - 1) * page_size
+    except (TypeError, ValueError):
+        # The paginator raises NotFound before it reads any rows
+        offset, rows = 0, []
+    else:
+        rows = [obj async for obj in queryset[offset:offset + page_size]] if offset >= 0 else []
+
+    page = paginator.paginate_queryset(_FetchedPage(count, offset, rows), request, view=view)
+    data = serializer_class(page, many=True).data
+    return paginator.get_paginated_response(data).data
+
+
+class _FetchedPage:
+    """
+    Stands in for a queryset whose count and requested page were already
+    read, so DRF's ``PageNumberPagination`` can validate the page number
+    and build the response without querying.
+    """
+
+    def __init__(self, count, offset, rows):
+        self._count = count
+        self._offset = offset
+        self._rows = rows
+
+    def count(self):
+        return self._count
+
+    def __getitem__(self, key):
+        return self._rows[key.start - self._offset:key.stop - self._offset]
+
+
+class _ListContext:
+    """The bits of a GenericAPIView that filter backends and paginators read."""
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    def get_serializer_class(self):
+        return self.serializer_class
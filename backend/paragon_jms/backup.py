@@ -0,0 +1,409 @@
+"""
+Streaming backups of the database.
+
+A backup is a directory holding ``manifest.json`` and one gzipped JSON-lines
+file per model.  Each line is one row, a JSON array of the values of the
+manifest's ``columns`` (field attnames).  Tables are read in primary-key
+chunks with ``values_list()``, so memory stays flat however big a table
+is, and the manifest records each file's row count and SHA-256.  On
+PostgreSQL the whole backup reads one repeatable-read snapshot.
+
+Incremental backups (``since``): a model with a watermark field (an
+``auto_now`` timestamp such as ``updated_at``, or an entry in
+``APPEND_ONLY``) holds only the rows written since then, plus a second
+file listing every primary key still in the table, so a restore also
+drops deleted rows.  ``QuerySet.update()`` calls must set the watermark
+field themselves to be seen.  Jobs moved onto the database from another
+shard keep their timestamps, so the tables in ``MOVED_WITH_JOB`` also hold
+the rows of every job with a ``JobMove`` since then.  Other models are
+copied whole.  The manifest's
+``watermark``, where the next incremental backup starts, is the time the
+backup started less ``BACKUP_WATERMARK_MARGIN_SECONDS``: a row is stamped
+when it is saved but only visible once its transaction commits, so a
+transaction still open when the backup reads would otherwise be missed by
+both backups.  Rows in the overlap are in both, which is harmless, as an
+incremental restore upserts.
+
+Restoring runs in one transaction.  Rows go in with batched
+``bulk_create()`` and foreign-key checks are deferred to the end, as
+``loaddata`` does, without building serializer objects or saving rows
+one by one.  A full backup replaces the contents of every table it holds;
+an incremental one is applied on top of a restore of the backups before
+it.  Checksums are verified as the files are read, and a mismatch rolls
+the whole restore back.
+"""
+import base64
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import gzip
+import hashlib
+from itertools import islice
+import json
+from pathlib import Path
+from uuid import UUID
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connections, transaction
+from django.db.models import DateTimeField, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+# Tables whose rows are never edited once written: (label, insert timestamp)
+APPEND_ONLY = {
+    'jobs.JobArchive': 'archived_at',
+    'jobs.JobEvent': 'created_at',
+    'jobs.JobMove': 'moved_at',
+}
+# Tables whose rows move between shards with their job, keyed by job_id
+MOVED_WITH_JOB = ('jobs.Job', 'jobs.JobArchive', 'jobs.JobEvent')
+
+
+class BackupError(Exception):
+    pass
+
+
+def _default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    raise TypeError(f'Cannot back up a {type(value).__name__} value')
+
+
+def _dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value, default=_default) + b'\n'
+    return json.dumps(value, default=_default, separators=(',', ':')).encode() + b'\n'
+
+
+def _loads(line):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+class _HashingFile:
+    """A file wrapper that hashes every byte written to or read from it."""
+
+    def __init__(self, file):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data):
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def read(self, size=-1):
+        data = self.file.read(size)
+        self.sha256.update(data)
+        return data
+
+    def flush(self):
+        self.file.flush()
+
+    def drain(self):
+        while self.read(1 << 16):
+            pass
+        return self.sha256.hexdigest()
+
+
+def backup_models(labels=(), exclude=()):
+    """
+    The concrete tables to back up, M2M tables included: every model, or
+    those of the given app labels and ``app.Model`` labels, minus ``exclude``.
+    """
+    def matches(model, wanted):
+        return model._meta.app_label in wanted or model._meta.label in wanted
+
+    models = []
+    for model in apps.get_models(include_auto_created=True):
+        meta = model._meta
+        if meta.proxy or not meta.managed:
+            continue
+        if labels and not matches(model, labels):
+            continue
+        if exclude and matches(model, exclude):
+            continue
+        models.append(model)
+    return models
+
+
+def watermark_field(model):
+    """The field that moves forward whenever a row of ``model`` is written, if any."""
+    if model._meta.label in APPEND_ONLY:
+        return model._meta.get_field(APPEND_ONLY[model._meta.label])
+    for field in model._meta.concrete_fields:
+        if isinstance(field, DateTimeField) and field.auto_now:
+            return field
+    return None
+
+
+def changed_since(queryset, since):
+    """The rows of ``queryset`` written, or moved in from another shard, from ``since`` on."""
+    model = queryset.model
+    changed = Q(**{f'{watermark_field(model).name}__gte': since})
+    if model._meta.label in MOVED_WITH_JOB:
+        moves = apps.get_model('jobs', 'JobMove')._base_manager.using(queryset.db)
+        changed |= Q(job_id__in=moves.filter(moved_at__gte=since).values('job_id'))
+    return queryset.filter(changed)
+
+
+def _chunks(queryset, columns, chunk_size):
+    """``values_list(*columns)`` of ``queryset``, read in primary-key order ``chunk_size`` rows at a time."""
+    pk_index = columns.index(queryset.model._meta.pk.attname)
+    queryset = queryset.order_by('pk')
+    last = None
+    while True:
+        page = queryset if last is None else queryset.filter(pk__gt=last)
+        rows = list(page.values_list(*columns)[:chunk_size])
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][pk_index]
+
+
+def _write(path, chunks, level):
+    """Write gzipped lines; returns (rows, bytes, sha256)."""
+    rows = 0
+    with open(path, 'wb') as raw:
+        hashed = _HashingFile(raw)
+        with gzip.GzipFile(fileobj=hashed, mode='wb', compresslevel=level, mtime=0) as out:
+            for chunk in chunks:
+                for row in chunk:
+                    out.write(_dumps(row))
+                rows += len(chunk)
+    return rows, Path(path).stat().st_size, hashed.sha256.hexdigest()
+
+
+@contextmanager
+def _snapshot(using):
+    """A read transaction; on PostgreSQL every query in it sees one snapshot."""
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+        yield
+
+
+def write_backup(directory, models, using, since=None, chunk_size=2000, level=6):
+    """
+    Back up ``models`` from the database ``using`` into ``directory``,
+    which must not exist or be empty.  With ``since`` (an aware datetime),
+    watermarked models only hold the rows written from then on.  Returns
+    the manifest.
+    """
+    directory = Path(directory)
+    if directory.exists() and any(directory.iterdir()):
+        raise BackupError(f'{directory} is not empty')
+    directory.mkdir(parents=True, exist_ok=True)
+
+    started = timezone.now()
+    manifest = {
+        'format': FORMAT_VERSION,
+        'kind': 'incremental' if since else 'full',
+        'database': using,
+        'vendor': connections[using].vendor,
+        'since': since.isoformat() if since else None,
+        'started': started.isoformat(),
+        # Rows written while the backup runs, or in transactions still open
+        # when it starts, are picked up by the next one
+        'watermark': (
+            started - timedelta(seconds=getattr(settings, 'BACKUP_WATERMARK_MARGIN_SECONDS', 600))
+        ).isoformat(),
+        'models': [],
+    }
+    with _snapshot(using):
+        for model in models:
+            label = model._meta.label
+            columns = [field.attname for field in model._meta.concrete_fields]
+            queryset = model._base_manager.using(using)
+            watermark = watermark_field(model) if since else None
+            entry = {'model': label, 'columns': columns, 'mode': 'changes' if watermark else 'full'}
+            if watermark:
+                entry['keys_file'] = f'{label}.keys.jsonl.gz'
+                pk = model._meta.pk.attname
+                entry['keys'], entry['keys_bytes'], entry['keys_sha256'] = _write(
+                    directory / entry['keys_file'],
+                    ([row[0] for row in chunk] for chunk in _chunks(queryset, [pk], chunk_size)),
+                    level,
+                )
+                queryset = changed_since(queryset, since)
+
+            entry['file'] = f'{label}.jsonl.gz'
+            entry['rows'], entry['bytes'], entry['sha256'] = _write(
+                directory / entry['file'], _chunks(queryset, columns, chunk_size), level,
+            )
+            manifest['models'].append(entry)
+
+    with open(directory / MANIFEST, 'w') as out:
+        json.dump(manifest, out, indent=2)
+    return manifest
+
+
+def read_manifest(directory):
+    path = Path(directory) / MANIFEST
+    try:
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        raise BackupError(f'{path} does not exist')
+    if manifest.get('format') != FORMAT_VERSION:
+        raise BackupError(f'Unsupported backup format {manifest.get("format")!r}')
+    return manifest
+
+
+def watermark_of(directory):
+    """The datetime an incremental backup following the one in ``directory`` starts from."""
+    return parse_datetime(read_manifest(directory)['watermark'])
+
+
+@contextmanager
+def _lines(path, sha256):
+    """Decoded lines of a backup file; raises BackupError if it is damaged."""
+    try:
+        with open(path, 'rb') as raw:
+            hashed = _HashingFile(raw)
+            with gzip.GzipFile(fileobj=hashed, mode='rb') as lines:
+                yield map(_loads, lines)
+            checksum = hashed.drain()
+    except (OSError, EOFError, ValueError) as error:
+        raise BackupError(f'{path.name}: {error}')
+    if checksum != sha256:
+        raise BackupError(f'{path.name} does not match its checksum')
+
+
+def verify_backup(directory):
+    """Check every file of a backup against the manifest; returns a list of problems."""
+    directory = Path(directory)
+    problems = []
+    for entry in read_manifest(directory)['models']:
+        files = [(entry['file'], entry['sha256'], entry['rows'])]
+        if 'keys_file' in entry:
+            files.append((entry['keys_file'], entry['keys_sha256'], entry['keys']))
+        for name, sha256, expected in files:
+            try:
+                with _lines(directory / name, sha256) as lines:
+                    rows = sum(1 for _ in lines)
+            except BackupError as error:
+                problems.append(str(error))
+                continue
+            if rows != expected:
+                problems.append(f'{name}: {rows} rows, the manifest says {expected}')
+    return problems
+
+
+@contextmanager
+def keep_timestamps(model):
+    """
+    Let ``bulk_create()`` write the instances' own values of auto_now(_add)
+    fields (restored or generated ones) instead of the current time.  The
+    flags are per process, so this is only for management commands.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _load(model, entry, directory, using, batch_size, upsert):
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    unknown = [column for column in entry['columns'] if column not in fields]
+    if unknown:
+        raise BackupError(f'{model._meta.label} has no columns {", ".join(unknown)}; migrate first')
+    columns = [fields[column] for column in entry['columns']]
+    options = {}
+    if upsert:
+        options = {
+            'update_conflicts': True,
+            'unique_fields': [model._meta.pk.name],
+            'update_fields': [field.name for field in columns if not field.primary_key],
+        }
+
+    rows = 0
+    manager = model._base_manager.using(using)
+    with keep_timestamps(model), _lines(Path(directory) / entry['file'], entry['sha256']) as lines:
+        for batch in _batches(lines, batch_size):
+            manager.bulk_create(
+                [
+                    model(**{field.attname: field.to_python(value) for field, value in zip(columns, values)})
+                    for values in batch
+                ],
+                **options,
+            )
+            rows += len(batch)
+    return rows
+
+
+def _delete_missing(model, entry, directory, using, batch_size):
+    """Delete the rows whose keys are not in the backup's key list."""
+    pk = model._meta.pk
+    with _lines(Path(directory) / entry['keys_file'], entry['keys_sha256']) as lines:
+        kept = {pk.to_python(value) for value in lines}
+
+    manager = model._base_manager.using(using)
+    missing = [key for key in manager.values_list('pk', flat=True).iterator() if key not in kept]
+    for batch in _batches(missing, batch_size):
+        # No cascades or signals: related rows are restored from the backup too
+        manager.filter(pk__in=batch)._raw_delete(using)
+    return len(missing)
+
+
+def restore_backup(directory, using, batch_size=1000):
+    """
+    Restore a backup into the database ``using``.  Returns
+    ``[(label, rows written, rows deleted), ...]``.
+    """
+    manifest = read_manifest(directory)
+    try:
+        entries = [(apps.get_model(entry['model']), entry) for entry in manifest['models']]
+    except LookupError as error:
+        raise BackupError(str(error))
+
+    connection = connections[using]
+    results = []
+    with transaction.atomic(using=using):
+        with connection.constraint_checks_disabled():
+            for model, entry in entries:
+                manager = model._base_manager.using(using)
+                if entry['mode'] == 'full':
+                    deleted = manager.count()
+                    manager.all()._raw_delete(using)
+                    written = _load(model, entry, directory, using, batch_size, upsert=False)
+                else:
+                    written = _load(model, entry, directory, using, batch_size, upsert=True)
+                    deleted = _delete_missing(model, entry, directory, using, batch_size)
+                results.append((model._meta.label, written, deleted))
+        connection.check_constraints(table_names=[model._meta.db_table for model, _ in entries])
+
+        # Inserting explicit keys leaves PostgreSQL's sequences behind
+        statements = connection.ops.sequence_reset_sql(no_style(), [model for model, _ in entries])
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+    return results
@@ -0,0 +1,177 @@
+"""
+Response compression with reusable compressed payloads.
+
+``CompressionMiddleware`` compresses JSON responses of at least
+``COMPRESSION_MIN_SIZE`` bytes, using brotli when the ``brotli`` package is
+installed and the client accepts it, gzip otherwise.  Only JSON is
+compressed: the API carries its credentials in headers, whereas HTML pages
+(the admin) mix CSRF tokens into the body, which is what BREACH needs.
+Streaming responses are passed through unchanged.
+
+Views whose output is worth revalidating opt in with ``@cache_compressed``
+or ``cache_compressed = True`` on the class (the catalog, analytics, job
+lists).  Their GET responses get a strong ETag from a hash of the body,
+with ``Cache-Control: private, no-cache``, and a matching ``If-None-Match``
+gets a 304.  Their compressed bytes are kept in a per-process LRU keyed by
+that ETag and the encoding, so an unchanged payload is hashed on each
+request but compressed only once per worker.
+"""
+from collections import OrderedDict
+import gzip
+import hashlib
+import threading
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from monitoring.middleware import InstrumentationMiddleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+# Quality 5 compresses JSON better than gzip -9 at a fraction of the cost
+# of brotli's default (11), which is meant for static assets
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_TYPES = ('application/json',)
+
+
+def cache_compressed(view):
+    """Give a function-based view's GET responses an ETag and cache their compressed bytes."""
+    view.cache_compressed = True
+    return view
+
+
+def _opted_in(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return False
+    if getattr(match.func, 'cache_compressed', False):
+        return True
+    view_class = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    return getattr(view_class, 'cache_compressed', False)
+
+
+def _accepted_encodings(header):
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """The best coding we support for this Accept-Encoding header, or None."""
+    accepted = _accepted_encodings(header)
+    wildcard = accepted.get('*', 0.0)
+    offers = (['br'] if brotli is not None else []) + ['gzip']
+    best, best_quality = None, 0.0
+    for coding in offers:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    # mtime=0 makes the output depend on the content alone
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressedCache:
+    """Thread-safe LRU of compressed payloads, bounded by total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = value
+            self._size += len(value)
+            while self._size > self.max_bytes:
+                _key, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class CompressionMiddleware(InstrumentationMiddleware):
+    """Compresses JSON responses and revalidates opted-in views."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 512)
+        self.cache = CompressedCache(getattr(settings, 'COMPRESSION_CACHE_MB', 16) * 1024 * 1024)
+
+    def end(self, request, response, state):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').split(';')[0].strip() not in COMPRESSIBLE_TYPES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        cacheable = (
+            request.method in ('GET', 'HEAD') and response.status_code == 200 and _opted_in(request)
+        )
+        if cacheable:
+            if not response.has_header('ETag'):
+                response['ETag'] = f'"{hashlib.blake2b(response.content, digest_size=16).hexdigest()}"'
+            patch_cache_control(response, private=True, no_cache=True)
+            response = get_conditional_response(request, etag=response['ETag'], response=response)
+            if response.status_code == 304:
+                return response
+
+        if len(response.content) < self.min_size:
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        etag = response.get('ETag', '')
+        # Only a strong ETag promises byte-identical content
+        key = (etag, encoding) if cacheable and etag.startswith('"') else None
+        compressed = self.cache.get(key) if key else None
+        if compressed is None:
+            compressed = compress(response.content, encoding)
+            if key:
+                self.cache.set(key, compressed)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # The compressed bytes are a different representation (RFC 9110 8.8.1)
+        if etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
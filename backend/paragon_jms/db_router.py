@@ -0,0 +1,179 @@
+"""
+Read-replica routing.
+
+When ``DATABASE_REPLICA_URL`` is set, ``settings.DATABASES`` gains a
+``replica`` alias and ``ReplicaRouter`` sends the reads of marked views
+there, keeping report and list traffic off the primary that takes the
+docket-locking writes.  Views opt in with ``@replica_reads`` or
+``replica_reads = True`` on the class.  Everything else, including every
+write, management commands and any read inside a transaction, uses
+``default``.
+
+Read-your-writes: after a request writes, ``ReplicaMiddleware`` pins that
+user's reads to the primary for ``REPLICA_PIN_SECONDS``, long enough for
+the replica to catch up.  Pins live in the cache when it is shared
+(``REDIS_URL``), and otherwise in the ``replica_pins`` table on the primary,
+so every worker sees them either way.  Reads later in the same request as
+a write also go to the primary.
+
+Process-wide caches that are rebuilt from inside requests read with
+``read_from_primary()``, so they never load a lagging snapshot.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.utils import timezone
+from django.utils.functional import LazyObject
+
+from monitoring.middleware import InstrumentationMiddleware
+from monitoring.query_budget import unbudgeted
+
+REPLICA_DB_ALIAS = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_request_state = ContextVar('replica_request_state', default=None)
+_force_primary = ContextVar('replica_force_primary', default=False)
+
+
+def replica_reads(view):
+    """Let a function-based view's GET requests read from the replica."""
+    view.replica_reads = True
+    return view
+
+
+def _marked(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return False
+    if getattr(match.func, 'replica_reads', False):
+        return True
+    view_class = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    return getattr(view_class, 'replica_reads', False)
+
+
+def _pin_key(user_pk):
+    return f'replica:pin:{user_pk}'
+
+
+def _cache_is_shared():
+    backend = settings.CACHES['default']['BACKEND']
+    return not backend.endswith(('LocMemCache', 'DummyCache'))
+
+
+def pin(user_pk):
+    """Keep ``user_pk``'s reads on the primary for ``REPLICA_PIN_SECONDS``."""
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+    if _cache_is_shared():
+        cache.set(_pin_key(user_pk), True, seconds)
+        return
+
+    from settings.models import ReplicaPin
+    until = timezone.now() + timedelta(seconds=seconds)
+    pins = ReplicaPin.objects.using(DEFAULT_DB_ALIAS)
+    with unbudgeted():
+        if pins.filter(user_id=user_pk).update(until=until):
+            return
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                pins.create(user_id=user_pk, until=until)
+        except IntegrityError:
+            # Another worker pinned the same user first
+            pins.filter(user_id=user_pk).update(until=until)
+
+
+def is_pinned(user_pk):
+    """Whether ``user_pk`` wrote within the last ``REPLICA_PIN_SECONDS``."""
+    if _cache_is_shared():
+        return bool(cache.get(_pin_key(user_pk)))
+
+    from settings.models import ReplicaPin
+    with unbudgeted():
+        return ReplicaPin.objects.using(DEFAULT_DB_ALIAS).filter(
+            user_id=user_pk, until__gt=timezone.now()
+        ).exists()
+
+
+@contextmanager
+def read_from_primary():
+    """Route every read in this block to the primary."""
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+
+class _RequestState:
+    def __init__(self, request):
+        self.request = request
+        self.wrote = False
+        self._eligible = None
+        self._pinned = None
+
+    def eligible(self):
+        # The view is only known once URL resolution has run
+        if self._eligible is None and getattr(self.request, 'resolver_match', None) is not None:
+            self._eligible = self.request.method in SAFE_METHODS and _marked(self.request)
+        return bool(self._eligible)
+
+    def pinned(self):
+        if self._pinned is None:
+            # DRF stores the user it authenticated on the Django request.
+            # Until then it is absent or lazy, and evaluating it here would
+            # query (and route) recursively, so the replica is used
+            user = self.request.__dict__.get('user')
+            if user is None or isinstance(user, LazyObject) or not user.is_authenticated:
+                return False
+            self._pinned = is_pinned(user.pk)
+        return self._pinned
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.wrote or _force_primary.get():
+            return None
+        if REPLICA_DB_ALIAS not in settings.DATABASES or not state.eligible():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or state.pinned():
+            return None
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        aliases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary
+        return db != REPLICA_DB_ALIAS
+
+
+class ReplicaMiddleware(InstrumentationMiddleware):
+    """Tracks each request for the router and pins users who write."""
+
+    def begin(self, request):
+        state = _RequestState(request)
+        return _request_state.set(state), state
+
+    def release(self, begun):
+        _request_state.reset(begun[0])
+
+    def end(self, request, response, begun):
+        state = begun[1]
+        user = getattr(request, 'user', None)
+        if state.wrote and user is not None and user.is_authenticated:
+            pin(user.pk)
+        return response
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from paragon_jms import backup
+
+
+class Command(BaseCommand):
+    help = (
+        'Restore a directory written by the backup command in one transaction, with batched '
+        'inserts and foreign-key checks deferred to the end'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Backup directory')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database to restore into')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert')
+        parser.add_argument('--check', action='store_true',
+                            help='Only verify the files against the manifest')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask for confirmation')
+
+    def handle(self, *args, **options):
+        try:
+            manifest = backup.read_manifest(options['input'])
+            if options['check']:
+                problems = backup.verify_backup(options['input'])
+                for problem in problems:
+                    self.stderr.write(problem)
+                if problems:
+                    raise CommandError(f'{len(problems)} problem(s) found')
+                self.stdout.write(self.style.SUCCESS(f'{len(manifest["models"])} table(s) verified'))
+                return
+
+            if options['batch_size'] < 1:
+                raise CommandError('--batch-size must be at least 1')
+            if options['interactive']:
+                action = 'replace every table in' if manifest['kind'] == 'full' else 'apply changes to'
+                answer = input(
+                    f'This will {action} the backup on database "{options["database"]}". '
+                    "Type 'yes' to continue: "
+                )
+                if answer != 'yes':
+                    raise CommandError('Restore cancelled')
+
+            results = backup.restore_backup(options['input'], options['database'], options['batch_size'])
+        except backup.BackupError as error:
+            raise CommandError(error)
+
+        for label, written, deleted in results:
+            self.stdout.write(f'{label}: {written} rows written, {deleted} removed')
+        self.stdout.write(self.style.SUCCESS(
+            f'Restored the {manifest["kind"]} backup from {manifest.get("started", manifest["watermark"])} into {options["database"]}'
+        ))
@@ -0,0 +1,38 @@
+"""
+JSON parser backed by orjson when it is installed.
+
+Anything orjson rejects (invalid JSON, NaN under non-strict settings, a
+non-UTF-8 charset, ...) is handed to DRF's stdlib parser, so the accepted
+input and the error messages are exactly those of
+``rest_framework.parsers.JSONParser``.  So is any body with a run of 19 or
+more digits, because orjson reads integers beyond 64 bits as floats.
+"""
+import io
+
+from django.conf import settings
+from rest_framework import parsers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Maps every digit to b'0' and everything else to b' ', so that long digit
+# runs can be found with a substring search, much faster than a regex
+_DIGITS = bytes.maketrans(bytes(range(256)), b' ' * 48 + b'0' * 10 + b' ' * 198)
+_LONG_NUMBER = b'0' * 19
+
+
+class JSONParser(parsers.JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if _LONG_NUMBER in body.translate(_DIGITS):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
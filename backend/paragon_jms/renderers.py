@@ -0,0 +1,66 @@
+"""
+JSON renderer backed by orjson when it is installed.
+
+Output is byte-for-byte what DRF's ``JSONRenderer`` produces with the
+project's settings (compact, UTF-8, strict): datetimes, Decimals and every
+other non-JSON type still go through DRF's ``JSONEncoder.default``, and
+U+2028/U+2029 are escaped the same way.  The stdlib renders instead when
+orjson cannot match it:
+
+- an indented response (``Accept: application/json; indent=4``),
+- data orjson refuses (integers over 64 bits, unpaired surrogates, ...),
+- a Decimal whose float orjson would format differently from ``repr()``
+  (below 1e-4 or from 1e16 up, where ``repr()`` switches to exponents).
+
+Plain floats in the data are written by orjson directly, without a
+fallback, and that is deliberate.  Outside 1e-4..1e16 orjson writes
+floats its own way (``1e20``, ``0.00001``) where the stdlib writes
+``1e+20`` and ``1e-05``.  Both parse to the same double, so no client
+reads a different number, and checking every float in a payload would
+cost more than orjson saves.  Serializers never produce plain floats; they
+render decimals as strings.  The few computed floats (analytics averages)
+are rounded to one place and never reach those magnitudes.  NaN and
+infinity are the exception that matters: the stdlib refuses them under
+strict JSON, orjson writes ``null``, and nothing here computes them.
+"""
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+_encoder = JSONEncoder()
+
+
+def _default(obj):
+    value = _encoder.default(obj)
+    if isinstance(value, float) and not (value == 0 or 1e-4 <= abs(value) < 1e16):
+        # Raising makes render() fall back to the stdlib, which also takes
+        # care of rejecting NaN and infinity
+        raise TypeError('Float needs the stdlib encoder')
+    return value
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    def _can_use_orjson(self, accepted_media_type, renderer_context):
+        return (
+            orjson is not None
+            and self.encoder_class is JSONEncoder
+            and self.compact and self.strict and not self.ensure_ascii
+            and not self.get_indent(accepted_media_type, renderer_context or {})
+        )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not self._can_use_orjson(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as DRF: these are valid JSON but not valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
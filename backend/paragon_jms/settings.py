@@ -1,4 +1,5 @@
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
@@ -39,13 +40,22 @@ LOCAL_APPS = [
     'jobs',
     'products',
     'settings',
+    'monitoring',
+    # Project-wide management commands (backup, restore)
+    'paragon_jms',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Bearer token Prometheus uses to scrape /metrics (superuser JWTs also work)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 MIDDLEWARE = [
+    'paragon_jms.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'monitoring.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -54,6 +64,37 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'monitoring.metrics.MetricsMiddleware')
+
+# Compression: JSON responses of at least COMPRESSION_MIN_SIZE bytes are
+# sent as brotli (if installed) or gzip. Views marked cache_compressed keep
+# up to COMPRESSION_CACHE_MB of compressed payloads per process, by ETag.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '512'))
+COMPRESSION_CACHE_MB = int(os.getenv('COMPRESSION_CACHE_MB', '16'))
+
+# Slow-query log: queries slower than SLOW_QUERY_THRESHOLD_MS are appended to
+# SLOW_QUERY_LOG_FILE (JSON lines); summarize with `manage.py slow_queries`.
+SLOW_QUERY_LOG_ENABLED = os.getenv('SLOW_QUERY_LOG_ENABLED', 'False') == 'True'
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '100'))
+SLOW_QUERY_LOG_FILE = os.getenv('SLOW_QUERY_LOG_FILE', str(BASE_DIR / 'slow_queries.log'))
+
+if SLOW_QUERY_LOG_ENABLED:
+    MIDDLEWARE.append('monitoring.slow_queries.SlowQueryMiddleware')
+
+# On-demand profiling: superusers send `X-Profile: 1` (or `?_profile=1`) and
+# the request's pstats, folded stacks and SQL summary land in PROFILE_DIR,
+# which keeps the newest PROFILE_MAX_FILES profiles for PROFILE_MAX_AGE_DAYS.
+# Other requests pass straight through, so it is on everywhere by default.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'True') == 'True'
+PROFILE_DIR = os.getenv('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', '1'))
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '50'))
+PROFILE_MAX_AGE_DAYS = float(os.getenv('PROFILE_MAX_AGE_DAYS', '7'))
+
+if PROFILING_ENABLED:
+    MIDDLEWARE.append('monitoring.profiling.ProfilingMiddleware')
+
 ROOT_URLCONF = 'paragon_jms.urls'
 
 TEMPLATES = [
@@ -73,16 +114,139 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'paragon_jms.wsgi.application'
+ASGI_APPLICATION = 'paragon_jms.asgi.application'
+# Route the read endpoints that have async versions to them (asgi.py turns
+# this on); under WSGI their sync versions serve them
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
 
 # Database
 DATABASES = {
     'default': dj_database_url.config(
         default=os.getenv('DATABASE_URL'),
-        conn_max_age=600,
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '600')),
         conn_health_checks=True,
     )
 }
 
+DATABASE_ROUTERS = []
+
+# Optional read replica: marked read-only views (analytics, job lists, stats)
+# read from it, except for REPLICA_PIN_SECONDS after the same user writes.
+# To try it locally, point DATABASE_REPLICA_URL at a copy of the database.
+if os.getenv('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = dj_database_url.config(
+        env='DATABASE_REPLICA_URL',
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        conn_health_checks=True,
+    )
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+    DATABASE_ROUTERS.append('paragon_jms.db_router.ReplicaRouter')
+    MIDDLEWARE.append('paragon_jms.db_router.ReplicaMiddleware')
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))
+
+# Optional branch partitioning of job data (see paragon_jms/sharding.py).
+# JOB_SHARD_URLS adds shard databases ("alias=url,alias=url") and
+# JOB_SHARD_BRANCHES maps branch codes to them ("HRE=north,BYO=south").
+# default is always a shard and keeps unmapped branches. Shards allocate
+# job ids and dockets modulo JOB_SHARD_STRIDE, which must never change once
+# jobs exist, so leave room for future shards.
+JOB_SHARDS = ['default']
+for _entry in filter(None, os.getenv('JOB_SHARD_URLS', '').split(',')):
+    _alias, _, _url = _entry.partition('=')
+    DATABASES[_alias.strip()] = dj_database_url.parse(
+        _url.strip(),
+        conn_max_age=int(os.getenv('DB_CONN_MAX_AGE', '600')),
+        conn_health_checks=True,
+    )
+    JOB_SHARDS.append(_alias.strip())
+JOB_SHARD_BRANCHES = {}
+for _entry in filter(None, os.getenv('JOB_SHARD_BRANCHES', '').split(',')):
+    _code, _, _alias = _entry.partition('=')
+    JOB_SHARD_BRANCHES[_code.strip()] = _alias.strip()
+JOB_SHARD_STRIDE = int(os.getenv('JOB_SHARD_STRIDE', '10')) if len(JOB_SHARDS) > 1 else 1
+if len(JOB_SHARDS) > 1:
+    DATABASE_ROUTERS.insert(0, 'paragon_jms.sharding.ShardRouter')
+# manage.py test always has a north and a south database (in-memory SQLite
+# unless JOB_SHARD_URLS names them), which jobs.tests.ShardingTests shards over.
+if sys.argv[1:2] == ['test']:
+    for _alias in ('north', 'south'):
+        DATABASES.setdefault(_alias, {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'})
+
+# Hot/cold job tiers (see jobs/archive.py): archive_jobs moves settled jobs
+# untouched for JOB_ARCHIVE_AFTER_DAYS into jobs_archive. Analytics keep the
+# archive's rollups cached for up to ARCHIVE_ROLLUP_SECONDS; archive_jobs
+# bumps the archive version, so every process recomputes them at once.
+JOB_ARCHIVE_AFTER_DAYS = int(os.getenv('JOB_ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_ROLLUP_SECONDS = int(os.getenv('ARCHIVE_ROLLUP_SECONDS', '300'))
+
+# Incremental backups (see paragon_jms/backup.py) start this long before the
+# previous backup did, to catch rows from transactions that were still open.
+BACKUP_WATERMARK_MARGIN_SECONDS = int(os.getenv('BACKUP_WATERMARK_MARGIN_SECONDS', '600'))
+
+# Jobs listed per press run in the print queue (?jobs_limit= overrides);
+# job_count and total_quantity still cover the whole run.
+PRINT_QUEUE_RUN_JOBS = int(os.getenv('PRINT_QUEUE_RUN_JOBS', '50'))
+
+# Print queue gang runs (see jobs/gang.py): small jobs are packed onto these
+# catalog sheets, by name, the sizes the presses take.
+GANG_PRESS_SHEETS = [
+    name.strip() for name in os.getenv('GANG_PRESS_SHEETS', 'SRA3').split(',') if name.strip()
+]
+
+# Cache
+# Shared cache (Redis) for compressed responses and archive rollups; without
+# REDIS_URL each process falls back to its own local memory cache.  The
+# versions of the process-level caches (catalog index, settings, ...) live
+# in the database (settings/versions.py), so edits reach every worker either way.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# How often (seconds) a worker re-checks the catalog version before trusting
+# its in-memory compatibility index.
+CATALOG_INDEX_CHECK_SECONDS = int(os.getenv('CATALOG_INDEX_CHECK_SECONDS', '5'))
+
+# How often (seconds) a worker re-checks the price rates version before
+# trusting its in-memory rate table.
+PRICE_RATES_CHECK_SECONDS = int(os.getenv('PRICE_RATES_CHECK_SECONDS', '5'))
+
+# How often (seconds) a worker re-checks the SystemSettings version before
+# trusting its cached copy.
+SYSTEM_SETTINGS_CHECK_SECONDS = int(os.getenv('SYSTEM_SETTINGS_CHECK_SECONDS', '5'))
+
+# How often (seconds) a worker checks for jobs created by other workers
+# before trusting its in-memory customer autocomplete index.
+CUSTOMER_INDEX_CHECK_SECONDS = int(os.getenv('CUSTOMER_INDEX_CHECK_SECONDS', '5'))
+# Ids below the last one seen that each catch-up reads again, for jobs that
+# committed after a job with a higher id.
+CUSTOMER_INDEX_OVERLAP_IDS = int(os.getenv('CUSTOMER_INDEX_OVERLAP_IDS', '1000'))
+
+# Dimensions (mm) within which a requested custom size reuses an existing
+# standard size instead of creating a near-duplicate.
+PAPER_SIZE_MATCH_TOLERANCE_MM = float(os.getenv('PAPER_SIZE_MATCH_TOLERANCE_MM', '2'))
+
+# Query budgets: log requests that exceed their view's declared budget or
+# repeat one query shape QUERY_BUDGET_REPEAT_THRESHOLD times (N+1). Counting
+# is cheap and on everywhere. Naming a query's call site walks the stack, so
+# without QUERY_BUDGET_CALL_SITES (default: DEBUG) only the queries past the
+# budget are named. Set QUERY_BUDGET_RAISE=True in CI to turn violations into errors.
+QUERY_BUDGET_ENABLED = os.getenv('QUERY_BUDGET_ENABLED', 'True') == 'True'
+QUERY_BUDGET_CALL_SITES = os.getenv('QUERY_BUDGET_CALL_SITES', str(DEBUG)) == 'True'
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', 'False') == 'True'
+QUERY_BUDGET_REPEAT_THRESHOLD = int(os.getenv('QUERY_BUDGET_REPEAT_THRESHOLD', '3'))
+# Overrides keyed by URL name, e.g. {'job-list': 4}
+QUERY_BUDGETS = {}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -111,7 +275,7 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
@@ -122,11 +286,17 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Same output as DRF's JSON renderer and parser, using orjson when installed
     'DEFAULT_RENDERER_CLASSES': (
-        ['rest_framework.renderers.JSONRenderer']
+        ['paragon_jms.renderers.JSONRenderer']
         if not DEBUG else
-        ['rest_framework.renderers.JSONRenderer', 'rest_framework.renderers.BrowsableAPIRenderer']
+        ['paragon_jms.renderers.JSONRenderer', 'rest_framework.renderers.BrowsableAPIRenderer']
     ),
+    'DEFAULT_PARSER_CLASSES': [
+        'paragon_jms.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler',
     'NON_FIELD_ERRORS_KEY': 'detail',
 }
@@ -141,8 +311,13 @@ SIMPLE_JWT = {
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_REFRESH_SERIALIZER': 'users.authentication.ClaimsTokenRefreshSerializer',
+    'TOKEN_USER_CLASS': 'users.authentication.ClaimsUser',
 }
 
+# How often (seconds) a worker reloads recent token revocations
+AUTH_REVOCATION_CHECK_SECONDS = int(os.getenv('AUTH_REVOCATION_CHECK_SECONDS', '5'))
+
 # Production Security
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
@@ -0,0 +1,355 @@
+"""
+Branch-partitioned job data.
+
+When ``JOB_SHARD_URLS`` is set, the ``jobs`` app's tables are spread over
+several databases by branch, so no single database has to hold every
+branch's jobs.  ``JOB_SHARD_BRANCHES`` maps branch codes to shard aliases.
+``default`` is always a shard too: it keeps the jobs of unmapped branches
+(including every job written before sharding was turned on), and it stays
+the only home of users, settings and the catalog.
+
+Every shard has the full schema (``migrate --database=<alias>``).  Branches
+and the catalog tables that jobs point at are copied to every shard when
+they are saved on ``default``, so foreign keys and ``select_related`` joins
+work inside a shard; ``python manage.py sync_shards`` copies them in bulk.
+
+- ``ShardRouter`` sends ``save()`` of a new job to its branch's shard.
+  ``QuerySet.create()`` is routed without the instance, so code creating
+  jobs picks the shard itself with ``shard_for_branch()``.
+- Job ids and LOCAL docket numbers are allocated per shard.  Each shard
+  takes the numbers in its own slot (a residue class modulo
+  ``JOB_SHARD_STRIDE``), so shards never hand out the same number and
+  never have to coordinate.  The stride must not change once jobs exist.
+- Reads across shards go through ``scatter()``.  ``merge_grouped()``
+  combines aggregate rows and ``ShardedQuerySet`` merges an ordered list
+  (and its pages) as a single queryset would return it.
+
+Shards are queried one after another on the calling thread, so the
+request's connections, transactions and query recording apply as usual.
+``on_shard()`` leaves queries on ``default`` to the routers, so reads of
+``replica_reads`` views still use the read replica.
+
+Without ``JOB_SHARD_URLS`` there is one shard, ``default``, with a stride
+of 1, and all of this reduces to plain queries on one database.
+"""
+from contextlib import ExitStack
+import heapq
+import itertools
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+SHARDED_APPS = ('jobs',)
+# Rows that jobs point at, copied to every shard
+REFERENCE_MODELS = (
+    'settings.Branch',
+    'products.ProductType',
+    'products.PaperType',
+    'products.PaperWeight',
+    'products.PaperSize',
+)
+
+
+def shard_aliases():
+    """Every shard's database alias, ``default`` first."""
+    return getattr(settings, 'JOB_SHARDS', [DEFAULT_DB_ALIAS])
+
+
+def sharding_enabled():
+    return len(shard_aliases()) > 1
+
+
+def shard_for_branch(branch):
+    """The shard holding a branch's jobs; ``branch`` is a Branch, its key or its code."""
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    if isinstance(branch, str):
+        code = branch
+    elif hasattr(branch, 'code'):
+        code = branch.code
+    else:
+        from settings.cache import get_branch
+        branch = get_branch(branch)
+        code = branch.code if branch else None
+    return getattr(settings, 'JOB_SHARD_BRANCHES', {}).get(code, DEFAULT_DB_ALIAS)
+
+
+def on_shard(queryset, alias):
+    """``queryset`` on one shard.  On ``default`` the routers still choose (replica reads)."""
+    if alias == DEFAULT_DB_ALIAS:
+        return queryset
+    return queryset.using(alias)
+
+
+def slot(alias):
+    """(stride, residue): ``alias`` allocates the numbers n with n % stride == residue."""
+    aliases = shard_aliases()
+    stride = getattr(settings, 'JOB_SHARD_STRIDE', 1)
+    if stride < len(aliases):
+        raise ImproperlyConfigured(
+            f'JOB_SHARD_STRIDE ({stride}) must be at least the number of shards ({len(aliases)})'
+        )
+    return stride, (aliases.index(alias) + 1) % stride
+
+
+def next_in_slot(after, alias):
+    """The smallest number above ``after`` in ``alias``'s slot."""
+    stride, residue = slot(alias)
+    number = after + 1
+    return number + (residue - number) % stride
+
+
+def slot_owner(number):
+    """The shard whose slot ``number`` is in (rows from before sharding may be elsewhere)."""
+    for alias in shard_aliases():
+        stride, residue = slot(alias)
+        if number % stride == residue:
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+def scatter(func, aliases=None):
+    """``[func(alias) for each shard]``, in shard order."""
+    return [func(alias) for alias in (aliases or shard_aliases())]
+
+
+async def ascatter(func, aliases=None):
+    """``scatter()`` for async views: ``func(alias)`` returns an awaitable."""
+    return [await func(alias) for alias in (aliases or shard_aliases())]
+
+
+def shard_get(queryset, preferred=None, **lookup):
+    """
+    ``queryset.get(**lookup)`` on whichever shard has the row, trying
+    ``preferred`` first.  Raises the model's ``DoesNotExist`` if none has.
+    """
+    aliases = shard_aliases()
+    if preferred in aliases:
+        aliases = [preferred] + [alias for alias in aliases if alias != preferred]
+    for alias in aliases:
+        try:
+            return on_shard(queryset, alias).get(**lookup)
+        except queryset.model.DoesNotExist:
+            continue
+    raise queryset.model.DoesNotExist(
+        f'{queryset.model._meta.object_name} matching query does not exist on any shard.'
+    )
+
+
+def shard_exists(queryset):
+    return any(on_shard(queryset, alias).exists() for alias in shard_aliases())
+
+
+def shard_count(queryset):
+    return sum(scatter(lambda alias: on_shard(queryset, alias).count()))
+
+
+async def ashard_count(queryset):
+    return sum(await ascatter(lambda alias: on_shard(queryset, alias).acount()))
+
+
+def gather_grouped(queryset, keys, sums):
+    """A grouped aggregate (``values(*keys).annotate(...)``) over every shard, merged."""
+    return merge_grouped(scatter(lambda alias: list(on_shard(queryset, alias))), keys, sums)
+
+
+def move_to_shard(instance, alias):
+    """
+    Move a row (e.g. a job whose branch changed) to another shard, keeping
+    its key.  Inside a transaction the move joins it rather than taking
+    savepoints, so it commits or rolls back with the caller's writes.
+    """
+    source = instance._state.db
+    if source == alias:
+        return
+    with transaction.atomic(using=source, savepoint=False), transaction.atomic(using=alias, savepoint=False):
+        type(instance)._base_manager.using(source).filter(pk=instance.pk).delete()
+        # A raw save keeps auto_now_add values such as created_at
+        instance.save_base(using=alias, raw=True, force_insert=True)
+
+
+def merge_grouped(results, keys, sums):
+    """
+    Combine ``values(*keys).annotate(...)`` rows from several shards: rows
+    with the same ``keys`` are merged, adding up their ``sums`` fields (a
+    ``None`` aggregate adds nothing).  Groups keep the order in which they
+    were first seen, so one shard's rows come back unchanged.
+    """
+    merged = {}
+    for rows in results:
+        for row in rows:
+            group = tuple(row[key] for key in keys)
+            current = merged.get(group)
+            if current is None:
+                merged[group] = dict(row)
+                continue
+            for field in sums:
+                value = row[field]
+                if value is not None:
+                    current[field] = value if current[field] is None else current[field] + value
+    return list(merged.values())
+
+
+class _SortKey:
+    """Orders model instances like ``ORDER BY`` a list of (possibly descending) fields."""
+    __slots__ = ('values', 'descending')
+
+    def __init__(self, values, descending):
+        self.values = values
+        self.descending = descending
+
+    def __lt__(self, other):
+        for mine, theirs, descending in zip(self.values, other.values, self.descending):
+            if mine == theirs:
+                continue
+            # NULLs last when ascending, first when descending, as PostgreSQL does
+            if mine is None or theirs is None:
+                return (mine is None) == descending
+            return (mine > theirs) if descending else (mine < theirs)
+        return False
+
+
+def ordering_key(queryset):
+    """A sort key that orders ``queryset``'s instances as the database does."""
+    ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+    fields = [name.lstrip('-') for name in ordering] + ['pk']
+    descending = [name.startswith('-') for name in ordering] + [False]
+    return lambda obj: _SortKey([getattr(obj, name) for name in fields], descending)
+
+
+def merge_ordered(results, queryset):
+    """Merge per-shard lists, each in ``queryset``'s ordering, into one list."""
+    return list(heapq.merge(*results, key=ordering_key(queryset)))
+
+
+class ShardedQuerySet:
+    """
+    One ordered queryset read from every shard.
+
+    Supports what list views and Django's paginator use: ``count()``,
+    iteration and slicing.  A slice ``[start:stop]`` reads the
+    first ``stop`` rows of each shard and merges them on the queryset's
+    ordering, so deep pages cost more on every shard.
+    """
+    ordered = True
+
+    def __init__(self, queryset, aliases=None):
+        self.queryset = queryset
+        self.aliases = aliases or shard_aliases()
+        self.model = queryset.model
+
+    def count(self):
+        return sum(scatter(lambda alias: on_shard(self.queryset, alias).count(), self.aliases))
+
+    def __iter__(self):
+        return iter(self[0:None])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            rows = self[index:index + 1]
+            if not rows:
+                raise IndexError('ShardedQuerySet index out of range')
+            return rows[0]
+        start, stop = index.start or 0, index.stop
+        if start < 0 or (stop is not None and stop < 0) or index.step not in (None, 1):
+            raise ValueError('ShardedQuerySet supports only non-negative slices without a step')
+        per_shard = scatter(
+            lambda alias: list(on_shard(self.queryset, alias)[:stop] if stop is not None
+                               else on_shard(self.queryset, alias)),
+            self.aliases,
+        )
+        merged = heapq.merge(*per_shard, key=ordering_key(self.queryset))
+        return list(itertools.islice(merged, start, stop))
+
+
+class ShardRouter:
+    """Writes new rows of sharded apps to their branch's shard."""
+
+    def db_for_read(self, model, **hints):
+        return None
+
+    def db_for_write(self, model, **hints):
+        instance = hints.get('instance')
+        # The hint can also be a related object being assigned to the row
+        if model._meta.app_label not in SHARDED_APPS or not isinstance(instance, model):
+            return None
+        branch_id = getattr(instance, 'branch_id', None)
+        if instance._state.adding and branch_id is not None:
+            return shard_for_branch(branch_id)
+        return instance._state.db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Reference rows are copied to every shard under the same key
+        aliases = shard_aliases()
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+def _other_shards():
+    return [alias for alias in shard_aliases() if alias != DEFAULT_DB_ALIAS]
+
+
+def _row_values(instance):
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+        if not field.primary_key
+    }
+
+
+def _replicated(instance, using):
+    model = type(instance)
+    # Data migrations' historical models share the label but not the class
+    return (
+        using == DEFAULT_DB_ALIAS and sharding_enabled()
+        and model._meta.label in REFERENCE_MODELS and model is apps.get_model(model._meta.label)
+    )
+
+
+def copy_to_shards(instance, using):
+    """post_save: copy a reference row saved on ``default`` to every other shard."""
+    if not _replicated(instance, using):
+        return
+    model = type(instance)
+    values = _row_values(instance)
+    for alias in _other_shards():
+        rows = model._base_manager.using(alias)
+        if not rows.filter(pk=instance.pk).update(**values):
+            rows.bulk_create([model(pk=instance.pk, **values)])
+
+
+def delete_from_shards(instance, using):
+    """
+    post_delete: delete a reference row from every other shard.  Runs
+    inside the delete's transaction on ``default``, so if any shard still
+    has jobs protecting the row, nothing is deleted anywhere.
+    """
+    if not _replicated(instance, using):
+        return
+    model = type(instance)
+    with ExitStack() as stack:
+        for alias in _other_shards():
+            stack.enter_context(transaction.atomic(using=alias))
+            model._base_manager.using(alias).filter(pk=instance.pk).delete()
+
+
+def sync_reference_rows(model, alias, batch_size=500):
+    """
+    Make ``model``'s rows on ``alias`` match ``default``.  Returns
+    (rows written, rows deleted).
+    """
+    source = list(model._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk'))
+    fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    with transaction.atomic(using=alias):
+        stale = model._base_manager.using(alias).exclude(pk__in=[row.pk for row in source])
+        deleted = stale.count()
+        stale.delete()
+        copies = [model(pk=row.pk, **_row_values(row)) for row in source]
+        model._base_manager.using(alias).bulk_create(
+            copies, batch_size=batch_size,
+            update_conflicts=True, unique_fields=[model._meta.pk.name], update_fields=fields,
+        )
+    return len(copies), deleted
@@ -0,0 +1,245 @@
+from datetime import timedelta
+from decimal import Decimal
+import gzip
+import json
+from pathlib import Path
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import renderers as drf_renderers
+from rest_framework.response import Response
+
+from jobs import views as job_views
+from jobs.events import move_job
+from jobs.models import DocketCounter, Job, JobEvent
+from monitoring.testing import QueryBudgetTestCase, ShardedTestCase
+from products import views as product_views
+from products.models import PaperType, ProductTypeSpecification
+from users import views as user_views
+from users.authentication import ClaimsRefreshToken
+from users.models import User
+from .async_api import async_api_view
+from .backup import backup_models, restore_backup, write_backup
+from .compression import CompressionMiddleware
+from .renderers import JSONRenderer
+
+
+@override_settings(BACKUP_WATERMARK_MARGIN_SECONDS=0)
+class BackupTests(ShardedTestCase):
+
+    def contents(self, models, alias):
+        return {
+            model._meta.label: list(model._base_manager.using(alias).order_by('pk').values())
+            for model in models
+        }
+
+    def test_full_and_incremental_round_trip(self):
+        models = backup_models(['jobs'])
+        # Rows last written a month ago, as jobs moved by sync_shards are
+        long_ago = timezone.now() - timedelta(days=30)
+        for alias in ('north', 'south'):
+            Job.objects.using(alias).update(updated_at=long_ago)
+            JobEvent.objects.using(alias).update(created_at=long_ago)
+            DocketCounter.objects.using(alias).update(updated_at=long_ago)
+
+        with tempfile.TemporaryDirectory() as directory:
+            full = Path(directory) / 'full'
+            since = parse_datetime(write_backup(full, models, 'south')['watermark'])
+
+            edited, deleted = Job.objects.using('south').order_by('job_id')[:2]
+            deleted_id = deleted.job_id
+            edited.notes = 'Rush'
+            edited.save()
+            deleted.delete()
+            moved = Job.objects.using('north').order_by('job_id').first()
+            move_job(moved, 'south')
+            moved_events = JobEvent.objects.using('south').filter(job_id=moved.job_id).count()
+            expected = self.contents(models, 'south')
+
+            incremental = Path(directory) / 'incremental'
+            manifest = write_backup(incremental, models, 'south', since=since)
+            rows = {entry['model']: entry['rows'] for entry in manifest['models']}
+            # The edit, and the moved job with its events despite their old timestamps
+            self.assertEqual(rows['jobs.Job'], 2)
+            self.assertEqual(rows['jobs.JobEvent'], moved_events)
+            self.assertEqual(rows['jobs.JobMove'], 1)
+
+            restore_backup(full, 'south')
+            self.assertFalse(Job.objects.using('south').filter(job_id=moved.job_id).exists())
+            self.assertTrue(Job.objects.using('south').filter(job_id=deleted_id).exists())
+
+            restore_backup(incremental, 'south')
+            self.assertEqual(self.contents(models, 'south'), expected)
+
+
+class AsyncViewTests(QueryBudgetTestCase):
+    """The async views served under ASGI answer exactly as their sync twins."""
+
+    def headers(self, role='SUPERUSER'):
+        user = User.objects.filter(role=role, approved=True).order_by('date_joined').first()
+        token = ClaimsRefreshToken.for_user(user).access_token
+        return {'authorization': f'Bearer {token}'}
+
+    def call(self, view, path, *args, method='GET', headers=None):
+        if headers is None:
+            headers = self.headers()
+        request = AsyncRequestFactory().generic(method, path, headers=headers)
+        return async_to_sync(view)(request, *args).render()
+
+    def test_same_responses_as_sync_views(self):
+        specification = ProductTypeSpecification.objects.order_by('pk').first()
+        paper_type = PaperType.objects.order_by('pk').first()
+        cases = [
+            (job_views.apending_jobs, reverse('pending_jobs'), ()),
+            (job_views.adesigner_stats, reverse('designer_stats'), ()),
+            # settings.urls reuses the name 'branch-list'
+            (job_views.aget_branches, '/api/jobs/branches/', ()),
+            (user_views.aadmin_stats, reverse('admin_stats'), ()),
+            (product_views.aproduct_type_list, reverse('product-type-list') + '?ordering=-name', ()),
+            (product_views.apaper_weight_list, reverse('paper-weight-list') + '?page=2', ()),
+            (product_views.apaper_size_list, reverse('paper-size-list') + '?page=99', ()),
+            (product_views.aget_product_specifications,
+             reverse('product-specifications', args=[specification.product_type_id]),
+             (specification.product_type_id,)),
+            (product_views.aget_compatible_weights,
+             reverse('compatible-weights') + f'?paper_type_id={paper_type.pk}', ()),
+            (product_views.aget_compatible_weights, reverse('compatible-weights'), ()),
+            (product_views.aget_compatible_sizes, reverse('compatible-sizes'), ()),
+        ]
+        client = self.client_for('SUPERUSER')
+        for view, path, args in cases:
+            with self.subTest(path=path):
+                expected = client.get(path)
+                response = self.call(view, path, *args)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+
+    def test_errors_match_sync_views(self):
+        path = reverse('admin_stats')
+        expected = self.client.get(path)
+        response = self.call(user_views.aadmin_stats, path, headers={})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['WWW-Authenticate'], expected['WWW-Authenticate'])
+
+        expected = self.client_for('SUPERUSER').post(path)
+        response = self.call(user_views.aadmin_stats, path, method='POST')
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response.content, expected.content)
+
+    def test_django_exceptions_go_through_exception_handler(self):
+        @async_api_view(['GET'])
+        async def missing(request):
+            raise Http404
+
+        @async_api_view(['GET'])
+        async def forbidden(request):
+            raise PermissionDenied
+
+        @async_api_view(['GET'])
+        async def broken(request):
+            raise ValueError('boom')
+
+        self.assertEqual(self.call(missing, '/').status_code, 404)
+        self.assertEqual(self.call(forbidden, '/').status_code, 403)
+        with self.assertRaises(ValueError):
+            self.call(broken, '/')
+
+    def test_vary_is_patched(self):
+        @async_api_view(['GET'])
+        async def varies(request):
+            return Response({}, headers={'Vary': 'Cookie'})
+
+        self.assertEqual(self.call(varies, '/')['Vary'], 'Cookie, Accept')
+
+    def test_sync_views_serve_wsgi(self):
+        self.assertIs(resolve(reverse('pending_jobs')).func, job_views.pending_jobs)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=512)
+class CompressionTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        self.client = self.client_for('SUPERUSER')
+
+    def test_large_json_is_gzipped(self):
+        plain = self.client.get(reverse('job-list'))
+        response = self.client.get(reverse('job-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertGreaterEqual(len(plain.content), 512)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertIn('Accept-Encoding', response['Vary'])
+        # The compressed bytes are another representation of the same ETag
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/api/jobs/branches/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertLess(len(response.content), 512)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_encoded_and_non_json_responses_are_left_alone(self):
+        body = b'{"a": 1}' * 200
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        for headers in ({'Content-Type': 'application/json', 'Content-Encoding': 'br'}, {'Content-Type': 'text/html'}):
+            with self.subTest(headers=headers):
+                middleware = CompressionMiddleware(lambda request: HttpResponse(body, headers=headers))
+                response = middleware(request)
+                self.assertEqual(response.content, body)
+                self.assertEqual(response.get('Content-Encoding'), headers.get('Content-Encoding'))
+
+    def test_if_none_match_gets_304(self):
+        path = reverse('job-list')
+        plain = self.client.get(path)
+        self.assertTrue(plain['ETag'].startswith('"'))
+        self.assertEqual(plain['Cache-Control'], 'private, no-cache')
+        compressed = self.client.get(path, HTTP_ACCEPT_ENCODING='gzip')
+        for etag in (plain['ETag'], compressed['ETag']):
+            with self.subTest(etag=etag):
+                response = self.client.get(path, HTTP_IF_NONE_MATCH=etag, HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_views_not_opted_in_get_no_etag(self):
+        job = Job.objects.order_by('job_id').first()
+        response = self.client.get(reverse('job-events', args=[job.job_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+
+class RendererParityTests(QueryBudgetTestCase):
+
+    def assertRendersLikeDRF(self, data):
+        self.assertEqual(JSONRenderer().render(data), drf_renderers.JSONRenderer().render(data))
+
+    def test_api_payloads_match_drf(self):
+        client = self.client_for('SUPERUSER')
+        for name in ('job-list', 'job_analytics'):
+            with self.subTest(name=name):
+                response = client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertRendersLikeDRF(response.data)
+
+    def test_fallbacks_match_drf(self):
+        values = [
+            timezone.now(), Decimal('12.50'), Decimal('1E+20'), Decimal('0.00001'),
+            2 ** 70, 'line\u2028break\u2029', {1: 'non-string key'},
+        ]
+        for value in values:
+            with self.subTest(value=value):
+                self.assertRendersLikeDRF({'value': value})
+
+    def test_plain_float_exponents_differ_only_in_form(self):
+        # Accepted, see the module docstring: same number, different spelling
+        for value in (1e20, 1e-05):
+            with self.subTest(value=value):
+                ours = JSONRenderer().render({'value': value})
+                drf = drf_renderers.JSONRenderer().render({'value': value})
+                self.assertNotEqual(ours, drf)
+                self.assertEqual(json.loads(ours), json.loads(drf))
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
+from monitoring.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -7,4 +8,6 @@ urlpatterns = [
     path('api/jobs/', include('jobs.urls')),
     path('api/products/', include('products.urls')),
     path('api/settings/', include('settings.urls')),
+    path('api/monitoring/', include('monitoring.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -0,0 +1,115 @@
+"""
+Work done before a worker accepts traffic.
+
+Left alone, the first request each fresh worker serves pays for importing
+DRF, simplejwt and django_filters on demand, compiling every URL pattern,
+building serializer fields, loading translation catalogs and connecting
+to the database.  ``gunicorn.conf.py`` calls these hooks instead:
+
+- ``warm_up_app()`` needs no database and is safe to run in the gunicorn
+  master under ``preload_app``, so forked workers share the result.
+- ``warm_up_worker()`` runs in each worker after the fork: it opens the
+  database connections, loads the per-process settings cache and builds
+  the customer autocomplete index (a scan of every job).
+
+Both return how long they took in milliseconds, or ``None`` if they
+failed: errors are logged and swallowed, because a failed warm-up must
+never stop a worker from booting.
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve_urls():
+    from django.urls import get_resolver
+
+    # Populating the reverse dict walks every include and compiles every pattern
+    get_resolver().reverse_dict
+
+
+def _load_api_settings():
+    from rest_framework.settings import api_settings
+    from rest_framework_simplejwt import state  # noqa: F401 (imports PyJWT)
+    from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+    # Both settings objects import their classes on first attribute access
+    for name in ('DEFAULT_AUTHENTICATION_CLASSES', 'DEFAULT_PERMISSION_CLASSES',
+                 'DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES',
+                 'DEFAULT_FILTER_BACKENDS', 'DEFAULT_PAGINATION_CLASS',
+                 'EXCEPTION_HANDLER'):
+        getattr(api_settings, name)
+    for name in ('AUTH_TOKEN_CLASSES', 'TOKEN_USER_CLASS', 'USER_AUTHENTICATION_RULE'):
+        getattr(jwt_settings, name)
+
+
+def _project_serializers():
+    from rest_framework.serializers import BaseSerializer, ListSerializer
+
+    project = tuple(config.name for config in apps.get_app_configs()
+                    if not config.name.startswith(('django.', 'rest_framework')))
+    pending = [BaseSerializer]
+    while pending:
+        cls = pending.pop()
+        pending.extend(cls.__subclasses__())
+        if issubclass(cls, ListSerializer):
+            continue
+        if cls.__module__.split('.')[0] in project:
+            yield cls
+
+
+def _build_serializer_fields():
+    for cls in _project_serializers():
+        try:
+            cls().fields
+        except Exception:
+            logger.debug('Could not build fields of %s', cls.__qualname__, exc_info=True)
+
+
+def _load_translations():
+    from django.conf import settings
+    from django.utils import translation
+
+    # Error bodies are lazy translations; this loads the catalogs they use
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('Not found.')
+
+
+def warm_up_app():
+    """Import, compile and build everything that does not need the database."""
+    started = time.perf_counter()
+    try:
+        _resolve_urls()
+        _load_api_settings()
+        _build_serializer_fields()
+        _load_translations()
+    except Exception:
+        logger.exception('Application warm-up failed')
+        return None
+    return (time.perf_counter() - started) * 1000
+
+
+def warm_up_worker():
+    """Open this worker's database connections and load its process-level caches."""
+    started = time.perf_counter()
+    try:
+        for connection in connections.all():
+            # With CONN_MAX_AGE=0 the connection would be closed as soon as
+            # the first request starts, so opening it early gains nothing
+            if connection.settings_dict['CONN_MAX_AGE'] != 0:
+                connection.ensure_connection()
+
+        from settings.cache import get_branch_registry
+        get_branch_registry()
+
+        # Built here rather than by the first autocomplete request
+        from jobs.customers import get_index
+        get_index()
+    except Exception:
+        logger.exception('Worker warm-up failed')
+        return None
+    return (time.perf_counter() - started) * 1000
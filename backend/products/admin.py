@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ProductType, PaperType
+from .models import ProductType, PaperType, PriceRate
 
 
 @admin.register(ProductType)
@@ -14,3 +14,13 @@ class PaperTypeAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at')
     search_fields = ('name',)
     ordering = ('name',)
+
+
+@admin.register(PriceRate)
+class PriceRateAdmin(admin.ModelAdmin):
+    list_display = (
+        'product_type', 'paper_type', 'paper_weight', 'paper_size',
+        'min_quantity', 'setup_cost', 'unit_price', 'sheet_price', 'is_active'
+    )
+    list_filter = ('is_active', 'product_type', 'paper_type')
+    ordering = ('product_type', 'min_quantity')
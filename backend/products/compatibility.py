@@ -0,0 +1,183 @@
+"""
+In-memory bitset index over the paper catalog.
+
+Every product type, paper type, paper weight and paper size gets a bit
+position, and each relationship (product -> types/weights/sizes,
+type -> weights, weight -> sizes) is stored as a Python int used as a
+bitset.  Checking a (product, type, weight, size) combination is then a
+handful of dict lookups and bit tests instead of several M2M queries.
+
+The index is built lazily per process and rebuilt once the catalog version
+(``settings.versions``) has moved, which ``products.signals`` does on
+every catalog edit, whichever process makes it.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from monitoring.query_budget import unbudgeted
+from paragon_jms.db_router import read_from_primary
+from settings import versions
+from .models import PaperType, PaperWeight, PaperSize, ProductTypeSpecification
+
+CATALOG_VERSION_KEY = 'products:catalog_version'
+
+
+def _bit_positions(ids):
+    return {pk: position for position, pk in enumerate(sorted(ids))}
+
+
+def _to_bits(ids, positions):
+    bits = 0
+    for pk in ids:
+        bits |= 1 << positions[pk]
+    return bits
+
+
+def _has(bits, positions, pk):
+    position = positions.get(pk)
+    return position is not None and (bits >> position) & 1 == 1
+
+
+class CompatibilityIndex:
+    """Immutable snapshot of catalog compatibility rules."""
+
+    def __init__(self, version=None):
+        self.version = version
+
+        sizes = list(PaperSize.objects.values_list('id', 'is_custom'))
+        self.size_ids = tuple(sorted(pk for pk, _ in sizes))
+        self.size_positions = _bit_positions(self.size_ids)
+        self.custom_sizes = _to_bits(
+            (pk for pk, is_custom in sizes if is_custom),
+            self.size_positions,
+        )
+
+        weight_ids = PaperWeight.objects.values_list('id', flat=True)
+        self.weight_positions = _bit_positions(weight_ids)
+        self.type_positions = _bit_positions(PaperType.objects.values_list('id', flat=True))
+
+        # paper type -> compatible weights
+        type_weights = {}
+        for weight_id, type_id in PaperWeight.paper_types.through.objects.values_list(
+            'paperweight_id', 'papertype_id'
+        ):
+            type_weights.setdefault(type_id, set()).add(weight_id)
+        self.type_weights = {
+            type_id: _to_bits(ids, self.weight_positions)
+            for type_id, ids in type_weights.items()
+        }
+
+        # paper weight -> compatible sizes
+        weight_sizes = {}
+        for size_id, weight_id in PaperSize.paper_weights.through.objects.values_list(
+            'papersize_id', 'paperweight_id'
+        ):
+            weight_sizes.setdefault(weight_id, set()).add(size_id)
+        self.weight_sizes = {
+            weight_id: _to_bits(ids, self.size_positions)
+            for weight_id, ids in weight_sizes.items()
+        }
+
+        # product type -> (paper types, weights, sizes) from its specification
+        spec_products = dict(
+            ProductTypeSpecification.objects.values_list('id', 'product_type_id')
+        )
+        spec_types, spec_weights, spec_sizes = {}, {}, {}
+        for through, column, target in (
+            (ProductTypeSpecification.paper_types.through, 'papertype_id', spec_types),
+            (ProductTypeSpecification.paper_weights.through, 'paperweight_id', spec_weights),
+            (ProductTypeSpecification.paper_sizes.through, 'papersize_id', spec_sizes),
+        ):
+            for spec_id, related_id in through.objects.values_list(
+                'producttypespecification_id', column
+            ):
+                target.setdefault(spec_products[spec_id], set()).add(related_id)
+
+        self.products = {
+            product_id: (
+                _to_bits(spec_types.get(product_id, ()), self.type_positions),
+                _to_bits(spec_weights.get(product_id, ()), self.weight_positions),
+                _to_bits(spec_sizes.get(product_id, ()), self.size_positions),
+            )
+            for product_id in spec_products.values()
+        }
+
+    def check(self, product_type_id, paper_type_id=None, paper_weight_id=None, paper_size_id=None):
+        """
+        Return the name of the first field that is incompatible with the
+        rest of the combination, or None when the combination is valid.
+
+        An empty relationship means the catalog does not restrict that
+        dimension.  Custom sizes are accepted for any product
+        as long as they are compatible with the chosen weight.
+        """
+        types, weights, sizes = self.products.get(product_type_id, (0, 0, 0))
+
+        if paper_type_id is not None:
+            if types and not _has(types, self.type_positions, paper_type_id):
+                return 'paper_type'
+
+        if paper_weight_id is not None:
+            if weights and not _has(weights, self.weight_positions, paper_weight_id):
+                return 'paper_weight'
+            type_weights = self.type_weights.get(paper_type_id, 0)
+            if type_weights and not _has(type_weights, self.weight_positions, paper_weight_id):
+                return 'paper_weight'
+
+        if paper_size_id is not None:
+            if (
+                sizes
+                and not _has(sizes, self.size_positions, paper_size_id)
+                and not _has(self.custom_sizes, self.size_positions, paper_size_id)
+            ):
+                return 'paper_size'
+            weight_sizes = self.weight_sizes.get(paper_weight_id, 0)
+            if weight_sizes and not _has(weight_sizes, self.size_positions, paper_size_id):
+                return 'paper_size'
+
+        return None
+
+    def sizes_for_weight(self, paper_weight_id):
+        """
+        Bitset (ordered like ``size_ids``) of sizes usable with a weight.
+        Weights with no size restrictions allow every size.
+        """
+        all_sizes = (1 << len(self.size_ids)) - 1
+        return self.weight_sizes.get(paper_weight_id) or all_sizes
+
+    def is_valid(self, product_type_id, paper_type_id=None, paper_weight_id=None, paper_size_id=None):
+        return self.check(product_type_id, paper_type_id, paper_weight_id, paper_size_id) is None
+
+
+_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+
+
+def get_index():
+    """Return the current index, rebuilding it if the catalog has changed."""
+    global _index, _checked_at
+
+    ttl = getattr(settings, 'CATALOG_INDEX_CHECK_SECONDS', 5)
+    now = time.monotonic()
+    index = _index
+    if index is not None and now - _checked_at < ttl:
+        return index
+
+    version = versions.current(CATALOG_VERSION_KEY)
+
+    with _lock:
+        if _index is None or _index.version != version:
+            with unbudgeted(), read_from_primary():
+                _index = CompatibilityIndex(version)
+        _checked_at = now
+        return _index
+
+
+def invalidate():
+    """Bump the catalog version so every process rebuilds its index."""
+    global _index
+    versions.bump(CATALOG_VERSION_KEY)
+    _index = None
@@ -3,6 +3,7 @@ from django.db import migrations
 def add_standard_paper_sizes(apps, schema_editor):
     PaperSize = apps.get_model('products', 'PaperSize')
     PaperWeight = apps.get_model('products', 'PaperWeight')
+    db_alias = schema_editor.connection.alias
     
     # Standard A series sizes
     a_series = [
@@ -46,7 +47,7 @@ def add_standard_paper_sizes(apps, schema_editor):
     
     def create_size(name, width, height, series):
         # Try to find existing size with these dimensions
-        existing = PaperSize.objects.filter(
+        existing = PaperSize.objects.using(db_alias).filter(
             width_mm=width,
             height_mm=height
         ).first()
@@ -60,7 +61,7 @@ def add_standard_paper_sizes(apps, schema_editor):
             return existing
         else:
             # Create new size
-            return PaperSize.objects.create(
+            return PaperSize.objects.using(db_alias).create(
                 name=name,
                 series=series,
                 width_mm=width,
@@ -81,8 +82,8 @@ def add_standard_paper_sizes(apps, schema_editor):
         create_size(name, width, height, 'OTHER')
     
     # Associate all sizes with all weights
-    weights = PaperWeight.objects.all()
-    sizes = PaperSize.objects.all()
+    weights = PaperWeight.objects.using(db_alias).all()
+    sizes = PaperSize.objects.using(db_alias).all()
     
     for weight in weights:
         # Get existing compatible sizes
@@ -94,7 +95,8 @@ def add_standard_paper_sizes(apps, schema_editor):
 
 def remove_standard_paper_sizes(apps, schema_editor):
     PaperSize = apps.get_model('products', 'PaperSize')
-    PaperSize.objects.all().delete()
+    db_alias = schema_editor.connection.alias
+    PaperSize.objects.using(db_alias).all().delete()
 
 class Migration(migrations.Migration):
     dependencies = [
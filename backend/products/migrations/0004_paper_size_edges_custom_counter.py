@@ -0,0 +1,76 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:38
+
+import re
+
+from django.db import migrations, models
+
+STANDARD_OTHER_SIZES = {
+    'DL', 'SRA3', 'Business Card', 'Other', 'DL Envelope',
+    'C4 Envelope', 'C5 Envelope', 'C6 Envelope', 'Square',
+}
+CUSTOM_NAME_RE = re.compile(r'^custom size\s*(\d+)$', re.IGNORECASE)
+
+
+def backfill_paper_size_edges(apps, schema_editor):
+    PaperSize = apps.get_model('products', 'PaperSize')
+    CustomSizeCounter = apps.get_model('products', 'CustomSizeCounter')
+
+    db_alias = schema_editor.connection.alias
+    highest_custom = 0
+    for size in PaperSize.objects.using(db_alias).all():
+        size.short_edge_mm, size.long_edge_mm = sorted((size.width_mm, size.height_mm))
+        size.is_custom = size.series == 'OTHER' and size.name not in STANDARD_OTHER_SIZES
+        size.save(update_fields=['short_edge_mm', 'long_edge_mm', 'is_custom'])
+
+        match = CUSTOM_NAME_RE.match(size.name.strip())
+        if match:
+            highest_custom = max(highest_custom, int(match.group(1)))
+
+    CustomSizeCounter.objects.using(db_alias).create(current_number=highest_custom)
+
+
+def clear_custom_size_counter(apps, schema_editor):
+    CustomSizeCounter = apps.get_model('products', 'CustomSizeCounter')
+    db_alias = schema_editor.connection.alias
+    CustomSizeCounter.objects.using(db_alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_add_standard_paper_sizes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomSizeCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('current_number', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'custom_size_counters',
+            },
+        ),
+        migrations.AddField(
+            model_name='papersize',
+            name='is_custom',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='papersize',
+            name='long_edge_mm',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name='papersize',
+            name='short_edge_mm',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=8),
+        ),
+        migrations.AddIndex(
+            model_name='papersize',
+            index=models.Index(fields=['short_edge_mm', 'long_edge_mm'], name='paper_size_edges_idx'),
+        ),
+        migrations.RunPython(backfill_paper_size_edges, clear_custom_size_counter),
+    ]
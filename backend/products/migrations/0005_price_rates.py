@@ -0,0 +1,35 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_paper_size_edges_custom_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_quantity', models.PositiveIntegerField(default=1)),
+                ('setup_cost', models.DecimalField(decimal_places=4, default=0, max_digits=10)),
+                ('unit_price', models.DecimalField(decimal_places=4, default=0, max_digits=10)),
+                ('sheet_price', models.DecimalField(decimal_places=4, default=0, max_digits=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('paper_size', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_rates', to='products.papersize')),
+                ('paper_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_rates', to='products.papertype')),
+                ('paper_weight', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_rates', to='products.paperweight')),
+                ('product_type', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_rates', to='products.producttype')),
+            ],
+            options={
+                'db_table': 'price_rates',
+                'ordering': ['product_type', 'min_quantity'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:22
+
+from django.db import migrations, models
+
+
+def merge_rotated_custom_sizes(apps, schema_editor):
+    """
+    Fold custom sizes that are the same shape entered the other way round
+    into the oldest of them, so the constraint below can be added.
+    """
+    PaperSize = apps.get_model('products', 'PaperSize')
+    PriceRate = apps.get_model('products', 'PriceRate')
+    ProductTypeSpecification = apps.get_model('products', 'ProductTypeSpecification')
+    Job = apps.get_model('jobs', 'Job')
+    JobArchive = apps.get_model('jobs', 'JobArchive')
+
+    db_alias = schema_editor.connection.alias
+    keep = {}
+    for size in PaperSize.objects.using(db_alias).filter(is_custom=True).order_by('id'):
+        original = keep.setdefault((size.short_edge_mm, size.long_edge_mm), size)
+        if original.pk == size.pk:
+            continue
+        for model in (Job, JobArchive, PriceRate):
+            model.objects.using(db_alias).filter(paper_size_id=size.pk).update(paper_size_id=original.pk)
+        original.paper_weights.add(*size.paper_weights.all())
+        for specification in ProductTypeSpecification.objects.using(db_alias).filter(paper_sizes=size):
+            specification.paper_sizes.add(original)
+        size.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_price_rates'),
+        ('jobs', '0009_job_status_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_rotated_custom_sizes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='papersize',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_custom', True)), fields=('short_edge_mm', 'long_edge_mm'), name='paper_size_custom_edges_uniq'),
+        ),
+    ]
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.db import models
 
 
@@ -54,6 +56,10 @@ class PaperSize(models.Model):
     series = models.CharField(max_length=10, choices=SERIES_CHOICES)
     width_mm = models.DecimalField(max_digits=8, decimal_places=2)
     height_mm = models.DecimalField(max_digits=8, decimal_places=2)
+    # Orientation-independent dimensions, kept in sync by save()
+    short_edge_mm = models.DecimalField(max_digits=8, decimal_places=2, default=0, editable=False)
+    long_edge_mm = models.DecimalField(max_digits=8, decimal_places=2, default=0, editable=False)
+    is_custom = models.BooleanField(default=False)
     paper_weights = models.ManyToManyField(PaperWeight, related_name='compatible_sizes')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -61,6 +67,24 @@ class PaperSize(models.Model):
     class Meta:
         unique_together = ['width_mm', 'height_mm']
         ordering = ['series', 'name']
+        indexes = [
+            models.Index(fields=['short_edge_mm', 'long_edge_mm'], name='paper_size_edges_idx'),
+        ]
+        constraints = [
+            # One custom size per shape, whichever way round it was entered.
+            # Standard sizes may share one (Tabloid and Ledger)
+            models.UniqueConstraint(
+                fields=['short_edge_mm', 'long_edge_mm'],
+                condition=models.Q(is_custom=True),
+                name='paper_size_custom_edges_uniq',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.short_edge_mm, self.long_edge_mm = sorted(
+            (Decimal(str(self.width_mm)), Decimal(str(self.height_mm)))
+        )
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.name} ({self.width_mm}×{self.height_mm}mm)"
@@ -70,6 +94,18 @@ class PaperSize(models.Model):
         return f"{self.width_mm}×{self.height_mm}mm"
 
 
+class CustomSizeCounter(models.Model):
+    """Single-row sequence used to number "Custom Size N" paper sizes"""
+    current_number = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Custom Size Counter: {self.current_number}"
+
+    class Meta:
+        db_table = 'custom_size_counters'
+
+
 class ProductTypeSpecification(models.Model):
     """Defines which paper types, weights, and sizes are valid for each product type"""
     product_type = models.OneToOneField(ProductType, on_delete=models.CASCADE, related_name='specifications')
@@ -81,3 +117,30 @@ class ProductTypeSpecification(models.Model):
 
     def __str__(self):
         return f"Specifications for {self.product_type.name}"
+
+
+class PriceRate(models.Model):
+    """
+    Print price rule.  Blank product/paper keys match anything; the most
+    specific active rule with the highest ``min_quantity`` not above the
+    job quantity wins.
+    """
+    product_type = models.ForeignKey(ProductType, on_delete=models.CASCADE, null=True, blank=True, related_name='price_rates')
+    paper_type = models.ForeignKey(PaperType, on_delete=models.CASCADE, null=True, blank=True, related_name='price_rates')
+    paper_weight = models.ForeignKey(PaperWeight, on_delete=models.CASCADE, null=True, blank=True, related_name='price_rates')
+    paper_size = models.ForeignKey(PaperSize, on_delete=models.CASCADE, null=True, blank=True, related_name='price_rates')
+    min_quantity = models.PositiveIntegerField(default=1)
+    setup_cost = models.DecimalField(max_digits=10, decimal_places=4, default=0)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=4, default=0)
+    sheet_price = models.DecimalField(max_digits=10, decimal_places=4, default=0)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        keys = [str(key) for key in (self.product_type, self.paper_type, self.paper_weight, self.paper_size) if key]
+        return f"{' / '.join(keys) or 'Default'} from {self.min_quantity}"
+
+    class Meta:
+        db_table = 'price_rates'
+        ordering = ['product_type', 'min_quantity']
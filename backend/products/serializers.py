@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from .models import ProductType, PaperType, PaperWeight, PaperSize
 
@@ -26,3 +28,10 @@ class PaperSizeSerializer(serializers.ModelSerializer):
     class Meta:
         model = PaperSize
         fields = ['id', 'name', 'series', 'width_mm', 'height_mm', 'dimensions']
+
+
+class NearestSizesRequestSerializer(serializers.Serializer):
+    width_mm = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0.01'))
+    height_mm = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0.01'))
+    tolerance_mm = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=0, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=5)
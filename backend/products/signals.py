@@ -0,0 +1,50 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from paragon_jms import sharding
+
+from . import compatibility
+from .models import ProductType, PaperType, PaperWeight, PaperSize, ProductTypeSpecification, PriceRate
+
+CATALOG_MODELS = (ProductType, PaperType, PaperWeight, PaperSize, ProductTypeSpecification)
+CATALOG_RELATIONS = (
+    PaperWeight.paper_types.through,
+    PaperSize.paper_weights.through,
+    ProductTypeSpecification.paper_types.through,
+    ProductTypeSpecification.paper_weights.through,
+    ProductTypeSpecification.paper_sizes.through,
+)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def catalog_changed(sender, **kwargs):
+    if sender in CATALOG_MODELS:
+        compatibility.invalidate()
+
+
+@receiver(post_save, sender=PriceRate)
+@receiver(post_delete, sender=PriceRate)
+def rates_changed(sender, **kwargs):
+    # Rates have their own version, so the compatibility index is kept
+    from jobs import pricing
+    pricing.invalidate()
+
+
+@receiver(m2m_changed)
+def catalog_relation_changed(sender, action, **kwargs):
+    if sender in CATALOG_RELATIONS and action in ('post_add', 'post_remove', 'post_clear'):
+        compatibility.invalidate()
+
+
+@receiver(post_save)
+def copy_to_shards(sender, instance, using, **kwargs):
+    # Copies only the rows jobs point at (sharding.REFERENCE_MODELS)
+    if sender in CATALOG_MODELS:
+        sharding.copy_to_shards(instance, using)
+
+
+@receiver(post_delete)
+def delete_from_shards(sender, instance, using, **kwargs):
+    if sender in CATALOG_MODELS:
+        sharding.delete_from_shards(instance, using)
@@ -0,0 +1,122 @@
+"""
+Paper size lookup helpers.
+
+Sizes are matched on their orientation-independent (short_edge_mm,
+long_edge_mm) key, which is indexed, so 210×297 and 297×210 resolve to the
+same row (and a unique constraint keeps one custom size per shape).
+``find_nearest`` widens that into a tolerance window so that
+near-duplicates of an existing standard size are reused instead of being
+added to the catalog.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import PaperSize, PaperWeight, CustomSizeCounter
+
+TWO_PLACES = Decimal('0.01')
+
+
+def quantize_mm(value):
+    """A dimension as stored: a Decimal rounded to 0.01mm."""
+    return Decimal(str(value)).quantize(TWO_PLACES, rounding=ROUND_HALF_UP)
+
+
+def normalize_dimensions(width_mm, height_mm):
+    """Return (short_edge, long_edge) as Decimals rounded to 0.01mm."""
+    edges = sorted(quantize_mm(value) for value in (width_mm, height_mm))
+    if edges[0] <= 0:
+        raise ValueError('Paper dimensions must be greater than zero')
+    return edges[0], edges[1]
+
+
+def default_tolerance():
+    return Decimal(str(getattr(settings, 'PAPER_SIZE_MATCH_TOLERANCE_MM', 2)))
+
+
+def find_by_dimensions(width_mm, height_mm):
+    """Get the size with exactly these dimensions in either orientation."""
+    short_edge, long_edge = normalize_dimensions(width_mm, height_mm)
+    return PaperSize.objects.filter(
+        short_edge_mm=short_edge,
+        long_edge_mm=long_edge
+    ).order_by('id').first()
+
+
+def find_nearest(width_mm, height_mm, tolerance_mm=None, limit=5, standard_only=True):
+    """
+    Return up to ``limit`` sizes whose edges are each within ``tolerance_mm``
+    of the requested size, closest first.
+    """
+    short_edge, long_edge = normalize_dimensions(width_mm, height_mm)
+    tolerance = default_tolerance() if tolerance_mm is None else Decimal(str(tolerance_mm))
+
+    candidates = PaperSize.objects.filter(
+        short_edge_mm__range=(short_edge - tolerance, short_edge + tolerance),
+        long_edge_mm__range=(long_edge - tolerance, long_edge + tolerance),
+    )
+    if standard_only:
+        candidates = candidates.filter(is_custom=False)
+
+    def distance(size):
+        return (
+            max(abs(size.short_edge_mm - short_edge), abs(size.long_edge_mm - long_edge)),
+            size.id,
+        )
+
+    return sorted(candidates, key=distance)[:limit]
+
+
+def next_custom_size_name():
+    """Allocate the next "Custom Size N" name from the custom size sequence."""
+    with transaction.atomic():
+        counter = CustomSizeCounter.objects.select_for_update().order_by('id').first()
+        if counter is None:
+            counter = CustomSizeCounter.objects.create(current_number=0)
+        counter.current_number += 1
+        counter.save()
+        return f'Custom Size {counter.current_number}'
+
+
+def get_or_create_custom_size(width_mm, height_mm, name=None, weight=None, tolerance_mm=None):
+    """
+    Resolve a requested size to an existing row (exact match first, then the
+    nearest standard size within tolerance) or create a new custom size.
+
+    Returns (size, created).  When ``weight`` is given it is linked to the
+    returned size.
+    """
+    if isinstance(weight, (int, str)):
+        weight = PaperWeight.objects.get(id=weight)
+
+    size = find_by_dimensions(width_mm, height_mm)
+    if size is None and tolerance_mm != 0:
+        nearest = find_nearest(width_mm, height_mm, tolerance_mm=tolerance_mm, limit=1)
+        size = nearest[0] if nearest else None
+
+    created = size is None
+    if created:
+        if not name or name.lower().startswith('custom size'):
+            name = next_custom_size_name()
+        try:
+            with transaction.atomic():
+                size = PaperSize.objects.create(
+                    name=name,
+                    series='OTHER',
+                    width_mm=quantize_mm(width_mm),
+                    height_mm=quantize_mm(height_mm),
+                    is_custom=True
+                )
+        except IntegrityError:
+            # A concurrent request created the same size, either way round
+            size = find_by_dimensions(width_mm, height_mm)
+            if size is None:
+                raise
+            created = False
+
+    if weight is not None:
+        # add() skips rows that are already linked
+        size.paper_weights.add(weight)
+
+    return size, created
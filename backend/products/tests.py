@@ -0,0 +1,156 @@
+from decimal import Decimal
+
+from django.test import override_settings
+from django.urls import reverse
+
+from jobs.models import Job
+from jobs.tests import new_job_data
+from monitoring.testing import QueryBudgetTestCase
+from . import compatibility
+from .models import CustomSizeCounter, PaperSize, PaperType, PaperWeight, ProductType, ProductTypeSpecification
+from .sizes import find_by_dimensions, find_nearest, get_or_create_custom_size
+
+
+class CatalogQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_catalog_lists(self):
+        for name in ('product-type-list', 'paper-type-list', 'paper-weight-list', 'paper-size-list'):
+            with self.subTest(url=name):
+                self.assertWithinBudget(reverse(name))
+
+    def test_product_specifications(self):
+        specification = ProductTypeSpecification.objects.order_by('id').first()
+        self.assertWithinBudget(reverse('product-specifications', args=[specification.product_type_id]))
+
+    def test_compatible_weights(self):
+        paper_type = PaperType.objects.order_by('id').first()
+        self.assertWithinBudget(reverse('compatible-weights') + f'?paper_type_id={paper_type.pk}')
+
+    def test_compatible_sizes(self):
+        self.assertWithinBudget(reverse('compatible-sizes'))
+
+    def test_nearest_sizes(self):
+        self.assertWithinBudget(reverse('nearest-sizes') + '?width_mm=210&height_mm=297')
+
+    def test_custom_size(self):
+        weight = PaperWeight.objects.order_by('id').first()
+        self.assertWithinBudget(reverse('create-custom-size'), method='POST', status=201, data={
+            'name': 'Test Card', 'width_mm': '123', 'height_mm': '77', 'weight_id': weight.pk,
+        })
+
+
+class CompatibilityIndexTests(QueryBudgetTestCase):
+    """A small catalog of its own, so the rules under test are plain to see."""
+
+    def setUp(self):
+        self.product = ProductType.objects.create(name='Test Leaflets')
+        self.matte, self.kraft = (
+            PaperType.objects.create(name=name) for name in ('Test Matte', 'Test Kraft')
+        )
+        self.light, self.heavy = (PaperWeight.objects.create(gsm=gsm) for gsm in (901, 902))
+        self.small, self.large, self.custom = (
+            PaperSize.objects.create(name=name, series='OTHER', width_mm=width, height_mm=height, is_custom=custom)
+            for name, width, height, custom in (
+                ('Test Small', 91, 51, False), ('Test Large', 901, 601, False), ('Test Custom', 93, 53, True),
+            )
+        )
+        self.light.paper_types.add(self.matte)
+        self.small.paper_weights.add(self.light)
+        self.custom.paper_weights.add(self.light)
+        specification = ProductTypeSpecification.objects.create(product_type=self.product)
+        specification.paper_types.add(self.matte)
+        specification.paper_weights.add(self.light, self.heavy)
+        specification.paper_sizes.add(self.small)
+
+    def check(self, paper_type, paper_weight, paper_size):
+        return compatibility.get_index().check(self.product.pk, paper_type.pk, paper_weight.pk, paper_size.pk)
+
+    def test_valid_combination(self):
+        self.assertIsNone(self.check(self.matte, self.light, self.small))
+
+    def test_invalid_combinations(self):
+        # Not in the product's specification
+        self.assertEqual(self.check(self.kraft, self.light, self.small), 'paper_type')
+        # In the specification, but not made in this paper type
+        self.assertEqual(self.check(self.matte, self.heavy, self.small), 'paper_weight')
+        # Neither in the specification nor custom
+        self.assertEqual(self.check(self.matte, self.light, self.large), 'paper_size')
+
+    def test_custom_sizes_need_only_the_weight(self):
+        self.assertIsNone(self.check(self.matte, self.light, self.custom))
+        self.custom.paper_weights.remove(self.light)
+        self.custom.paper_weights.add(self.heavy)
+        self.assertEqual(self.check(self.matte, self.light, self.custom), 'paper_size')
+
+    def test_job_create_rejects_invalid_combination(self):
+        data = new_job_data(
+            Job.objects.order_by('job_id').first(),
+            product_type=self.product.pk, paper_type=self.kraft.pk,
+            paper_weight=self.light.pk, paper_size=self.small.pk,
+        )
+        response = self.assertWithinBudget(reverse('job-list'), role='DESIGNER', method='POST', status=400, data=data)
+        self.assertIn('paper_type', response.json())
+
+    @override_settings(CATALOG_INDEX_CHECK_SECONDS=0)
+    def test_catalog_edit_invalidates(self):
+        index = compatibility.get_index()
+        self.assertEqual(self.check(self.matte, self.heavy, self.small), 'paper_weight')
+
+        self.heavy.paper_types.add(self.matte)
+        self.assertIsNone(self.check(self.matte, self.heavy, self.small))
+        self.assertIsNot(compatibility.get_index(), index)
+
+        # Another process still holding the old index rebuilds once the version has moved
+        compatibility._index = index
+        self.addCleanup(setattr, compatibility, '_index', None)
+        self.assertIsNone(self.check(self.matte, self.heavy, self.small))
+
+
+@override_settings(PAPER_SIZE_MATCH_TOLERANCE_MM=2)
+class PaperSizeMatchingTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        # Well away from the seeded sizes
+        self.poster = PaperSize.objects.create(name='Test Poster', series='OTHER', width_mm=333, height_mm=444)
+        self.wide = PaperSize.objects.create(name='Test Wide', series='OTHER', width_mm=335, height_mm=446)
+        self.weight = PaperWeight.objects.order_by('id').first()
+
+    def test_nearest_within_tolerance_closest_first(self):
+        self.assertEqual(find_nearest(334.5, 445.6), [self.wide, self.poster])
+        self.assertEqual(find_nearest(333.4, 444), [self.poster, self.wide])
+        self.assertEqual(find_nearest(333.4, 444, tolerance_mm=1), [self.poster])
+        self.assertEqual(find_nearest(330, 444), [])
+
+    def test_nearest_skips_custom_sizes(self):
+        self.wide.is_custom = True
+        self.wide.save()
+        self.assertEqual(find_nearest(335, 446), [self.poster])
+        self.assertEqual(find_nearest(335, 446, standard_only=False), [self.wide, self.poster])
+
+    def test_rotated_sizes_are_the_same_size(self):
+        self.assertEqual(find_by_dimensions(444, 333), self.poster)
+        self.assertEqual((self.poster.short_edge_mm, self.poster.long_edge_mm), (Decimal('333'), Decimal('444')))
+
+        size, created = get_or_create_custom_size(444.6, 333.4, weight=self.weight)
+        self.assertEqual((size, created), (self.poster, False))
+        self.assertTrue(self.poster.paper_weights.filter(pk=self.weight.pk).exists())
+
+        custom, created = get_or_create_custom_size(123, 77, tolerance_mm=0)
+        self.assertTrue(created)
+        self.assertEqual(get_or_create_custom_size(77, 123, tolerance_mm=0), (custom, False))
+
+    def test_custom_sizes_are_numbered_by_the_counter(self):
+        start = CustomSizeCounter.objects.order_by('id').values_list('current_number', flat=True).first() or 0
+        first, _ = get_or_create_custom_size(123, 77)
+        second, _ = get_or_create_custom_size(150, 90, name='custom size 7')
+        named, _ = get_or_create_custom_size(180, 100, name='Door Hanger')
+        self.assertEqual(first.name, f'Custom Size {start + 1}')
+        self.assertEqual(second.name, f'Custom Size {start + 2}')
+        self.assertEqual(named.name, 'Door Hanger')
+        self.assertTrue(all(size.is_custom for size in (first, second, named)))
+
+    def test_create_custom_size_reuses_rotated_match(self):
+        response = self.assertWithinBudget(reverse('create-custom-size'), method='POST', status=200, data={
+            'name': 'Test Poster Rotated', 'width_mm': '444.5', 'height_mm': '333', 'weight_id': self.weight.pk,
+        })
+        self.assertEqual(response.json()['size']['id'], self.poster.pk)
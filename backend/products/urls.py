@@ -1,24 +1,28 @@
 from django.urls import path
+from paragon_jms.async_api import server_view
 from . import views
 
 urlpatterns = [
-    path('product-types/', views.ProductTypeList.as_view(), name='product-type-list'),
+    path('product-types/', server_view(views.ProductTypeList.as_view(), views.aproduct_type_list), name='product-type-list'),
     path('paper-types/', views.PaperTypeListCreateView.as_view(), name='paper-type-list'),
     path('product-types/<int:product_type_id>/specifications/', 
-         views.get_product_specifications, 
+         server_view(views.get_product_specifications, views.aget_product_specifications),
          name='product-specifications'),
     path('paper-weights/', 
-         views.PaperWeightList.as_view(),
+         server_view(views.PaperWeightList.as_view(), views.apaper_weight_list),
          name='paper-weight-list'),
     path('paper-sizes/',
-         views.PaperSizeList.as_view(),
+         server_view(views.PaperSizeList.as_view(), views.apaper_size_list),
          name='paper-size-list'),
     path('paper-types/weights/', 
-         views.get_compatible_weights, 
+         server_view(views.get_compatible_weights, views.aget_compatible_weights),
          name='compatible-weights'),
     path('paper-weights/sizes/', 
-         views.get_compatible_sizes, 
+         server_view(views.get_compatible_sizes, views.aget_compatible_sizes),
          name='compatible-sizes'),
+    path('paper-sizes/nearest/',
+         views.nearest_sizes,
+         name='nearest-sizes'),
     path('paper-sizes/custom/',
          views.create_custom_size,
          name='create-custom-size'),
@@ -1,18 +1,23 @@
 from rest_framework import generics, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from monitoring.query_budget import query_budget
+from paragon_jms.async_api import async_api_view, paginated
+from paragon_jms.compression import cache_compressed
 from .models import ProductType, PaperType, PaperWeight, PaperSize, ProductTypeSpecification
 from .serializers import (
     ProductTypeSerializer,
     PaperTypeSerializer,
     PaperWeightSerializer,
-    PaperSizeSerializer
+    PaperSizeSerializer,
+    NearestSizesRequestSerializer
 )
-from django.db.models import Q
-from decimal import Decimal
+from .sizes import find_nearest, get_or_create_custom_size
 
 
 class ProductTypeListCreateView(generics.ListCreateAPIView):
+    cache_compressed = True
+    query_budget = 2
     queryset = ProductType.objects.all()
     serializer_class = ProductTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -30,6 +35,8 @@ class ProductTypeDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 class PaperTypeListCreateView(generics.ListCreateAPIView):
+    cache_compressed = True
+    query_budget = 2
     queryset = PaperType.objects.all()
     serializer_class = PaperTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -42,6 +49,8 @@ class PaperTypeDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 
 class ProductTypeList(generics.ListAPIView):
+    cache_compressed = True
+    query_budget = 2
     queryset = ProductType.objects.all()
     serializer_class = ProductTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -49,6 +58,8 @@ class ProductTypeList(generics.ListAPIView):
 
 class PaperWeightList(generics.ListAPIView):
     """Get all paper weights ordered by GSM"""
+    cache_compressed = True
+    query_budget = 2
     queryset = PaperWeight.objects.all().order_by('gsm')
     serializer_class = PaperWeightSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -56,11 +67,39 @@ class PaperWeightList(generics.ListAPIView):
 
 class PaperSizeList(generics.ListAPIView):
     """Get all paper sizes ordered by series and name"""
+    cache_compressed = True
+    query_budget = 2
     queryset = PaperSize.objects.all().order_by('series', 'name')
     serializer_class = PaperSizeSerializer
     permission_classes = [permissions.IsAuthenticated]
 
 
+@query_budget(2)
+@cache_compressed
+@async_api_view(['GET'])
+async def aproduct_type_list(request):
+    """``ProductTypeList`` for ASGI."""
+    return Response(await paginated(request, ProductTypeList.queryset.all(), ProductTypeSerializer))
+
+
+@query_budget(2)
+@cache_compressed
+@async_api_view(['GET'])
+async def apaper_weight_list(request):
+    """``PaperWeightList`` for ASGI."""
+    return Response(await paginated(request, PaperWeightList.queryset.all(), PaperWeightSerializer))
+
+
+@query_budget(2)
+@cache_compressed
+@async_api_view(['GET'])
+async def apaper_size_list(request):
+    """``PaperSizeList`` for ASGI."""
+    return Response(await paginated(request, PaperSizeList.queryset.all(), PaperSizeSerializer))
+
+
+@query_budget(4)
+@cache_compressed
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_product_specifications(request, product_type_id):
@@ -80,6 +119,31 @@ def get_product_specifications(request, product_type_id):
         })
 
 
+@query_budget(4)
+@cache_compressed
+@async_api_view(['GET'])
+async def aget_product_specifications(request, product_type_id):
+    """``get_product_specifications`` for ASGI."""
+    try:
+        spec = await ProductTypeSpecification.objects.aget(product_type_id=product_type_id)
+        paper_types = [obj async for obj in spec.paper_types.all()]
+        paper_weights = [obj async for obj in spec.paper_weights.all()]
+        paper_sizes = [obj async for obj in spec.paper_sizes.all()]
+        return Response({
+            'paper_types': PaperTypeSerializer(paper_types, many=True).data,
+            'paper_weights': PaperWeightSerializer(paper_weights, many=True).data,
+            'paper_sizes': PaperSizeSerializer(paper_sizes, many=True).data,
+        })
+    except ProductTypeSpecification.DoesNotExist:
+        return Response({
+            'paper_types': [],
+            'paper_weights': [],
+            'paper_sizes': [],
+        })
+
+
+@query_budget(2)
+@cache_compressed
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_compatible_weights(request):
@@ -96,6 +160,25 @@ def get_compatible_weights(request):
         return Response({'error': 'Paper type not found'}, status=404)
 
 
+@query_budget(2)
+@cache_compressed
+@async_api_view(['GET'])
+async def aget_compatible_weights(request):
+    """``get_compatible_weights`` for ASGI."""
+    paper_type_id = request.GET.get('paper_type_id')
+    if not paper_type_id:
+        return Response({'error': 'paper_type_id is required'}, status=400)
+    
+    try:
+        paper_type = await PaperType.objects.aget(id=paper_type_id)
+        weights = [weight async for weight in paper_type.compatible_weights.all()]
+        return Response(PaperWeightSerializer(weights, many=True).data)
+    except PaperType.DoesNotExist:
+        return Response({'error': 'Paper type not found'}, status=404)
+
+
+@query_budget(1)
+@cache_compressed
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def get_compatible_sizes(request):
@@ -107,10 +190,41 @@ def get_compatible_sizes(request):
         return Response({'error': str(e)}, status=400)
 
 
+@query_budget(1)
+@cache_compressed
+@async_api_view(['GET'])
+async def aget_compatible_sizes(request):
+    """``get_compatible_sizes`` for ASGI."""
+    try:
+        sizes = [size async for size in PaperSize.objects.all().order_by('series', 'name')]
+        return Response(PaperSizeSerializer(sizes, many=True).data)
+    except Exception as e:
+        return Response({'error': str(e)}, status=400)
+
+
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def nearest_sizes(request):
+    """Get the standard paper sizes closest to the given dimensions"""
+    serializer = NearestSizesRequestSerializer(data=request.GET)
+    serializer.is_valid(raise_exception=True)
+    params = serializer.validated_data
+
+    sizes = find_nearest(
+        params['width_mm'],
+        params['height_mm'],
+        tolerance_mm=params.get('tolerance_mm'),
+        limit=params['limit'],
+    )
+    return Response(PaperSizeSerializer(sizes, many=True).data)
+
+
+@query_budget(8)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def create_custom_size(request):
-    """Create a new custom paper size"""
+    """Create a new custom paper size, reusing an existing or near-identical one"""
     name = request.data.get('name')
     width_mm = request.data.get('width_mm')
     height_mm = request.data.get('height_mm')
@@ -121,60 +235,28 @@ def create_custom_size(request):
             'error': 'name, width_mm, height_mm, and weight_id are required'
         }, status=400)
 
+    # force=true skips the near-match lookup and only reuses exact matches
+    force = str(request.data.get('force', '')).lower() in ('1', 'true', 'yes')
+
     try:
-        # Convert dimensions to Decimal for exact comparison
-        width_mm = Decimal(str(width_mm))
-        height_mm = Decimal(str(height_mm))
-
-        # Check if size with these dimensions already exists
-        existing_size = PaperSize.objects.filter(
-            Q(width_mm=width_mm, height_mm=height_mm) |
-            Q(width_mm=height_mm, height_mm=width_mm)  # Check rotated dimensions too
-        ).first()
-
-        if existing_size:
-            # Associate with the weight if not already
-            weight = PaperWeight.objects.get(id=weight_id)
-            if not existing_size.paper_weights.filter(id=weight_id).exists():
-                existing_size.paper_weights.add(weight)
-            return Response({
-                'message': 'A paper size with these dimensions already exists',
-                'size': PaperSizeSerializer(existing_size).data
-            }, status=200)
-
-        # Get the weight to associate with the size
-        weight = PaperWeight.objects.get(id=weight_id)
-
-        # Create new custom size
-        # If name starts with "Custom Size", increment the number
-        if name.lower().startswith('custom size') or not name:
-            latest_custom = PaperSize.objects.filter(
-                name__istartswith='Custom Size'
-            ).order_by('-name').first()
-            
-            if latest_custom:
-                try:
-                    # Extract the number from the last custom size
-                    last_num = int(''.join(filter(str.isdigit, latest_custom.name)))
-                    name = f'Custom Size {last_num + 1}'
-                except ValueError:
-                    name = 'Custom Size 1'
-            else:
-                name = 'Custom Size 1'
-
-        size = PaperSize.objects.create(
+        size, created = get_or_create_custom_size(
+            width_mm,
+            height_mm,
             name=name,
-            series='OTHER',
-            width_mm=width_mm,
-            height_mm=height_mm
+            weight=PaperWeight.objects.get(id=weight_id),
+            tolerance_mm=0 if force else request.data.get('tolerance_mm'),
         )
-        size.paper_weights.add(weight)
-        
-        return Response(PaperSizeSerializer(size).data, status=201)
-    
     except PaperWeight.DoesNotExist:
         return Response({'error': 'Paper weight not found'}, status=404)
-    except (ValueError, TypeError) as e:
+    except (ArithmeticError, ValueError, TypeError) as e:
         return Response({'error': f'Invalid dimensions: {str(e)}'}, status=400)
     except Exception as e:
         return Response({'error': str(e)}, status=400)
+
+    if not created:
+        return Response({
+            'message': 'A paper size with these dimensions already exists',
+            'size': PaperSizeSerializer(size).data
+        }, status=200)
+
+    return Response(PaperSizeSerializer(size).data, status=201)
@@ -0,0 +1,115 @@
+"""
+Process-level cache of the ``SystemSettings`` singleton and branch registry.
+
+Each process keeps the settings row (with its default branch) and every
+``Branch`` in memory.  After ``SYSTEM_SETTINGS_CHECK_SECONDS`` it compares
+its version with the shared one (see ``settings.versions``), and reloads
+only if that version has changed.  Saving settings or a branch bumps the
+version (see ``settings.signals``), so reading settings or resolving a
+branch on a hot path normally costs no query at all.  ``find_branch()``
+and ``get_branch()`` recheck at once on a miss, so a branch added by
+another process resolves without waiting for the next check.
+
+The cached objects are shared by every caller and must be treated as
+read-only; code that edits settings should use ``SystemSettings.load()``.
+"""
+import threading
+import time
+
+from django.conf import settings
+
+from monitoring.query_budget import unbudgeted
+from paragon_jms.db_router import read_from_primary
+from . import versions
+
+SETTINGS_VERSION_KEY = 'settings:version'
+
+
+class BranchRegistry:
+    """All branches, by primary key and by code."""
+
+    def __init__(self, branches):
+        self.by_id = {branch.pk: branch for branch in branches}
+        self.by_code = {branch.code: branch for branch in branches}
+        self.codes = sorted(self.by_code)
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def code_for(self, pk):
+        branch = self.by_id.get(pk)
+        return branch.code if branch else None
+
+    def name_for(self, pk):
+        branch = self.by_id.get(pk)
+        return branch.name if branch else None
+
+
+class _Snapshot:
+    def __init__(self, version):
+        from .models import Branch, SystemSettings
+        self.version = version
+        self.system_settings = SystemSettings.load()
+        self.branches = BranchRegistry(list(Branch.objects.all()))
+
+
+_lock = threading.Lock()
+_snapshot = None
+_checked_at = 0.0
+
+
+def _get_snapshot(recheck=False):
+    global _snapshot, _checked_at
+
+    ttl = getattr(settings, 'SYSTEM_SETTINGS_CHECK_SECONDS', 5)
+    now = time.monotonic()
+    snapshot = _snapshot
+    if snapshot is not None and not recheck and now - _checked_at < ttl:
+        return snapshot
+
+    version = versions.current(SETTINGS_VERSION_KEY)
+
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            with unbudgeted(), read_from_primary():
+                _snapshot = _Snapshot(version)
+        _checked_at = now
+        return _snapshot
+
+
+def get_system_settings():
+    """Return the cached ``SystemSettings``, reloading it if it has changed."""
+    return _get_snapshot().system_settings
+
+
+def get_branch_registry(recheck=False):
+    """
+    Return the cached ``BranchRegistry``.
+
+    ``recheck`` compares versions now instead of after the check interval,
+    for callers that missed a branch another process may have just added.
+    """
+    return _get_snapshot(recheck).branches
+
+
+def find_branch(code):
+    """The ``Branch`` with ``code``, rechecking the registry once on a miss; None if unknown."""
+    branch = get_branch_registry().by_code.get(code)
+    if branch is None:
+        branch = get_branch_registry(recheck=True).by_code.get(code)
+    return branch
+
+
+def get_branch(pk):
+    """The ``Branch`` with key ``pk``, rechecking the registry once on a miss; None if unknown."""
+    branch = get_branch_registry().get(pk)
+    if branch is None:
+        branch = get_branch_registry(recheck=True).get(pk)
+    return branch
+
+
+def invalidate():
+    """Bump the settings version so every process reloads."""
+    global _snapshot
+    versions.bump(SETTINGS_VERSION_KEY)
+    _snapshot = None
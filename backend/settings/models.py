@@ -43,14 +43,22 @@ class SystemSettings(models.Model):
         return f"System Settings - {self.company_name}"
 
     def save(self, *args, **kwargs):
-        # Ensure only one instance exists
-        if not self.pk and SystemSettings.objects.exists():
+        # Ensure only one instance exists (the UUID pk is set before the
+        # first save, so new rows are recognised through _state.adding)
+        if self._state.adding and SystemSettings.objects.exclude(pk=self.pk).exists():
             return SystemSettings.objects.first()
         return super().save(*args, **kwargs)
 
     @classmethod
     def get_settings(cls):
-        settings = cls.objects.first()
+        """Cached, read-only settings for the current process."""
+        from .cache import get_system_settings
+        return get_system_settings()
+
+    @classmethod
+    def load(cls):
+        """Fetch (or create) the settings row itself, e.g. for editing."""
+        settings = cls.objects.select_related('default_branch').first()
         if not settings:
             settings = cls.objects.create(
                 company_name="Paragon Job Management",
@@ -65,3 +73,33 @@ class SystemSettings(models.Model):
                 }
             )
         return settings
+
+
+class CacheVersion(models.Model):
+    """
+    The version of one process-level cache (see ``settings.versions``),
+    moved on whenever the data behind it changes.
+    """
+    key = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+    class Meta:
+        db_table = 'cache_versions'
+
+
+class ReplicaPin(models.Model):
+    """
+    Keeps a user's reads on the primary until ``until`` after they write
+    (see ``paragon_jms.db_router``), when there is no shared cache to hold it.
+    """
+    user_id = models.BigIntegerField(primary_key=True)
+    until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} until {self.until}"
+
+    class Meta:
+        db_table = 'replica_pins'
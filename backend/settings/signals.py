@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from paragon_jms import sharding
+
+from . import cache
+from .models import Branch, SystemSettings
+
+
+@receiver(post_save, sender=SystemSettings)
+@receiver(post_delete, sender=SystemSettings)
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def settings_changed(sender, **kwargs):
+    cache.invalidate()
+
+
+@receiver(post_save, sender=Branch)
+def copy_branch_to_shards(sender, instance, using, **kwargs):
+    # Jobs on every shard point at their branch
+    sharding.copy_to_shards(instance, using)
+
+
+@receiver(post_delete, sender=Branch)
+def delete_branch_from_shards(sender, instance, using, **kwargs):
+    sharding.delete_from_shards(instance, using)
@@ -1,3 +1,12 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from monitoring.testing import QueryBudgetTestCase
+
+
+class SettingsQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_system_settings(self):
+        self.assertWithinBudget(reverse('system_settings'))
+
+    def test_branches(self):
+        self.assertWithinBudget(reverse('branch-list'))
@@ -0,0 +1,43 @@
+"""
+Versions of the process-level caches.
+
+Each process keeps some data in memory (the compatibility index, the
+settings snapshot, the customer index, ...) together with the version it
+was built at.  Every ``*_CHECK_SECONDS`` it compares that with
+``current()`` and rebuilds once the version has moved; ``bump()`` moves it
+after a change.
+
+Versions are rows of ``cache_versions`` on the default database rather
+than cache keys, so every worker, management command and shell shares
+them whatever cache backend is configured (the local-memory fallback is
+per process).  A check is one primary-key read, and a bump made inside a
+transaction only shows once the change it announces has committed.
+"""
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F
+
+from monitoring.query_budget import unbudgeted
+from .models import CacheVersion
+
+
+def current(key):
+    """The version of ``key``: 0 until it is first bumped."""
+    with unbudgeted():
+        version = CacheVersion.objects.using(DEFAULT_DB_ALIAS).filter(
+            key=key
+        ).values_list('version', flat=True).first()
+    return version or 0
+
+
+def bump(key):
+    """Move ``key`` on, so every process rebuilds what it caches under it."""
+    versions = CacheVersion.objects.using(DEFAULT_DB_ALIAS).filter(key=key)
+    with unbudgeted():
+        if versions.update(version=F('version') + 1):
+            return
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                CacheVersion.objects.using(DEFAULT_DB_ALIAS).create(key=key, version=1)
+        except IntegrityError:
+            # Another process created it first
+            versions.update(version=F('version') + 1)
@@ -2,6 +2,8 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from monitoring.query_budget import query_budget
 from .models import SystemSettings, Branch
 from .serializers import SystemSettingsSerializer, BranchSerializer
 
@@ -9,16 +11,16 @@ class IsSuperUser(permissions.BasePermission):
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated and request.user.role == 'SUPERUSER'
 
+@query_budget(3)
 @api_view(['GET', 'PUT'])
 @permission_classes([IsSuperUser])
 def system_settings(request):
-    settings = SystemSettings.get_settings()
-    
     if request.method == 'GET':
-        serializer = SystemSettingsSerializer(settings)
+        serializer = SystemSettingsSerializer(SystemSettings.get_settings())
         return Response(serializer.data)
     
     elif request.method == 'PUT':
+        settings = SystemSettings.load()
         serializer = SystemSettingsSerializer(settings, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -26,6 +28,7 @@ def system_settings(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class BranchViewSet(viewsets.ModelViewSet):
+    query_budget = 3
     queryset = Branch.objects.all()
     serializer_class = BranchSerializer
     permission_classes = [IsSuperUser]
@@ -39,9 +42,6 @@ class BranchViewSet(viewsets.ModelViewSet):
     def perform_destroy(self, instance):
         # Check if this is the default branch
         settings = SystemSettings.get_settings()
-        if settings.default_branch == instance:
-            return Response(
-                {"error": "Cannot delete the default branch"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        if settings.default_branch_id == instance.pk:
+            raise ValidationError({"error": "Cannot delete the default branch"})
         instance.delete()
@@ -0,0 +1,238 @@
+"""
+Claims-based JWT authentication.
+
+Tokens issued by ``LoginView`` and the refresh endpoint carry signed
+``role``, ``full_name`` and ``approved`` claims, so authenticating a request
+does not need to load ``users.User``.  Views get a ``ClaimsUser`` that
+answers those attributes from the token and only fetches the real row
+when something else is accessed.
+
+Revoked users are tracked in ``TokenRevocation``; the recent revocations
+are held in a small per-process map.  Every ``AUTH_REVOCATION_CHECK_SECONDS``
+it compares the shared revocation version (``settings.versions``) and
+reloads if a revocation has moved it.
+"""
+from datetime import timedelta
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from monitoring.query_budget import unbudgeted
+from paragon_jms.db_router import read_from_primary
+from settings import versions
+from .models import User, TokenRevocation
+
+CLAIM_FIELDS = ('role', 'full_name', 'approved')
+REVOCATION_VERSION_KEY = 'users:revocation_version'
+
+
+def add_user_claims(token, user):
+    for field in CLAIM_FIELDS:
+        token[field] = getattr(user, field)
+    return token
+
+
+class ClaimsRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+class ClaimsUser(TokenUser):
+    """Request user backed by token claims; loads the real row on demand."""
+
+    @cached_property
+    def role(self):
+        return self.token.get('role')
+
+    @cached_property
+    def full_name(self):
+        return self.token.get('full_name', '')
+
+    @cached_property
+    def approved(self):
+        return self.token.get('approved', False)
+
+    @cached_property
+    def instance(self):
+        return User.objects.get(pk=self.pk)
+
+    # TokenUser answers these itself with token defaults (False or empty),
+    # so __getattr__ never sees them: they come from the row instead
+
+    @cached_property
+    def username(self):
+        return self.instance.username
+
+    @cached_property
+    def is_staff(self):
+        return self.instance.is_staff
+
+    @cached_property
+    def is_superuser(self):
+        return self.instance.is_superuser
+
+    @property
+    def groups(self):
+        return self.instance.groups
+
+    @property
+    def user_permissions(self):
+        return self.instance.user_permissions
+
+    def get_username(self):
+        return self.instance.get_username()
+
+    def get_group_permissions(self, obj=None):
+        return self.instance.get_group_permissions(obj)
+
+    def get_all_permissions(self, obj=None):
+        return self.instance.get_all_permissions(obj)
+
+    def has_perm(self, perm, obj=None):
+        return self.instance.has_perm(perm, obj)
+
+    def has_perms(self, perm_list, obj=None):
+        return self.instance.has_perms(perm_list, obj)
+
+    def has_module_perms(self, module):
+        return self.instance.has_module_perms(module)
+
+    def __eq__(self, other):
+        # Equal to the same user's row too, as the row would be
+        if isinstance(other, (ClaimsUser, User)):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __getattr__(self, name):
+        # Only reached for attributes the claims can't answer
+        if name.startswith('_') or name == 'token':
+            raise AttributeError(name)
+        return getattr(self.instance, name)
+
+    def __str__(self):
+        return self.full_name
+
+
+class RevocationMap:
+    """
+    user_id -> most recent revocation time, in whole epoch seconds like the
+    ``iat`` claim it is compared with.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._version = None
+        self._checked_at = 0.0
+
+    def _cutoff(self):
+        return timezone.now() - api_settings.ACCESS_TOKEN_LIFETIME - timedelta(minutes=5)
+
+    def _load(self, version):
+        revoked = {}
+        for user_id, revoked_at in TokenRevocation.objects.filter(
+            revoked_at__gte=self._cutoff()
+        ).values_list('user_id', 'revoked_at'):
+            revoked[user_id] = max(revoked.get(user_id, 0), int(revoked_at.timestamp()))
+        self._revoked = revoked
+        self._version = version
+
+    def revoked_at(self, user_id):
+        ttl = getattr(settings, 'AUTH_REVOCATION_CHECK_SECONDS', 5)
+        now = time.monotonic()
+        if now - self._checked_at >= ttl:
+            version = versions.current(REVOCATION_VERSION_KEY)
+            with self._lock:
+                if version != self._version:
+                    with unbudgeted(), read_from_primary():
+                        self._load(version)
+                self._checked_at = now
+        return self._revoked.get(user_id)
+
+    def revoke(self, user_id):
+        revoked_at = timezone.now()
+        TokenRevocation.objects.create(user_id=user_id, revoked_at=revoked_at)
+        TokenRevocation.objects.filter(revoked_at__lt=self._cutoff()).delete()
+        versions.bump(REVOCATION_VERSION_KEY)
+        with self._lock:
+            self._revoked[user_id] = int(revoked_at.timestamp())
+
+
+revocations = RevocationMap()
+
+
+def revoke_user_tokens(user_id):
+    """Invalidate every token issued to ``user_id`` so far."""
+    revocations.revoke(user_id)
+
+
+def is_revoked(token):
+    """
+    Whether ``token`` was issued before its user's last revocation.  ``iat``
+    only has whole seconds, so a token issued in the same second as the
+    revocation (e.g. the login that caused it) is kept.
+    """
+    revoked_at = revocations.revoked_at(token[api_settings.USER_ID_CLAIM])
+    return revoked_at is not None and token.get('iat', 0) < revoked_at
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts role/name/approval claims instead of the DB."""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise AuthenticationFailed('Token contained no recognizable user identification', code='token_not_valid')
+
+        # Tokens issued before claims were added still go through the database
+        if any(field not in validated_token for field in CLAIM_FIELDS):
+            return super().get_user(validated_token)
+
+        if is_revoked(validated_token):
+            raise AuthenticationFailed('Token has been revoked', code='token_revoked')
+        if not validated_token['approved']:
+            raise AuthenticationFailed('Your account is not approved yet', code='user_not_approved')
+
+        return ClaimsUser(validated_token)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh that re-reads the user so new tokens carry current claims."""
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+
+        user = User.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM]).first()
+        if user is None or not user.is_active or not user.approved:
+            raise AuthenticationFailed('User is no longer active', code='user_inactive')
+
+        add_user_claims(refresh, user)
+        refresh.set_iat()
+        data = {'access': str(refresh.access_token)}
+
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    pass
+
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+
+        return data
@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from products.models import ProductType, PaperType, PaperWeight, PaperSize, ProductTypeSpecification
 from jobs.models import Job, DocketCounter
+from settings.models import Branch
 from decimal import Decimal
 
 User = get_user_model()
@@ -401,7 +402,14 @@ class Command(BaseCommand):
                 },
             ]
 
+            branches = {}
             for job_data in sample_jobs:
+                code = job_data['branch']
+                if code not in branches:
+                    branches[code], _ = Branch.objects.get_or_create(
+                        code=code, defaults={'name': code.title()}
+                    )
+                job_data['branch'] = branches[code]
                 Job.objects.create(**job_data)
 
         self.stdout.write('✅ Created sample jobs')
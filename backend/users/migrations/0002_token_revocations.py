@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenRevocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.BigIntegerField(db_index=True)),
+                ('revoked_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'db_table': 'token_revocations',
+            },
+        ),
+    ]
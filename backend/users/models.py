@@ -32,8 +32,32 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'full_name']
 
+    def check_password(self, raw_password):
+        # A save while checking is the hash of the same password being
+        # upgraded, which must not revoke the user's tokens (users.signals)
+        self._checking_password = True
+        try:
+            return super().check_password(raw_password)
+        finally:
+            self._checking_password = False
+
     def __str__(self):
         return f"{self.full_name} ({self.email})"
 
     class Meta:
         db_table = 'users'
+
+
+class TokenRevocation(models.Model):
+    """
+    Marks every token issued to a user before ``revoked_at`` as invalid.
+    Rows older than the access token lifetime are irrelevant and pruned.
+    """
+    user_id = models.BigIntegerField(db_index=True)
+    revoked_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"User {self.user_id} tokens revoked at {self.revoked_at}"
+
+    class Meta:
+        db_table = 'token_revocations'
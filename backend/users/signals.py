@@ -0,0 +1,37 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import authentication
+from .models import User
+
+# Changing any of these invalidates tokens that carry the old values
+TOKEN_FIELDS = ('role', 'full_name', 'approved', 'is_active', 'password')
+
+
+def _changed(previous, instance, field):
+    if previous[field] == getattr(instance, field):
+        return False
+    # A login that upgrades an outdated hash keeps the same password
+    return not (field == 'password' and getattr(instance, '_checking_password', False))
+
+
+@receiver(pre_save, sender=User)
+def remember_token_fields(sender, instance, **kwargs):
+    if not instance.pk:
+        return
+    previous = User.objects.filter(pk=instance.pk).values(*TOKEN_FIELDS).first()
+    instance._token_fields_changed = previous is not None and any(
+        _changed(previous, instance, field) for field in TOKEN_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def revoke_on_change(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_token_fields_changed', False):
+        authentication.revoke_user_tokens(instance.pk)
+        instance._token_fields_changed = False
+
+
+@receiver(post_delete, sender=User)
+def revoke_on_delete(sender, instance, **kwargs):
+    authentication.revoke_user_tokens(instance.pk)
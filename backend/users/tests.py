@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from monitoring.testing import QueryBudgetTestCase
+from . import authentication
+from .authentication import ClaimsRefreshToken, RevocationMap
+from .models import User
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+
+    def test_login(self):
+        self.assertWithinBudget(
+            reverse('login'), role=None, method='POST',
+            data={'email': 'admin@paragon.com', 'password': 'admin123'},
+        )
+
+    def test_profile(self):
+        for role in ('SUPERUSER', 'CLERK'):
+            with self.subTest(role=role):
+                self.assertWithinBudget(reverse('user_profile'), role=role)
+
+    def test_user_lists(self):
+        for name in ('all_users', 'pending_users'):
+            with self.subTest(url=name):
+                self.assertWithinBudget(reverse(name))
+
+    def test_admin_stats(self):
+        self.assertWithinBudget(reverse('admin_stats'))
+
+
+class TokenRevocationTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(authentication, 'revocations', RevocationMap())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.filter(role='DESIGNER', approved=True).order_by('date_joined').first()
+
+    def client_with_token(self, user):
+        token = ClaimsRefreshToken.for_user(user).access_token
+        # Tokens issued in the same second as a revocation are kept
+        token['iat'] -= 10
+        return Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def assertRevoked(self, client):
+        response = client.get(reverse('user_profile'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['detail'], 'Token has been revoked')
+
+    def test_token_field_changes_revoke_tokens(self):
+        changes = {
+            'role': lambda user: setattr(user, 'role', 'CLERK'),
+            'approval': lambda user: setattr(user, 'approved', False),
+            'password': lambda user: user.set_password('another-password'),
+        }
+        users = User.objects.filter(approved=True).exclude(role='SUPERUSER').order_by('date_joined')
+        # A user each: their tokens predate the previous change's revocation too
+        for (name, change), user in zip(changes.items(), users):
+            with self.subTest(change=name):
+                client = self.client_with_token(user)
+                self.assertEqual(client.get(reverse('user_profile')).status_code, 200)
+                change(user)
+                user.save()
+                self.assertRevoked(client)
+
+    def test_other_changes_keep_tokens(self):
+        client = self.client_with_token(self.user)
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(client.get(reverse('user_profile')).status_code, 200)
+
+    def test_new_tokens_after_revocation_work(self):
+        self.user.role = 'CLERK'
+        self.user.save()
+        token = ClaimsRefreshToken.for_user(self.user).access_token
+        response = Client(HTTP_AUTHORIZATION=f'Bearer {token}').get(reverse('user_profile'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['role'], 'CLERK')
+
+    @override_settings(AUTH_REVOCATION_CHECK_SECONDS=0)
+    def test_revocation_reaches_other_processes(self):
+        client = self.client_with_token(self.user)
+        # Another process, which loaded the revocations before the change
+        other = RevocationMap()
+        self.assertIsNone(other.revoked_at(self.user.pk))
+        self.user.role = 'CLERK'
+        self.user.save()
+        with mock.patch.object(authentication, 'revocations', other):
+            self.assertRevoked(client)
+
+
+class LoginLoggingTests(QueryBudgetTestCase):
+
+    def test_failed_login_does_not_log_the_address(self):
+        with self.assertLogs('users.views', 'INFO') as logs:
+            response = self.client.post(
+                reverse('login'), {'email': 'admin@paragon.com', 'password': 'wrong'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn('admin@paragon.com', '\n'.join(logs.output))
+        self.assertIn('Login failed', logs.output[0])
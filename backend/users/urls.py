@@ -1,5 +1,6 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
+from paragon_jms.async_api import server_view
 from . import views
 from .views import check_users
 
@@ -10,7 +11,7 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('pending-users/', views.PendingUsersView.as_view(), name='pending_users'),
     path('approve-user/', views.approve_user, name='approve_user'),
-    path('admin/stats/', views.admin_stats, name='admin_stats'),
+    path('admin/stats/', server_view(views.admin_stats, views.aadmin_stats), name='admin_stats'),
     path('profile/', views.user_profile, name='user_profile'),
     path('users/', views.AllUsersView.as_view(), name='all_users'),
     path('check-users/', check_users, name='check_users'),
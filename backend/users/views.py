@@ -1,11 +1,19 @@
+import logging
+
+from asgiref.sync import sync_to_async
 from rest_framework import status, generics, permissions
 from rest_framework import serializers
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
+from django.utils.crypto import salted_hmac
+from monitoring.query_budget import query_budget
+from paragon_jms.async_api import async_api_view
+from paragon_jms.db_router import replica_reads
+from paragon_jms.sharding import ashard_count, shard_count
 from .models import User
+from .authentication import ClaimsRefreshToken
 from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
@@ -14,6 +22,16 @@ from .serializers import (
     UserApprovalSerializer
 )
 
+logger = logging.getLogger(__name__)
+
+
+def login_key(email):
+    """
+    A stable keyed hash of a login identifier, so failed logins for the same
+    account can be correlated in the logs without logging the address.
+    """
+    return salted_hmac('users.login', str(email or '').strip().casefold()).hexdigest()[:12]
+
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -31,26 +49,25 @@ class RegisterView(generics.CreateAPIView):
 
 
 class LoginView(generics.GenericAPIView):
+    query_budget = 4
     serializer_class = UserLoginSerializer
     permission_classes = [permissions.AllowAny]
 
     def post(self, request):
-        print("Login Request Data:", request.data)  # Debug print
         serializer = self.get_serializer(data=request.data)
         
         try:
             serializer.is_valid(raise_exception=True)
         except serializers.ValidationError as e:
-            print("Validation Error Details:", e.detail)  # Debug print
+            logger.info("Login failed for account %s: %s", login_key(request.data.get('email')), e.detail)
             return Response(
                 {'detail': e.detail if hasattr(e, 'detail') else str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
             
         user = serializer.validated_data['user']
-        print("Authenticated User:", user)  # Debug print
         
-        refresh = RefreshToken.for_user(user)
+        refresh = ClaimsRefreshToken.for_user(user)
         return Response({
             'refresh': str(refresh),
             'access': str(refresh.access_token),
@@ -59,6 +76,7 @@ class LoginView(generics.GenericAPIView):
 
 
 class PendingUsersView(generics.ListAPIView):
+    query_budget = 2
     serializer_class = PendingUserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -68,6 +86,7 @@ class PendingUsersView(generics.ListAPIView):
         return User.objects.filter(approved=False).order_by('-created_at')
 
 
+@query_budget(8)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def approve_user(request):
@@ -90,7 +109,7 @@ def approve_user(request):
         if action == 'approve':
             user.approved = True
             user.role = role
-            user.assigned_by = request.user
+            user.assigned_by_id = request.user.pk
             user.save()
             return Response({'message': 'User approved successfully'})
         elif action == 'decline':
@@ -104,6 +123,8 @@ def approve_user(request):
         )
 
 
+@query_budget(4)
+@replica_reads
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def admin_stats(request):
@@ -113,33 +134,70 @@ def admin_stats(request):
             status=status.HTTP_403_FORBIDDEN
         )
     
+    from jobs.analytics import archive_rollups
     from jobs.models import Job
     
+    # Job counts are summed over every job shard; the total includes the
+    # archive, counted from its cached rollups
+    archived = archive_rollups()
     stats = {
         'pending_users': User.objects.filter(approved=False).count(),
-        'pending_jobs': Job.objects.filter(status='PENDING').count(),
-        'total_jobs': Job.objects.count(),
-        'unpaid_jobs': Job.objects.filter(payment_status='NOT_MARKED').count(),
+        'pending_jobs': shard_count(Job.objects.filter(status='PENDING')),
+        'total_jobs': shard_count(Job.objects.all()) + sum(
+            row['job_count'] for row in archived['payment_counts']
+        ),
+        'unpaid_jobs': shard_count(Job.objects.filter(payment_status='NOT_MARKED')),
+    }
+    
+    return Response(stats)
+
+
+@query_budget(4)
+@replica_reads
+@async_api_view(['GET'])
+async def aadmin_stats(request):
+    """``admin_stats`` for ASGI."""
+    if request.user.role != 'SUPERUSER':
+        return Response(
+            {'error': 'Permission denied'}, 
+            status=status.HTTP_403_FORBIDDEN
+        )
+    
+    from jobs.analytics import archive_rollups
+    from jobs.models import Job
+    
+    archived = await sync_to_async(archive_rollups)()
+    stats = {
+        'pending_users': await User.objects.filter(approved=False).acount(),
+        'pending_jobs': await ashard_count(Job.objects.filter(status='PENDING')),
+        'total_jobs': await ashard_count(Job.objects.all()) + sum(
+            row['job_count'] for row in archived['payment_counts']
+        ),
+        'unpaid_jobs': await ashard_count(Job.objects.filter(payment_status='NOT_MARKED')),
     }
     
     return Response(stats)
 
 
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_profile(request):
-    serializer = UserSerializer(request.user)
+    # Claims-backed users only carry role/name; serialize the real row
+    user = User.objects.select_related('assigned_by').get(pk=request.user.pk)
+    serializer = UserSerializer(user)
     return Response(serializer.data)
 
 
 class AllUsersView(generics.ListAPIView):
+    query_budget = 2
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         if self.request.user.role != 'SUPERUSER':
             return User.objects.none()
-        return User.objects.all().order_by('-created_at')
+        return User.objects.select_related('assigned_by').order_by('-created_at')
 
 @api_view(['GET'])
 @permission_classes([AllowAny])